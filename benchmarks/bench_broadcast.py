@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки системного сообщения: время до 99% получателей при 100 тыс.
+подключенных клиентов - последовательный цикл send_message_to_client (сериализация,
+шифрование и send на каждого получателя) против Broadcaster (сериализация один раз,
+шифрование пачками в пуле, очереди ClientWriter).
+
+С --sockets real у каждого клиента настоящая пара сокетов, получение считается на
+стороне клиентов (нужно около трех дескрипторов на клиента - см. ulimit -n).
+С --sockets memory сокет заменен приемником в памяти: измеряется только работа сервера.
+Без cryptography шифрование не выполняется - об этом выводится предупреждение
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import selectors
+import threading
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.client_session import ClientSession
+from server.client_writer import ClientWriter, WriterLoop
+from server.broadcast import Broadcaster
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+class PlainCipher:
+    """Без cryptography: кадр передается как есть"""
+
+    def encrypt(self, data):
+        return bytes(data)
+
+
+class MemorySink:
+    """Приемник в памяти вместо сокета: принимает все сразу"""
+
+    def __init__(self):
+        self.received = 0
+
+    def dup(self):
+        return self
+
+    def setblocking(self, flag):
+        pass
+
+    def send(self, data):
+        self.received += len(data)
+        return len(data)
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
+class Receivers:
+    """Чтение клиентских концов сокетов и учет полученных кадров"""
+
+    def __init__(self, sockets, expected_frames):
+        self.selector = selectors.DefaultSelector()
+        for sock in sockets:
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ)
+        self.total = len(sockets) * expected_frames
+        self.frames = 0
+        self.times = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while self.frames < self.total:
+            for key, _ in self.selector.select(timeout=1):
+                try:
+                    data = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                count = data.count(b"<END>")
+                if count:
+                    self.frames += count
+                    self.times.append((time.perf_counter(), self.frames))
+
+    def time_to(self, fraction, start):
+        target = self.total * fraction
+        for moment, frames in self.times:
+            if frames >= target:
+                return moment - start
+        return None
+
+
+def make_sessions(count, mode, loop):
+    sessions, peers = [], []
+    for k in range(count):
+        if mode == 'real':
+            server_end, client_end = socket.socketpair()
+            server_end.settimeout(10)
+            peers.append(client_end)
+        else:
+            server_end = MemorySink()
+        cipher = Fernet(Fernet.generate_key()) if Fernet is not None else PlainCipher()
+        writer = ClientWriter(server_end, loop)
+        sessions.append(ClientSession(f"user{k}", server_end, cipher, ('127.0.0.1', 40000 + k % 20000),
+                                      k, time.monotonic(), writer=writer))
+    return sessions, peers
+
+
+def sequential(sessions, message):
+    """Прежний путь: send_message_to_client для каждого получателя подряд"""
+    for session in sessions:
+        encrypted = session.cipher.encrypt(json.dumps(message).encode())
+        session.writer.write(encrypted + b"<END>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=100000)
+    parser.add_argument('--sockets', choices=('real', 'memory'), default=None,
+                        help='по умолчанию real, если хватает дескрипторов')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=512)
+    args = parser.parse_args()
+
+    mode = args.sockets
+    if mode is None:
+        mode = 'real' if args.clients * 3 + 100 < resource.getrlimit(resource.RLIMIT_NOFILE)[0] else 'memory'
+    if Fernet is None:
+        print("cryptography не установлен - измерение без шифрования")
+    print(f"{args.clients} клиентов, сокеты: {mode}")
+
+    loop = WriterLoop()
+    message = {'type': 'system_message', 'message': 'Плановые работы через 10 минут', 'timestamp': 'now'}
+    results = {}
+    for name in ('последовательно', 'Broadcaster'):
+        sessions, peers = make_sessions(args.clients, mode, loop)
+        receivers = Receivers(peers, 1) if peers else None
+        if receivers:
+            receivers.thread.start()
+
+        start = time.perf_counter()
+        if name == 'Broadcaster':
+            broadcaster = Broadcaster(workers=args.workers, batch_size=args.batch)
+            broadcast = broadcaster.broadcast(message, sessions)
+            broadcast.done.wait()
+            queued_99 = broadcast.reached_99
+        else:
+            sequential(sessions, message)
+            queued_99 = (time.perf_counter() - start) * 0.99
+        queued_all = time.perf_counter() - start
+
+        if receivers:
+            receivers.thread.join(timeout=120)
+            received_99 = receivers.time_to(0.99, start)
+            line = f"получили 99% за {received_99:.2f} с" if received_99 is not None else "не дошло до 99%"
+        else:
+            line = f"в очередях у 99% за {queued_99:.2f} с"
+        results[name] = queued_all
+        print(f"{name}: {line}, все кадры поставлены за {queued_all:.2f} с")
+
+        for session in sessions:
+            session.writer.close()
+            if mode == 'real':
+                session.socket.close()
+        for peer in peers:
+            peer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк истории звонков: установок звонка в секунду (начало, принятие, завершение)
+из нескольких потоков запросов - прежние INSERT/UPDATE с коммитом на общем
+соединении против отложенной записи через CallHistoryJournal
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.call_journal import CallHistoryJournal
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS call_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        call_id TEXT NOT NULL,
+        from_user TEXT NOT NULL,
+        to_user TEXT NOT NULL,
+        call_type TEXT NOT NULL,
+        start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        end_time TIMESTAMP,
+        status TEXT NOT NULL,
+        duration INTEGER DEFAULT 0
+    )
+'''
+
+
+class SyncHistory:
+    """Прежний путь сервера: общее соединение, коммит на каждое изменение"""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.lock = threading.Lock()
+
+    def call_started(self, call_id, from_user, to_user, call_type):
+        with self.lock:
+            self.cursor.execute(
+                "INSERT INTO call_history (call_id, from_user, to_user, call_type, status) VALUES (?, ?, ?, ?, ?)",
+                (call_id, from_user, to_user, call_type, 'initiated')
+            )
+            self.conn.commit()
+
+    def call_updated(self, call_id, status, end_time=None, duration=None):
+        with self.lock:
+            if end_time is None:
+                self.cursor.execute("UPDATE call_history SET status = ? WHERE call_id = ?", (status, call_id))
+            else:
+                self.cursor.execute(
+                    "UPDATE call_history SET status = ?, end_time = ?, duration = ? WHERE call_id = ?",
+                    (status, end_time, duration, call_id)
+                )
+            self.conn.commit()
+
+
+def run(history, calls, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        own = []
+        for k in range(n, calls, threads):
+            call_id = f"call-{k}"
+            start = time.perf_counter()
+            history.call_started(call_id, f"user{k % 500}", f"user{(k + 1) % 500}", 'audio')
+            history.call_updated(call_id, 'accepted')
+            history.call_updated(call_id, 'ended', datetime.now(), 1)
+            own.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(own)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return calls / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    for name in ('прежний синхронный путь', 'CallHistoryJournal'):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'users.db')
+            conn = sqlite3.connect(db_path)
+            conn.execute(SCHEMA)
+            conn.close()
+
+            if name == 'CallHistoryJournal':
+                history = CallHistoryJournal(db_path, os.path.join(tmp, 'call_history.journal'))
+            else:
+                history = SyncHistory(db_path)
+            rate, p50, p99 = run(history, args.calls, args.threads)
+            drain = time.perf_counter()
+            if isinstance(history, CallHistoryJournal):
+                history.flush(timeout=600)
+                history.close()
+            drain_ms = (time.perf_counter() - drain) * 1000
+            print(f"{name}: {rate:.0f} установок звонка/сек, задержка сигнализации "
+                  f"p50 {p50:.3f} мс, p99 {p99:.3f} мс, догонка записи {drain_ms:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк реестра звонков на синтетических звонках (по умолчанию 100 тыс.):
+проверка занятости, завершение звонков отключившихся пользователей и очистка
+по таймаутам - прежний словарь с полным просмотром против CallRegistry.
+Заодно проверяет корректность: занятость, продление дедлайнов, истечение
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.call_registry import CallRegistry
+
+
+def populate_dict(calls):
+    active_calls = {}
+    for k in range(calls):
+        active_calls[f"call-{k}"] = {
+            'from': f"user{2 * k}", 'to': f"user{2 * k + 1}", 'call_type': 'audio',
+            'start_time': datetime.now(), 'status': 'ringing'
+        }
+    return active_calls
+
+
+def populate_registry(calls, now):
+    registry = CallRegistry(ring_timeout=120, idle_timeout=90)
+    for k in range(calls):
+        registry.add(f"call-{k}", f"user{2 * k}", f"user{2 * k + 1}", 'audio', now=now)
+    return registry
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for n in range(repeat):
+        fn(n)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def check(registry, calls):
+    """Поведение реестра на заполненных данных"""
+    now = 1000.0
+    assert registry.is_busy('user1') and registry.is_busy('user0')
+    assert not registry.is_busy(f"user{2 * calls}")
+    assert registry.add('dup', 'someone', 'user1', 'audio', now=now) is None
+
+    # Принятый звонок живет, пока есть heartbeat; непринятые истекают по ring_timeout
+    registry.activate('call-0', now=now)
+    for t in range(30, 400, 30):
+        registry.touch_user('user0', now=now + t)
+        assert not [c for c, _ in registry.expire(now=now + t) if c == 'call-0']
+    assert len(registry) == 1 and 'call-0' in registry
+    expired = registry.expire(now=now + 390 + 91)
+    assert [c for c, _ in expired] == ['call-0'] and len(registry) == 0
+    assert not registry.is_busy('user0') and not registry.by_user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    calls = args.calls
+
+    start = time.perf_counter()
+    active_calls = populate_dict(calls)
+    dict_fill = time.perf_counter() - start
+    start = time.perf_counter()
+    registry = populate_registry(calls, now=1000.0)
+    registry_fill = time.perf_counter() - start
+    print(f"{calls} звонков: заполнение словаря {dict_fill:.2f} с, реестра {registry_fill:.2f} с")
+
+    # Проверка занятости: прежнее условие искало имя среди call_id и никогда не срабатывало
+    def dict_busy(n):
+        username = f"user{random.randrange(2 * calls)}"
+        return any(username in (c['from'], c['to']) for c in active_calls.values())
+
+    def registry_busy(n):
+        return registry.is_busy(f"user{random.randrange(2 * calls)}")
+
+    repeat = max(1, args.repeat // 20)
+    print(f"проверка занятости: полный просмотр {timed(dict_busy, repeat):.1f} мкс, "
+          f"индекс {timed(registry_busy, args.repeat):.2f} мкс")
+
+    # Отключение пользователя: поиск и удаление его звонков
+    def dict_disconnect(n):
+        username = f"user{2 * n}"
+        for call_id in [c for c, d in active_calls.items() if username in (d['from'], d['to'])]:
+            del active_calls[call_id]
+
+    def registry_disconnect(n):
+        for call_id in registry.calls_of(f"user{2 * n}"):
+            registry.remove(call_id)
+
+    print(f"завершение звонков отключившегося: полный просмотр {timed(dict_disconnect, repeat):.1f} мкс, "
+          f"индекс {timed(registry_disconnect, args.repeat):.2f} мкс")
+
+    # Очистка: прежний поток раз в минуту просматривал все звонки
+    def dict_sweep(n):
+        now = datetime.now()
+        return [c for c, d in active_calls.items() if (now - d['start_time']).total_seconds() > 120]
+
+    def registry_sweep(n):
+        return registry.expire(now=1000.0 + n * 0.001)
+
+    print(f"проверка таймаутов без истекших: полный просмотр {timed(dict_sweep, repeat):.1f} мкс, "
+          f"куча {timed(registry_sweep, args.repeat):.2f} мкс")
+
+    # Половина звонков принята и поддерживается heartbeat - истекают только непринятые
+    for k in range(args.repeat, calls, 2):
+        registry.activate(f"call-{k}", now=1000.0)
+    start = time.perf_counter()
+    for t in range(30, 150, 30):
+        for k in range(args.repeat, calls, 2):
+            registry.touch_user(f"user{2 * k}", now=1000.0 + t)
+    touch_us = (time.perf_counter() - start) / (4 * len(range(args.repeat, calls, 2))) * 1e6
+    start = time.perf_counter()
+    expired = registry.expire(now=1000.0 + 121)
+    expire_ms = (time.perf_counter() - start) * 1000
+    print(f"heartbeat участника {touch_us:.2f} мкс; истечение {len(expired)} звонков за {expire_ms:.0f} мс, "
+          f"осталось {len(registry)}")
+
+    check(populate_registry(calls, now=0.0), calls)
+    print("проверки поведения пройдены")
+
+
+if __name__ == '__main__':
+    main()
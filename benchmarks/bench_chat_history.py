@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк истории чата (платформа offscreen): задержка добавления пачки сообщений
+и прокрутки к старой истории при 100 тыс. сообщений в чате
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+
+from chat_window import ChatWindow
+from chat_model import MemoryTranscriptStore
+
+
+def percentiles(samples):
+    """p50 и p99 в миллисекундах"""
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return statistics.median(samples) * 1000, p99 * 1000
+
+
+def fill_store(count):
+    """Хранилище с `count` сообщениями в чате peer"""
+    store = MemoryTranscriptStore()
+    batch = [('peer', f"сообщение {i} " + 'текст ' * (i % 30), False, '00:00:00') for i in range(count)]
+    store.append('peer', batch)
+    return store
+
+
+def bench_append(app, store, batches, burst):
+    """Добавление пачек по `burst` сообщений с прокруткой и перерисовкой"""
+    chat = ChatWindow('peer', store)
+    chat.resize(600, 800)
+    chat.show()
+    app.processEvents()
+
+    samples = []
+    for n in range(batches):
+        batch = [('peer', f"новое {n}-{i}", False, '00:00:01') for i in range(burst)]
+        start = time.perf_counter()
+        chat.add_messages(batch)
+        chat.chat_history.repaint()
+        app.processEvents()
+        samples.append(time.perf_counter() - start)
+
+    rows = chat.history_model.rowCount()
+    chat.close()
+    return samples, rows
+
+
+def bench_scroll(app, store, pages):
+    """Прокрутка к началу истории: каждая страница подгружается из хранилища"""
+    chat = ChatWindow('peer', store)
+    chat.resize(600, 800)
+    chat.show()
+    app.processEvents()
+
+    scrollbar = chat.chat_history.verticalScrollBar()
+    samples = []
+    for _ in range(pages):
+        if not chat.history_model.has_older:
+            break
+        start = time.perf_counter()
+        scrollbar.setValue(scrollbar.minimum())
+        chat.chat_history.repaint()
+        app.processEvents()
+        samples.append(time.perf_counter() - start)
+
+    rows = chat.history_model.rowCount()
+    chat.close()
+    return samples, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--batches', type=int, default=500)
+    parser.add_argument('--burst', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=200)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    store = fill_store(args.messages)
+
+    samples, rows = bench_append(app, store, args.batches, args.burst)
+    p50, p99 = percentiles(samples)
+    print(f"добавление пачки из {args.burst} при {args.messages} сообщениях: "
+          f"p50 {p50:.2f} мс, p99 {p99:.2f} мс (строк в модели: {rows})")
+
+    samples, rows = bench_scroll(app, store, args.pages)
+    p50, p99 = percentiles(samples)
+    print(f"прокрутка вверх на страницу ({len(samples)} страниц): "
+          f"p50 {p50:.2f} мс, p99 {p99:.2f} мс (строк в модели: {rows})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк вывода входящих сообщений (платформа offscreen): сообщений в секунду
+при выводе по одному с repaint/processEvents и через пакетный EventDispatcher
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication, QTextEdit
+
+from chat_window import ChatWindow
+from event_dispatcher import EventDispatcher
+
+
+def bench_per_message(app, count):
+    """Прежний путь: QTextEdit.append + repaint + processEvents на каждое сообщение"""
+    chat = QTextEdit()
+    chat.setReadOnly(True)
+    chat.show()
+    start = time.perf_counter()
+    for i in range(count):
+        chat.append(f"[00:00:00] 👤 peer: сообщение {i}")
+        scrollbar = chat.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+        chat.repaint()
+        app.processEvents()
+    elapsed = time.perf_counter() - start
+    chat.close()
+    return count / elapsed
+
+
+def bench_dispatcher(app, count, burst):
+    """Новый путь: сообщения приходят пачками, вывод раз в 16 мс"""
+    chat = ChatWindow('peer')
+    chat.show()
+    dispatcher = EventDispatcher(lambda username, batch: chat.add_messages(batch), lambda lines: None)
+
+    start = time.perf_counter()
+    sent = 0
+    while sent < count:
+        for _ in range(min(burst, count - sent)):
+            dispatcher.post_message('peer', 'peer', f"сообщение {sent}")
+            sent += 1
+        app.processEvents()
+    while dispatcher.pending_messages or dispatcher.timer.isActive():
+        app.processEvents()
+    chat.chat_history.repaint()
+    elapsed = time.perf_counter() - start
+
+    assert chat.message_count == count
+    chat.close()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--burst', type=int, default=100)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print(f"по одному сообщению: {bench_per_message(app, args.messages):.0f} сообщений/сек")
+    print(f"EventDispatcher (пачки по {args.burst}): "
+          f"{bench_dispatcher(app, args.messages, args.burst):.0f} сообщений/сек")
+
+
+if __name__ == '__main__':
+    main()
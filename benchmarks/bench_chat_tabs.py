@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк вкладок чатов (платформа offscreen): задержка открытия вкладки и RSS
+процесса при 500 переписках - отдельное окно со своим стилем на каждую вкладку
+против пустых контейнеров и пула окон со стилем приложения
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def rss_mb():
+    """Текущий RSS процесса в МБ"""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def fill(conversation, messages):
+    conversation.add_messages([('peer', f"сообщение {i}", False, '00:00:00') for i in range(messages)])
+
+
+def run(mode, conversations, messages):
+    from PyQt5.QtWidgets import QApplication, QTabWidget, QWidget, QVBoxLayout
+
+    from chat_window import ChatWindow, ChatWindowPool
+    from chat_model import Conversation, MemoryTranscriptStore
+    from styles.main_style import MAIN_WINDOW_STYLE, CHAT_WINDOW_STYLE
+
+    app = QApplication(sys.argv)
+    tabs = QTabWidget()
+    tabs.resize(800, 600)
+    tabs.show()
+    store = MemoryTranscriptStore()
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    if mode == 'per-tab':
+        # Прежняя схема: окно на каждую переписку, стиль на каждом окне
+        tabs.setStyleSheet(MAIN_WINDOW_STYLE)
+        for n in range(conversations):
+            chat = ChatWindow(f"user{n}", store)
+            chat.setStyleSheet(CHAT_WINDOW_STYLE)
+            fill(chat.conversation, messages)
+            tabs.addTab(chat, chat.username)
+    else:
+        # Новая схема: контейнеры вкладок и пул окон, стиль приложения
+        app.setStyleSheet(MAIN_WINDOW_STYLE + CHAT_WINDOW_STYLE)
+        pool = ChatWindowPool(3, lambda window: None)
+        by_container = {}
+        for n in range(conversations):
+            conversation = Conversation(f"user{n}", store)
+            fill(conversation, messages)
+            container = QWidget()
+            QVBoxLayout(container).setContentsMargins(0, 0, 0, 0)
+            by_container[container] = conversation
+            tabs.addTab(container, conversation.username)
+        tabs.currentChanged.connect(
+            lambda index: pool.acquire(by_container[tabs.widget(index)], tabs.widget(index))
+        )
+    app.processEvents()
+    create_ms = (time.perf_counter() - start) * 1000
+
+    samples = []
+    for index in list(range(1, conversations)) + [0]:
+        start = time.perf_counter()
+        tabs.setCurrentIndex(index)
+        tabs.repaint()
+        app.processEvents()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{mode}: создание {create_ms:.0f} мс, открытие вкладки p50 {statistics.median(samples):.2f} мс, "
+          f"p99 {p99:.2f} мс, RSS +{rss_mb() - baseline:.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--mode', choices=('per-tab', 'pooled'))
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.conversations, args.messages)
+        return
+
+    # Каждая схема в отдельном процессе, чтобы RSS не смешивался
+    for mode in ('per-tab', 'pooled'):
+        subprocess.run([sys.executable, __file__, '--mode', mode,
+                        '--conversations', str(args.conversations), '--messages', str(args.messages)], check=True)
+
+
+if __name__ == '__main__':
+    main()
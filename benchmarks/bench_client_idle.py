@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк простоя клиента: CPU и пробуждения в секунду для потока-прослушивателя
+(recv с таймаутом 0.5 с) и для транспорта Qt на QSocketNotifier
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import resource
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+from network_secure import SecureNetworkClient
+from qt_transport import QtSocketTransport
+
+
+def usage():
+    """CPU-время процесса и число переключений контекста"""
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime, ru.ru_nvcsw + ru.ru_nivcsw
+
+
+def make_client():
+    """Клиент, «подключенный» к одному концу socketpair (сервер молчит)"""
+    client = SecureNetworkClient()
+    client_end, server_end = socket.socketpair()
+    client.server_socket = client_end
+    client.connected = True
+    return client, server_end
+
+
+def measure_thread(app, seconds):
+    client, server_end = make_client()
+    client.start_message_listener()
+    time.sleep(0.5)
+
+    cpu_before, switches_before = usage()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+    cpu_after, switches_after = usage()
+
+    client.disconnect()
+    server_end.close()
+    return cpu_after - cpu_before, switches_after - switches_before, None
+
+
+def measure_qt(app, seconds):
+    client, server_end = make_client()
+    transport = QtSocketTransport(client)
+    client.set_transport(transport)
+    client.start_message_listener()
+    app.processEvents()
+
+    cpu_before, switches_before = usage()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+    cpu_after, switches_after = usage()
+
+    wakeups = transport.wakeups
+    client.disconnect()
+    server_end.close()
+    return cpu_after - cpu_before, switches_after - switches_before, wakeups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=30)
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    for name, measure in (('поток recv(0.5 c)', measure_thread), ('QSocketNotifier', measure_qt)):
+        cpu, switches, wakeups = measure(app, args.seconds)
+        line = (f"{name}: CPU {100 * cpu / args.seconds:.3f}%, "
+                f"переключений контекста {switches / args.seconds:.1f}/сек")
+        if wakeups is not None:
+            line += f", пробуждений для чтения {wakeups / args.seconds:.2f}/сек"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
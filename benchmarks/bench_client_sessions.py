@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти онлайн-клиентов сервера: байт на сессию при 10 тыс. и 100 тыс.
+подключенных клиентов - прежний словарь с ISO-строкой last_seen против ClientSession.
+Имена и адреса приходят из сети, поэтому у каждой сессии свои копии строк.
+Fernet учитывается, если установлен cryptography; сокеты не создаются -
+объект сокета и буферы ядра одинаковы для обоих вариантов
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.client_session import ClientSession
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+def wire(text):
+    """Строка, как после json.loads: отдельный объект на каждое сообщение"""
+    return ''.join(list(text))
+
+
+def make_cipher():
+    return Fernet(Fernet.generate_key()) if Fernet is not None else None
+
+
+def dict_session(k, ip):
+    return wire(f"user{k}"), {
+        'socket': None,
+        'cipher': make_cipher(),
+        'address': (wire(ip), 40000 + k % 20000),
+        'last_seen': datetime.now().isoformat(),
+        'user_id': k,
+        'p2p_port': 50000 + k % 1000,
+        'external_ip': wire(ip)
+    }
+
+
+def slots_session(k, ip):
+    session = ClientSession(wire(f"user{k}"), None, make_cipher(), (wire(ip), 40000 + k % 20000),
+                            k, time.monotonic(), 50000 + k % 1000, wire(ip))
+    return session.username, session
+
+
+def measure(factory, sessions, ips):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    clients = {}
+    for k in range(sessions):
+        username, session = factory(k, ips[k % len(ips)])
+        clients[username] = session
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return total / sessions, clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--nat-share', type=int, default=4, help='клиентов на один внешний IP')
+    args = parser.parse_args()
+
+    if Fernet is None:
+        print("cryptography не установлен - Fernet не учитывается")
+    for sessions in args.sessions:
+        ips = [f"10.{k // 65536 % 256}.{k // 256 % 256}.{k % 256}"
+               for k in random.sample(range(16777216), max(1, sessions // args.nat_share))]
+        old, clients = measure(dict_session, sessions, ips)
+        del clients
+        new, clients = measure(slots_session, sessions, ips)
+        del clients
+        print(f"{sessions} сессий: словарь {old:.0f} байт/сессию, ClientSession {new:.0f} байт/сессию "
+              f"({(1 - new / old) * 100:.0f}% меньше), всего {old * sessions / 1048576:.1f} -> "
+              f"{new * sessions / 1048576:.1f} МБ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк маршрутизации запросов: цепочка if/elif по типу запроса против Dispatcher
+с промежуточными слоями (замеры, ошибки, ограничение частоты, авторизация, поля).
+Обработчики пустые - измеряется только накладной расход маршрутизации на запрос
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from metrics import Counters, LatencyStats
+from server.dispatch import (Dispatcher, RequestContext, TimingMiddleware, ErrorMiddleware,
+                             AuthMiddleware, schema_middleware)
+from server.rate_limit import RateLimitMiddleware, RateLimiter
+
+TYPES = ['register', 'login', 'token_login', 'revoke_token', 'get_user_list', 'get_contacts',
+         'add_contact', 'remove_contact', 'client_info', 'heartbeat', 'p2p_message', 'get_history',
+         'search_users', 'call_request', 'call_answer', 'call_end', 'ice_candidate', 'server_status']
+
+
+def handler(*args):
+    return {'type': 'ack'}
+
+
+def if_chain(request, username, user_id):
+    """Прежний вид handle_client: сравнение типа с каждой веткой по очереди"""
+    request_type = request['type']
+    for name in TYPES:
+        if request_type == name:
+            try:
+                if not username:
+                    return {'type': 'error', 'message': 'Не авторизован'}
+                return handler(request, username)
+            except Exception as e:
+                return {'type': 'error', 'message': str(e)}
+    return {'type': 'error', 'message': 'Неизвестный тип запроса'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200000)
+    args = parser.parse_args()
+
+    counters = Counters()
+    dispatcher = Dispatcher([
+        TimingMiddleware(LatencyStats(), counters),
+        ErrorMiddleware(),
+        RateLimitMiddleware(counters, limiter=RateLimiter(limits={}, default=(10 ** 9, 10 ** 9))),
+        AuthMiddleware(lambda token: 1),
+        schema_middleware,
+    ])
+    for name in TYPES:
+        dispatcher.register(name, lambda ctx: handler(ctx.request, ctx.username),
+                            auth='session' if name.startswith(('call', 'ice', 'p2p')) else True)
+
+    ctx = RequestContext('127.0.0.1', ('127.0.0.1', 40000), None, None)
+    ctx.username, ctx.user_id = 'user', 1
+    requests = [{'type': TYPES[k % len(TYPES)], 'session_token': 't'} for k in range(args.requests)]
+
+    start = time.perf_counter()
+    for request in requests:
+        if_chain(request, 'user', 1)
+    chain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for request in requests:
+        ctx.request = request
+        dispatcher.dispatch(ctx)
+    dispatched = time.perf_counter() - start
+
+    n = len(requests)
+    print(f"if/elif:    {chain / n * 1e6:.2f} мкс на запрос")
+    print(f"Dispatcher: {dispatched / n * 1e6:.2f} мкс на запрос (с гистограммой и счетчиками)")
+
+
+if __name__ == '__main__':
+    main()
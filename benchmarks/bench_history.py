@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк истории сообщений: задержка получения страницы при 1 млн сообщений -
+прежний запрос (OR по отправителю/получателю, ORDER BY timestamp, OFFSET для
+глубины) против курсора по (conversation_key, id)
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.user_manager import UserManager
+
+
+def fill(manager, messages, peers):
+    """Пользователи alice, bob и peers собеседников; половина сообщений - переписка alice/bob"""
+    conn = sqlite3.connect(manager.db_path)
+    conn.executemany("INSERT INTO users (username, password_hash) VALUES (?, '')",
+                     [(name,) for name in ['alice', 'bob'] + [f"peer{i}" for i in range(peers)]])
+    ids = dict(conn.execute("SELECT username, id FROM users"))
+    alice, bob = ids['alice'], ids['bob']
+
+    def rows():
+        for n in range(messages):
+            if n % 2 == 0:
+                sender, receiver = (alice, bob) if n % 4 == 0 else (bob, alice)
+            else:
+                sender, receiver = alice, ids[f"peer{n % peers}"]
+            yield (sender, receiver, f"сообщение {n}", f"2024-01-01 00:00:{n:012d}",
+                   manager.conversation_key(sender, receiver))
+
+    conn.executemany('''
+        INSERT INTO messages (sender_id, receiver_id, content, timestamp, conversation_key)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows())
+    conn.commit()
+    conn.close()
+    return alice, bob
+
+
+def old_page(conn, alice, bob, offset, limit):
+    """Прежний запрос истории; глубина достигается через OFFSET"""
+    return conn.execute('''
+        SELECT u1.username, u2.username, m.content, m.timestamp
+        FROM messages m
+        JOIN users u1 ON m.sender_id = u1.id
+        JOIN users u2 ON m.receiver_id = u2.id
+        WHERE (m.sender_id = ? AND m.receiver_id = ?)
+           OR (m.sender_id = ? AND m.receiver_id = ?)
+        ORDER BY m.timestamp DESC
+        LIMIT ? OFFSET ?
+    ''', (alice, bob, bob, alice, limit, offset)).fetchall()
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--peers', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = UserManager(os.path.join(tmp, 'history.db'))
+        start = time.perf_counter()
+        alice, bob = fill(manager, args.messages, args.peers)
+        print(f"заполнение {args.messages} сообщений: {time.perf_counter() - start:.1f} с")
+
+        # Курсоры на разной глубине переписки alice/bob
+        conn = sqlite3.connect(manager.db_path)
+        key = manager.conversation_key(alice, bob)
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM messages WHERE conversation_key = ? ORDER BY id DESC", (key,))]
+        depths = {'последняя страница': 0, 'середина': len(ids) // 2, 'самая старая': len(ids) - args.limit}
+
+        for name, depth in depths.items():
+            cursor = ids[depth - 1] if depth else None
+            new_ms = timed(lambda: manager.get_history_page('alice', 'bob', cursor, args.limit), args.repeat)
+            old_ms = timed(lambda: old_page(conn, alice, bob, depth, args.limit), args.repeat)
+            print(f"{name} (глубина {depth}): курсор {new_ms:.2f} мс, прежний запрос с OFFSET {old_ms:.1f} мс")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
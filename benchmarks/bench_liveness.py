@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отслеживания активности при 100 тыс. соединений: стоимость одного прохода
+очистки - прежний просмотр всех клиентов с разбором ISO-строк против истечения
+слота колеса таймеров - и стоимость heartbeat
+"""
+
+import os
+import sys
+import time
+import heapq
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.liveness import TimingWheel
+
+
+def scan_cleanup(clients, timeout):
+    """Прежний cleanup_inactive_clients без закрытия сокетов"""
+    current_time = datetime.now()
+    inactive_users = []
+    for username, client_data in clients.items():
+        last_seen = datetime.fromisoformat(client_data['last_seen'])
+        if (current_time - last_seen).total_seconds() > timeout:
+            inactive_users.append(username)
+    return inactive_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, default=100000)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--tick', type=float, default=1.0)
+    parser.add_argument('--dead', type=float, default=0.01, help='доля клиентов, замолчавших после последнего heartbeat')
+    args = parser.parse_args()
+    n = args.connections
+
+    # Клиенты шлют heartbeat раз в 30 с: последние отметки равномерно за 30 с
+    now = datetime.now()
+    offsets = [random.uniform(0, 30) for _ in range(n)]
+    dead = set(random.sample(range(n), int(n * args.dead)))
+    clients = {f"user{k}": {'last_seen': (now - timedelta(seconds=offsets[k])).isoformat()} for k in range(n)}
+
+    start = time.perf_counter()
+    scan_cleanup(clients, args.timeout)
+    scan_ms = (time.perf_counter() - start) * 1000
+    print(f"{n} соединений: просмотр всех клиентов {scan_ms:.1f} мс за проход (каждые 30 с)")
+
+    # То же состояние в колесе: виртуальное monotonic-время
+    base = 10000.0
+    wheel = TimingWheel(timeout=args.timeout, tick=args.tick)
+    wheel.current_tick = int(base // args.tick)
+    start = time.perf_counter()
+    for k in range(n):
+        wheel.touch(f"user{k}", base - offsets[k])
+    touch_us = (time.perf_counter() - start) / n * 1e6
+
+    # Проходы очистки раз в тик, пока не истекут замолчавшие клиенты; остальные продолжают слать heartbeat
+    beats = [(base - offsets[k] + 30, k) for k in range(n) if k not in dead]
+    heapq.heapify(beats)
+    passes, expired_total, expire_time = 0, [], 0.0
+    t = base
+    while t < base + args.timeout + 30:
+        t += args.tick
+        while beats[0][0] <= t:
+            beat, k = heapq.heappop(beats)
+            wheel.touch(f"user{k}", beat)
+            heapq.heappush(beats, (beat + 30, k))
+        start = time.perf_counter()
+        expired_total.extend(wheel.expire(now=t))
+        expire_time += time.perf_counter() - start
+        passes += 1
+
+    expired_ids = {int(u[4:]) for u in expired_total}
+    assert expired_ids == dead, (len(expired_ids), len(dead))
+    print(f"колесо таймеров: heartbeat {touch_us:.2f} мкс, проход очистки в среднем "
+          f"{expire_time / passes * 1000:.3f} мс (каждые {args.tick:g} с), "
+          f"истекло {len(expired_total)} из {len(dead)} неактивных, живые не затронуты")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк локального кэша сообщений: пропускная способность записи пачками,
+холодное открытие переписки из 100 тыс. сообщений и локальный поиск
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+from message_cache import MessageCache
+
+WORDS = ('привет', 'как', 'дела', 'звонок', 'завтра', 'встреча', 'файл', 'отправил', 'сервер', 'ключ')
+
+
+def message_text(n):
+    return ' '.join(WORDS[(n * k) % len(WORDS)] for k in range(1, 8)) + f" #{n}"
+
+
+def bench_write(cache, messages, burst):
+    """Запись пачками по `burst`: время постановки в очередь и до записи на диск"""
+    enqueue = []
+    start = time.perf_counter()
+    for offset in range(0, messages, burst):
+        batch = [('peer', message_text(n), n % 3 == 0, '00:00:00')
+                 for n in range(offset, min(offset + burst, messages))]
+        t = time.perf_counter()
+        cache.append('peer', batch)
+        enqueue.append((time.perf_counter() - t) * 1000)
+    cache.flush(timeout=600)
+    elapsed = time.perf_counter() - start
+    return messages / elapsed, statistics.median(enqueue), max(enqueue)
+
+
+def bench_cold_open(path, key, page):
+    """Открытие базы и чтение последней страницы переписки"""
+    start = time.perf_counter()
+    cache = MessageCache('bench', path=path, key=key)
+    records = cache.load_before('peer', None, page)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert len(records) == page
+    return cache, elapsed
+
+
+def bench_search(cache, queries):
+    samples = []
+    found = 0
+    for query in queries:
+        start = time.perf_counter()
+        found += len(cache.search(query, limit=50))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--page', type=int, default=100)
+    args = parser.parse_args()
+
+    key = os.urandom(32)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'messages.db')
+
+        cache = MessageCache('bench', path=path, key=key)
+        rate, enqueue_p50, enqueue_max = bench_write(cache, args.messages, args.burst)
+        cache.close()
+        print(f"запись пачками по {args.burst}: {rate:.0f} сообщений/сек, "
+              f"append в потоке GUI p50 {enqueue_p50:.3f} мс, max {enqueue_max:.3f} мс")
+        print(f"размер базы: {os.path.getsize(path) / (1024 * 1024):.1f} МБ")
+
+        cache, open_ms = bench_cold_open(path, key, args.page)
+        print(f"холодное открытие переписки из {args.messages} сообщений "
+              f"(последние {args.page}): {open_ms:.1f} мс")
+
+        start = time.perf_counter()
+        older = cache.load_before('peer', args.messages // 2, args.page)
+        print(f"страница из середины истории: {(time.perf_counter() - start) * 1000:.2f} мс ({len(older)} сообщений)")
+
+        p50, worst, found = bench_search(cache, ['звонок завтра', 'сервер', 'ключ файл', f"#{args.messages // 3}"])
+        print(f"локальный поиск: p50 {p50:.2f} мс, max {worst:.2f} мс, найдено {found}")
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк движков хранения сообщений: попытка записи 10 тыс., 100 тыс. и 1 млн
+сообщений/сек из нескольких потоков запросов с ожиданием записи на диск -
+SQLite (коммит на сообщение) против сегментированного журнала с групповым fsync.
+Выводит достигнутую скорость, задержку append и чтение последней страницы
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.message_store import SQLiteMessageStore
+from server.message_log import SegmentedMessageLog
+
+
+def produce(store, rate, seconds, threads, conversations):
+    """Потоки добавляют сообщения с заданной суммарной частотой; при отставании - без пауз"""
+    latencies = [[] for _ in range(threads)]
+    counts = [0] * threads
+    interval = threads / rate
+    start = time.perf_counter()
+    deadline = start + seconds
+
+    def worker(n):
+        k = 0
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            planned = start + k * interval
+            if planned > now:
+                time.sleep(planned - now)
+            t = time.perf_counter()
+            store.append(f"dm:{(n * 7919 + k) % conversations}",
+                         {'sender': f"user{n}", 'receiver': 'peer', 'content': f"сообщение {k}"})
+            latencies[n].append((time.perf_counter() - t) * 1000)
+            counts[n] += 1
+            k += 1
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    samples = sorted(x for per_thread in latencies for x in per_thread)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+    return sum(counts) / elapsed, statistics.median(samples) if samples else 0.0, p99
+
+
+def read_recent(store, conversations, page, repeat=200):
+    samples = []
+    for n in range(repeat):
+        t = time.perf_counter()
+        store.read_before(f"dm:{n % conversations}", None, page)
+        samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rates', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--conversations', type=int, default=1000)
+    parser.add_argument('--page', type=int, default=100)
+    args = parser.parse_args()
+
+    engines = (
+        ('SQLite', lambda tmp: SQLiteMessageStore(os.path.join(tmp, 'messages.db'))),
+        ('журнал', lambda tmp: SegmentedMessageLog(os.path.join(tmp, 'log'), compaction_interval=3600)),
+    )
+    for rate in args.rates:
+        for name, factory in engines:
+            with tempfile.TemporaryDirectory() as tmp:
+                store = factory(tmp)
+                achieved, p50, p99 = produce(store, rate, args.seconds, args.threads, args.conversations)
+                read_ms = read_recent(store, args.conversations, args.page)
+                store.close()
+            print(f"цель {rate}/с, {name}: достигнуто {achieved:.0f}/с, append p50 {p50:.2f} мс, "
+                  f"p99 {p99:.2f} мс, последняя страница {read_ms:.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк уведомлений (платформа offscreen): задержка цикла событий при потоке
+200 уведомлений в секунду - окно на каждое событие против NotificationManager
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+
+from notifications import NotificationWindow, NotificationManager
+
+PROBE_MS = 10
+
+
+def measure(app, notify, rate, seconds, senders):
+    """Опрос цикла событий раз в PROBE_MS: запаздывание срабатывания таймера"""
+    lateness = []
+    sent = [0]
+    state = {'expected': time.perf_counter() + PROBE_MS / 1000}
+
+    def probe():
+        now = time.perf_counter()
+        lateness.append(max(0.0, now - state['expected']) * 1000)
+        state['expected'] = now + PROBE_MS / 1000
+
+    # Генератор отправляет уведомления пачками раз в 10 мс, чтобы выдержать частоту
+    per_tick = max(1, rate // 100)
+
+    def generate():
+        for _ in range(per_tick):
+            n = sent[0]
+            notify(f"user{n % senders}", f"сообщение {n}")
+            sent[0] += 1
+
+    probe_timer = QTimer()
+    probe_timer.timeout.connect(probe)
+    probe_timer.start(PROBE_MS)
+    generator = QTimer()
+    generator.timeout.connect(generate)
+    generator.start(10)
+
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+    probe_timer.stop()
+    generator.stop()
+
+    lateness.sort()
+    p99 = lateness[min(len(lateness) - 1, int(len(lateness) * 0.99))]
+    return sent[0], statistics.median(lateness), p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rate', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--senders', type=int, default=20)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+
+    # Прежний путь: новое окно с анимацией на каждое событие
+    windows = []
+
+    def per_event(sender, message):
+        window = NotificationWindow(f"💬 Новое сообщение от {sender}", message)
+        window.show_notification()
+        windows.append(window)
+
+    manager = NotificationManager()
+
+    for name, notify in (('окно на событие', per_event),
+                         ('NotificationManager', manager.notify_message)):
+        sent, p50, p99 = measure(app, notify, args.rate, args.seconds, args.senders)
+        print(f"{name}: {sent} уведомлений, запаздывание цикла событий "
+              f"p50 {p50:.2f} мс, p99 {p99:.2f} мс")
+    print(f"окон создано: {len(windows)} против {len(manager.pool)} в пуле")
+
+
+if __name__ == '__main__':
+    main()
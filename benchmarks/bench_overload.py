@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк ограничения частоты и сброса при перегрузке: потоки-клиенты шлют через Dispatcher
+смесь p2p_message, ice_candidate, heartbeat, get_user_list и server_status, обработчики
+занимают время (как запрос к базе и отправка). Для каждого типа выводится, сколько
+запросов обработано, ограничено корзиной (throttled) и сброшено по перегрузке (shed):
+при перегрузке первыми отбрасываются список пользователей и статус, сообщения и
+сигнализация звонков проходят
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from metrics import Counters, LatencyStats
+from server.dispatch import Dispatcher, RequestContext, TimingMiddleware, ErrorMiddleware
+from server.rate_limit import RateLimitMiddleware, OverloadDetector
+
+# Тип запроса -> (доля в смеси, время обработчика в секундах)
+MIX = {
+    'p2p_message': (0.30, 0.004),
+    'ice_candidate': (0.30, 0.001),
+    'heartbeat': (0.05, 0.0005),
+    'get_user_list': (0.25, 0.008),
+    'server_status': (0.10, 0.004),
+}
+
+
+def make_handler(cost):
+    def handler(ctx):
+        time.sleep(cost)
+        return {'type': 'ack'}
+    return handler
+
+
+def client(dispatcher, stop, flood, k):
+    ctx = RequestContext('127.0.0.1', ('127.0.0.1', 40000 + k), None, None)
+    ctx.username, ctx.user_id = f'user{k}', k
+    types = list(MIX)
+    weights = [MIX[t][0] for t in types]
+    while not stop.is_set():
+        ctx.request = {'type': random.choices(types, weights)[0]}
+        dispatcher.dispatch(ctx)
+        if not flood:
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--flooders', type=int, default=20, help='клиентов, шлющих без пауз')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--max-inflight', type=int, default=32)
+    args = parser.parse_args()
+
+    counters = Counters()
+    detector = OverloadDetector(max_inflight=args.max_inflight)
+    dispatcher = Dispatcher([
+        TimingMiddleware(LatencyStats(), counters),
+        ErrorMiddleware(),
+        RateLimitMiddleware(counters, detector=detector),
+    ])
+    for request_type, (_, cost) in MIX.items():
+        dispatcher.register(request_type, make_handler(cost), auth=False)
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=client, args=(dispatcher, stop, k < args.flooders, k), daemon=True)
+               for k in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    levels = []
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        levels.append(detector.level())
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{args.clients} клиентов ({args.flooders} без пауз), {args.duration:.0f} с; "
+          f"уровень перегрузки: средний {sum(levels) / len(levels):.2f}, максимум {max(levels)}")
+    print(f"{'тип':<15} {'обработано':>11} {'throttled':>10} {'shed':>8}")
+    for request_type in MIX:
+        total = counters.get(('requests', request_type))
+        throttled = counters.get(('throttled', request_type))
+        shed = counters.get(('shed', request_type))
+        print(f"{request_type:<15} {total - throttled - shed:>11} {throttled:>10} {shed:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пула хеширования паролей: входов в секунду при 1/2/4/8 процессах
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+
+from server.password_hasher import PasswordHasher
+
+
+def run(workers, logins, rounds):
+    """Проверка `logins` паролей параллельно из потоков-обработчиков"""
+    hasher = PasswordHasher(workers=workers, rounds=rounds, queue_size=logins,
+                            per_ip_limit=logins, per_user_limit=logins, timeout=600)
+    try:
+        hasher.warm_up()
+        password_hash = hasher.hash_password('password123')
+
+        def login(i):
+            return hasher.verify_password('password123', password_hash, client_ip=f'10.0.0.{i % 250}')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(logins, 64)) as pool:
+            results = list(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+
+        assert all(results)
+        return logins / elapsed
+    finally:
+        hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--rounds', type=int, default=12)
+    args = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()}, bcrypt rounds={args.rounds}, входов={args.logins}")
+    for workers in (1, 2, 4, 8):
+        rate = run(workers, args.logins, args.rounds)
+        print(f"процессов={workers}: {rate:.1f} входов/сек")
+
+
+if __name__ == '__main__':
+    main()
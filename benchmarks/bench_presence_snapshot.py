@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк ответа на get_user_list при 10 тыс. онлайн-пользователей: запросов/сек
+прежнего пути (список словарей на запрос, DEBUG-строка со всеми именами, фильтр
+и json.dumps) против готовых байтов PresenceSnapshot. Шифрование Fernet
+учитывается, если установлен cryptography
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.client_session import ClientSession
+from server.presence_snapshot import PresenceSnapshot
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+def old_response(clients, username, request_id):
+    """Прежние get_online_users + handle_get_user_list + сериализация ответа"""
+    online_users = [session.presence() for session in list(clients.values())]
+    logging.debug(f"Сейчас онлайн: {len(online_users)} пользователей: {[user['username'] for user in online_users]}")
+    filtered_users = [user for user in online_users if user['username'] != username]
+    response = {'type': 'user_list_update', 'users': filtered_users, 'request_id': request_id}
+    return json.dumps(response).encode()
+
+
+def snapshot_response(snapshot, username, request_id):
+    """Путь handle_get_user_list со снимком"""
+    version, users, count = snapshot.users_excluding(username)
+    head = {'type': 'user_list_update', 'version': version, 'request_id': request_id}
+    return json.dumps(head).encode()[:-1] + b', "users": ' + users + b'}'
+
+
+def rate(fn, clients, cipher, seconds):
+    names = list(clients)
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        payload = fn(random.choice(names), str(done))
+        if cipher is not None:
+            cipher.encrypt(payload)
+        done += 1
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--online', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--changes', type=float, default=0,
+                        help='входов/выходов в секунду, сбрасывающих снимок')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    now = time.monotonic()
+    clients = {}
+    for k in range(args.online):
+        session = ClientSession(f"user{k}", None, None, (f"10.0.{k // 256 % 256}.{k % 256}", 40000),
+                                k, now, 50000 + k % 1000, f"10.0.{k // 256 % 256}.{k % 256}")
+        clients[session.username] = session
+    snapshot = PresenceSnapshot(lambda: [session.presence() for session in list(clients.values())])
+
+    # Проверка: ответ совпадает с прежним с точностью до version
+    name = random.choice(list(clients))
+    old = json.loads(old_response(clients, name, '1'))
+    new = json.loads(snapshot_response(snapshot, name, '1'))
+    assert [u['username'] for u in old['users']] == [u['username'] for u in new['users']]
+    assert name not in {u['username'] for u in new['users']} and len(new['users']) == args.online - 1
+
+    cipher = Fernet(Fernet.generate_key()) if Fernet is not None else None
+    if cipher is None:
+        print("cryptography не установлен - шифрование не учитывается")
+
+    old_rate = rate(lambda username, rid: old_response(clients, username, rid), clients, cipher, args.seconds)
+
+    interval = 1.0 / args.changes if args.changes else None
+    last_change = [time.perf_counter()]
+
+    def with_changes(username, rid):
+        if interval and time.perf_counter() - last_change[0] >= interval:
+            snapshot.invalidate()
+            last_change[0] = time.perf_counter()
+        return snapshot_response(snapshot, username, rid)
+
+    new_rate = rate(with_changes, clients, cipher, args.seconds)
+    size = len(snapshot_response(snapshot, name, '1'))
+    print(f"{args.online} онлайн, ответ {size / 1024:.0f} КБ: прежний путь {old_rate:.0f} запросов/с, "
+          f"снимок {new_rate:.0f} запросов/с ({new_rate / old_rate:.0f}x), "
+          f"пересборок снимка: {snapshot.version}")
+
+
+if __name__ == '__main__':
+    main()
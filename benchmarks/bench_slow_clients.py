@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Нагрузка медленными и недобросовестными клиентами на чтение кадров сервера: 1000 клиентов
+шлют запрос по байту (slowloris), несколько клиентов шлют мегабайты без <END>.
+
+Сравниваются прежний цикл handle_client (буфер растет до <END>, ожидание до 300 с)
+и FrameReader с ограничением кадра, дедлайном приема кадра и общим бюджетом памяти.
+Раз в секунду выводятся RSS процесса, байты в буферах и число занятых потоков чтения:
+с FrameReader память остается ровной, а потоки освобождаются через frame_timeout
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import resource
+import selectors
+import threading
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.frame_reader import FrameReader, FrameError, MemoryBudget
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+
+
+class Server:
+    """Поток на соединение, как в SecureDialogServer.handle_client"""
+
+    def __init__(self, mode, budget, max_frame, frame_timeout):
+        self.mode = mode
+        self.budget = budget
+        self.max_frame = max_frame
+        self.frame_timeout = frame_timeout
+        self.listener = socket.socket()
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1024)
+        self.buffers = {}   # поток -> текущий размер буфера (для прежнего цикла)
+        self.readers = set()
+        self.active = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            client_socket, _ = self.listener.accept()
+            if self.budget.overloaded():
+                client_socket.close()
+                with self.lock:
+                    self.dropped += 1
+                continue
+            threading.Thread(target=self.handle, args=(client_socket,), daemon=True).start()
+
+    def handle(self, client_socket):
+        with self.lock:
+            self.active += 1
+        try:
+            if self.mode == 'old':
+                self.legacy_loop(client_socket)
+            else:
+                reader = FrameReader(client_socket, self.budget, max_frame=self.max_frame,
+                                     frame_timeout=self.frame_timeout)
+                self.readers.add(reader)
+                try:
+                    while reader.read_frame() is not None:
+                        pass
+                except (FrameError, OSError):
+                    pass
+                finally:
+                    reader.close()
+                    self.readers.discard(reader)
+        finally:
+            client_socket.close()
+            with self.lock:
+                self.active -= 1
+
+    def legacy_loop(self, client_socket):
+        """Прежнее чтение запроса: recv(4096) и += до <END> в течение 300 с"""
+        key = threading.get_ident()
+        encrypted_request = b""
+        start_time = time.time()
+        try:
+            while time.time() - start_time < 300:
+                try:
+                    client_socket.settimeout(10)
+                    chunk = client_socket.recv(4096)
+                    if not chunk:
+                        return
+                    encrypted_request += chunk
+                    self.buffers[key] = len(encrypted_request)
+                    if encrypted_request.endswith(b"<END>"):
+                        encrypted_request = b""
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+        finally:
+            self.buffers.pop(key, None)
+
+    def buffered(self):
+        if self.mode == 'old':
+            return sum(list(self.buffers.values()))
+        return self.budget.used
+
+
+def drive(address, slow, flooders, flood_bytes, interval, stop):
+    """Один поток с селектором: slow клиентов по байту раз в interval, flooders - поток данных"""
+    selector = selectors.DefaultSelector()
+    slow_socks = []
+    for _ in range(slow):
+        sock = socket.create_connection(address)
+        sock.setblocking(False)
+        slow_socks.append(sock)
+    flood = {}
+    chunk = b"x" * 65536
+    for _ in range(flooders):
+        sock = socket.create_connection(address)
+        sock.setblocking(False)
+        flood[sock] = flood_bytes
+        selector.register(sock, selectors.EVENT_WRITE)
+
+    next_drip = time.monotonic()
+    while not stop.is_set():
+        now = time.monotonic()
+        if now >= next_drip:
+            for sock in slow_socks:
+                try:
+                    sock.send(b"x")
+                except OSError:
+                    pass  # сервер уже закрыл соединение
+            next_drip = now + interval
+        for key, _ in selector.select(timeout=max(0.0, min(0.05, next_drip - now))):
+            sock = key.fileobj
+            try:
+                flood[sock] -= sock.send(chunk[:flood[sock]])
+            except (BlockingIOError, OSError):
+                flood[sock] = 0
+            if flood[sock] <= 0:
+                selector.unregister(sock)
+    for sock in slow_socks + list(flood):
+        sock.close()
+
+
+def run(mode, args):
+    budget = MemoryBudget(limit=args.budget, shed_threshold=0.9)
+    server = Server(mode, budget, args.max_frame, args.frame_timeout)
+    stop = threading.Event()
+    base = rss_mb()
+    driver = threading.Thread(target=drive, args=(server.listener.getsockname(), args.clients, args.flooders,
+                                                  args.flood_bytes, args.interval, stop), daemon=True)
+    driver.start()
+    print(f"\n{mode}: {args.clients} медленных клиентов, {args.flooders} по {args.flood_bytes // 1024} КБ без <END>")
+    print(f"{'сек':>4} {'RSS, МБ':>8} {'в буферах, КБ':>14} {'потоков чтения':>15}")
+    peak = 0
+    for second in range(1, args.duration + 1):
+        time.sleep(1)
+        buffered = server.buffered()
+        peak = max(peak, buffered)
+        print(f"{second:>4} {rss_mb() - base:>8.1f} {buffered // 1024:>14} {server.active:>15}")
+    stop.set()
+    driver.join()
+    line = f"{mode}: пик буферов {peak // 1024} КБ"
+    if mode != 'old':
+        line += f", отказов бюджета {budget.rejected}, отклонено соединений {server.dropped}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--flooders', type=int, default=20)
+    parser.add_argument('--flood-bytes', type=int, default=4 * 1024 * 1024)
+    parser.add_argument('--interval', type=float, default=0.2, help='пауза между байтами медленного клиента')
+    parser.add_argument('--duration', type=int, default=12)
+    parser.add_argument('--max-frame', type=int, default=1024 * 1024)
+    parser.add_argument('--frame-timeout', type=float, default=5)
+    parser.add_argument('--budget', type=int, default=32 * 1024 * 1024)
+    parser.add_argument('--mode', choices=('old', 'frame_reader', 'both'), default='both')
+    args = parser.parse_args()
+
+    for mode in (('old', 'frame_reader') if args.mode == 'both' else (args.mode,)):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
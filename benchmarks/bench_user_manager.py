@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк UserManager: 100 тыс. вызовов save_message - прежний путь (новое
+соединение и два запроса ID на каждый вызов) против постоянного соединения
+потока с LRU-кэшем ID и пакетного save_messages
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.user_manager import UserManager
+
+
+def old_save_message(db_path, sender, receiver, content):
+    """Прежняя реализация: соединение на вызов, ID без кэша"""
+    def user_id(name):
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute("SELECT id FROM users WHERE username = ?", (name,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        sender_id = user_id(sender)
+        receiver_id = user_id(receiver)
+        conn.execute('''
+        INSERT INTO messages (sender_id, receiver_id, content, encrypted, message_type, conversation_key)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (sender_id, receiver_id, content, False, 'text',
+              UserManager.conversation_key(sender_id, receiver_id)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(name, calls, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {elapsed:.1f} с, {calls / elapsed:.0f} сообщений/сек")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    users = [f"user{i}" for i in range(args.users)]
+
+    def pair(n):
+        return users[n % args.users], users[(n * 7 + 1) % args.users], f"сообщение {n}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'users.db')
+        manager = UserManager(db_path)
+        conn = manager.connection()
+        conn.executemany("INSERT INTO users (username, password_hash) VALUES (?, '')", [(u,) for u in users])
+        conn.commit()
+        manager.release(conn)
+
+        run("прежний save_message (соединение на вызов)", args.calls,
+            lambda: [old_save_message(db_path, *pair(n)) for n in range(args.calls)])
+        run("save_message (соединение потока, кэш ID)", args.calls,
+            lambda: [manager.save_message(*pair(n)) for n in range(args.calls)])
+        run(f"save_messages пачками по {args.batch}", args.calls,
+            lambda: [manager.save_messages([pair(n) for n in range(i, min(i + args.batch, args.calls))])
+                     for i in range(0, args.calls, args.batch)])
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
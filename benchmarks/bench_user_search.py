@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска пользователей на 1 млн имен: задержка p50/p99 страницы
+результатов - прежний LIKE '%term%' (полный просмотр таблицы) против индекса
+по имени и триграммного FTS5
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+# Добавляем корень проекта в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from server.user_manager import UserManager
+
+SYLLABLES = ('al', 'ex', 'an', 'dr', 'ma', 'ri', 'ya', 'ko', 'ser', 'gei', 'ol', 'ga', 'vi', 'ta', 'li', 'na')
+
+
+def generate_names(count, rng):
+    names = set()
+    while len(names) < count:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add(f"{name}{rng.randint(0, 9999)}" if rng.random() < 0.7 else name)
+    return list(names)
+
+
+def old_search(conn, term, limit):
+    """Прежний запрос; LIMIT добавлен, чтобы сравнивать одинаковые страницы"""
+    return conn.execute('''
+        SELECT username, is_online, last_login FROM users
+        WHERE username LIKE ?
+        ORDER BY username
+        LIMIT ?
+    ''', (f'%{term}%', limit)).fetchall()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def timed(func, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--old-queries', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    names = generate_names(args.users, rng)
+    # Запросы: начала имен, подстроки из середины и короткие префиксы
+    queries = []
+    for _ in range(args.queries):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(name[:rng.randint(3, 6)])
+        elif kind < 0.8:
+            start = rng.randint(0, max(0, len(name) - 4))
+            queries.append(name[start:start + rng.randint(3, 5)])
+        else:
+            queries.append(name[:2])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'users.db')
+        manager = UserManager(db_path)
+        start = time.perf_counter()
+        conn = manager.connection()
+        conn.executemany("INSERT INTO users (username, password_hash) VALUES (?, '')", [(n,) for n in names])
+        conn.commit()
+        manager.release(conn)
+        print(f"заполнение {args.users} пользователей с индексами: {time.perf_counter() - start:.1f} с")
+
+        p50, p99 = timed(lambda q: manager.search_users_page(q, limit=args.limit), queries)
+        print(f"search_users_page (индексы): p50 {p50:.2f} мс, p99 {p99:.2f} мс на {len(queries)} запросов")
+
+        _, cursor = manager.search_users_page(queries[0], limit=args.limit)
+        p50, p99 = timed(lambda q: manager.search_users_page(q, cursor, args.limit), [queries[0]] * 50)
+        print(f"следующая страница по курсору: p50 {p50:.2f} мс, p99 {p99:.2f} мс")
+
+        old_conn = sqlite3.connect(db_path)
+        p50, p99 = timed(lambda q: old_search(old_conn, q, args.limit), queries[:args.old_queries])
+        print(f"прежний LIKE '%term%': p50 {p50:.2f} мс, p99 {p99:.2f} мс на {args.old_queries} запросов")
+        old_conn.close()
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
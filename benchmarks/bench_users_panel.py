@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк панели пользователей (платформа offscreen): время обновления списка
+из 50 тыс. пользователей и обновления со сменой 1% пользователей
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Добавляем корень проекта и папку клиента в Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'client'))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication, QListWidget
+
+from users_panel import UsersPanel
+
+
+def make_users(count, offset=0):
+    return [{'username': f"user{i:06d}"} for i in range(offset, offset + count)]
+
+
+def churn(users, fraction):
+    """Замена доли пользователей: часть ушла, столько же новых пришло"""
+    changed = int(len(users) * fraction)
+    return users[changed:] + make_users(changed, offset=len(users) * 10)
+
+
+def timed(app, widget, update):
+    start = time.perf_counter()
+    update()
+    widget.repaint()
+    app.processEvents()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_list_widget(app, users, updated):
+    """Прежний путь: clear() и addItem() на каждого пользователя"""
+    widget = QListWidget()
+    widget.show()
+
+    def refill(user_list):
+        widget.clear()
+        for user in user_list:
+            widget.addItem(f"👤 {user['username']}")
+
+    full = timed(app, widget, lambda: refill(users))
+    partial = timed(app, widget, lambda: refill(updated))
+    widget.close()
+    return full, partial
+
+
+def bench_model(app, users, updated):
+    """Новый путь: модель с обновлением по разнице и сортирующая прокси-модель"""
+    panel = UsersPanel()
+    panel.show()
+    full = timed(app, panel, lambda: panel.update_users(users))
+    partial = timed(app, panel, lambda: panel.update_users(updated))
+    assert panel.proxy_model.rowCount() == len(updated)
+    panel.close()
+    return full, partial
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--churn', type=float, default=0.01)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    users = make_users(args.users)
+    updated = churn(users, args.churn)
+
+    for name, bench in (('QListWidget clear/addItem', bench_list_widget), ('UsersModel + прокси', bench_model)):
+        full, partial = bench(app, users, updated)
+        print(f"{name}: первое заполнение {full:.1f} мс, обновление со сменой "
+              f"{args.churn:.0%} {partial:.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import re
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QLineEdit, 
                              QPushButton, QHBoxLayout, QFormLayout, 
-                             QMessageBox, QApplication)
+                             QMessageBox, QApplication, QCheckBox)
 from PyQt5.QtCore import Qt, pyqtSignal
 from styles.auth_style import AUTH_DIALOG_STYLE, REGISTER_STYLE_EXTRA, LOGIN_STYLE_EXTRA
 import logging
@@ -160,11 +160,18 @@ class RegistrationWindow(QDialog):
 
 class AuthWindow(QDialog):
     login_success = pyqtSignal(str)
+    # Испускаются из потока подключения, обрабатываются в потоке GUI
+    connection_ready = pyqtSignal()
+    connection_failed = pyqtSignal()
+    status_changed = pyqtSignal(str)
     
     def __init__(self, network_client, parent=None):
         super().__init__(parent)
         self.network_client = network_client
         self.init_ui()
+        self.connection_ready.connect(self.try_saved_login)
+        self.connection_failed.connect(self.on_connection_failed)
+        self.status_changed.connect(self.status_label.setText)
         
     def init_ui(self):
         self.setWindowTitle('Вход в Диалог')
@@ -210,6 +217,11 @@ class AuthWindow(QDialog):
         
         layout.addLayout(form_layout)
         
+        # Вход без пароля при следующем запуске
+        self.remember_check = QCheckBox("Запомнить меня")
+        self.remember_check.setChecked(self.network_client.has_saved_login())
+        layout.addWidget(self.remember_check)
+        
         # Кнопки
         buttons_layout = QHBoxLayout()
         
@@ -260,7 +272,7 @@ class AuthWindow(QDialog):
         self.status_label.setText("Проверка учетных данных...")
         
         try:
-            if self.network_client.login(username, password):
+            if self.network_client.login(username, password, remember=self.remember_check.isChecked()):
                 self.login_success.emit(username)
                 self.accept()
             else:
@@ -275,6 +287,30 @@ class AuthWindow(QDialog):
             if not self.network_client.connected:
                 self.status_label.setText("Нет подключения к серверу")
 
+    def on_connection_failed(self):
+        """Сообщение о неудачном подключении к серверу"""
+        QMessageBox.warning(self, 'Ошибка', 'Не удалось подключиться к серверу')
+        
+    def try_saved_login(self):
+        """Вход по сохраненному токену сразу после подключения к серверу"""
+        if not self.network_client.connected or not self.network_client.has_saved_login():
+            return
+            
+        self.setCursor(Qt.WaitCursor)
+        self.login_btn.setEnabled(False)
+        self.status_label.setText("Вход по сохраненной сессии...")
+        
+        try:
+            username = self.network_client.token_login()
+            if username:
+                self.login_success.emit(username)
+                self.accept()
+            else:
+                self.status_label.setText("Сессия истекла, войдите с паролем")
+        finally:
+            self.setCursor(Qt.ArrowCursor)
+            self.login_btn.setEnabled(True)
+            
     def show_registration(self):
         """Показать окно регистрации"""
         registration_window = RegistrationWindow(self.network_client, self)
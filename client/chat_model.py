@@ -0,0 +1,267 @@
+"""
+Модель истории чата с ограниченным окном сообщений в памяти
+"""
+
+import bisect
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import Qt, QObject, QAbstractListModel, QModelIndex, QRect, QSize, pyqtSignal
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+
+logger = logging.getLogger('dialog_gui')
+
+# Запись сообщения: (message_id, sender, text, is_own, timestamp)
+MessageRecord = Tuple[int, str, str, bool, str]
+
+
+class MemoryTranscriptStore:
+    """Хранилище истории в памяти процесса: компактные кортежи вместо строк документа.
+    Используется, пока не подключено локальное хранилище на диске"""
+
+    def __init__(self):
+        self.messages: Dict[str, List[MessageRecord]] = {}
+        self.next_id = 1
+
+    def append(self, username: str, batch) -> List[MessageRecord]:
+        """Сохранение пачки [(sender, text, is_own, timestamp)], возвращает записи с ID"""
+        records = []
+        for sender, text, is_own, timestamp in batch:
+            records.append((self.next_id, sender, text, is_own, timestamp))
+            self.next_id += 1
+        self.messages.setdefault(username, []).extend(records)
+        return records
+
+    def load_before(self, username: str, before_id: Optional[int], limit: int) -> List[MessageRecord]:
+        """До `limit` сообщений старше before_id (None - самые новые), по возрастанию ID"""
+        messages = self.messages.get(username, [])
+        end = len(messages) if before_id is None else bisect.bisect_left(messages, (before_id,))
+        return messages[max(0, end - limit):end]
+
+    def load_after(self, username: str, after_id: int, limit: int) -> List[MessageRecord]:
+        """До `limit` сообщений новее after_id, по возрастанию ID"""
+        messages = self.messages.get(username, [])
+        start = bisect.bisect_left(messages, (after_id + 1,))
+        return messages[start:start + limit]
+
+
+def format_message(record: MessageRecord) -> str:
+    """Текст строки истории"""
+    _, sender, text, is_own, timestamp = record
+    if is_own:
+        return f"[{timestamp}] 👤 Вы: {text}"
+    return f"[{timestamp}] 👤 {sender}: {text}"
+
+
+class ChatHistoryModel(QAbstractListModel):
+    """История одного чата: в модели только окно из последних `window_size` сообщений,
+    более старые подгружаются из хранилища страницами при прокрутке вверх"""
+
+    MessageRole = Qt.UserRole + 1
+
+    def __init__(self, username, store=None, window_size=500, page_size=100, parent=None):
+        super().__init__(parent)
+        self.username = username
+        self.store = store if store is not None else MemoryTranscriptStore()
+        self.window_size = window_size
+        self.page_size = page_size
+        self.rows: List[MessageRecord] = []
+        self.has_older = False  # В хранилище есть сообщения выше окна
+        self.has_newer = False  # Окно прокручено в прошлое, новые сообщения ниже окна
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        record = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return format_message(record)
+        if role == self.MessageRole:
+            return record
+        return None
+
+    def row_of(self, message_id):
+        """Номер строки сообщения в окне или -1"""
+        row = bisect.bisect_left(self.rows, (message_id,))
+        if row < len(self.rows) and self.rows[row][0] == message_id:
+            return row
+        return -1
+
+    def load_latest(self):
+        """Заполнение окна последними сообщениями из хранилища"""
+        records = self.store.load_before(self.username, None, self.page_size)
+        self.beginResetModel()
+        self.rows = list(records)
+        self.has_older = len(records) == self.page_size
+        self.has_newer = False
+        self.endResetModel()
+
+    def append_messages(self, batch):
+        """Добавление новых сообщений: запись в хранилище и, если окно у конца, в модель"""
+        records = self.store.append(self.username, batch)
+        if self.has_newer:
+            # Пользователь листает старую историю - окно не трогаем
+            return records
+
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        self.rows.extend(records)
+        self.endInsertRows()
+        self.trim_top()
+        return records
+
+    def load_older(self):
+        """Подгрузка страницы старых сообщений в начало окна. Возвращает число строк"""
+        if not self.has_older:
+            return 0
+        before_id = self.rows[0][0] if self.rows else None
+        records = self.store.load_before(self.username, before_id, self.page_size)
+        if len(records) < self.page_size:
+            self.has_older = False
+        if not records:
+            return 0
+
+        self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+        self.rows[0:0] = records
+        self.endInsertRows()
+        self.trim_bottom()
+        return len(records)
+
+    def load_newer(self):
+        """Подгрузка страницы более новых сообщений в конец окна. Возвращает число
+        строк, удаленных сверху"""
+        if not self.has_newer or not self.rows:
+            return 0
+        records = self.store.load_after(self.username, self.rows[-1][0], self.page_size)
+        if len(records) < self.page_size:
+            self.has_newer = False
+        if not records:
+            return 0
+
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        self.rows.extend(records)
+        self.endInsertRows()
+        return self.trim_top()
+
+    def trim_top(self):
+        """Удаление старых строк сверху сверх размера окна"""
+        excess = len(self.rows) - self.window_size
+        if excess <= 0:
+            return 0
+        self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+        del self.rows[:excess]
+        self.endRemoveRows()
+        self.has_older = True
+        return excess
+
+    def trim_bottom(self):
+        """Удаление новых строк снизу сверх размера окна"""
+        excess = len(self.rows) - self.window_size
+        if excess <= 0:
+            return 0
+        first = len(self.rows) - excess
+        self.beginRemoveRows(QModelIndex(), first, len(self.rows) - 1)
+        del self.rows[first:]
+        self.endRemoveRows()
+        self.has_newer = True
+        return excess
+
+
+class Conversation(QObject):
+    """Состояние переписки с пользователем независимо от виджета: история,
+    счетчики сообщений и черновик ввода"""
+
+    unread_count_changed = pyqtSignal(str, int)  # username, unread_count
+    messages_appended = pyqtSignal()
+
+    def __init__(self, username, store=None, parent=None):
+        super().__init__(parent)
+        self.username = username
+        self.model = ChatHistoryModel(username, store, parent=self)
+        self.model.load_latest()
+        self.message_count = 0  # Счетчик всех сообщений
+        self.unread_count = 0   # Счетчик непрочитанных сообщений
+        self.is_active = False  # Переписка открыта в текущей вкладке
+        self.draft = ""
+
+    def add_messages(self, batch):
+        """Добавление пачки сообщений [(sender, message, is_own, timestamp)]"""
+        self.message_count += len(batch)
+
+        # Увеличиваем счетчик непрочитанных, если это не наши сообщения и вкладка не активна
+        if not self.is_active:
+            incoming = sum(1 for _, _, is_own, _ in batch if not is_own)
+            if incoming:
+                self.unread_count += incoming
+                self.unread_count_changed.emit(self.username, self.unread_count)
+
+        # При просмотре старой истории своё сообщение возвращает к последним сообщениям
+        self.model.append_messages(batch)
+        if self.model.has_newer and any(is_own for _, _, is_own, _ in batch):
+            self.model.load_latest()
+        self.messages_appended.emit()
+
+    def set_active(self, active):
+        """Установка флага активности вкладки"""
+        self.is_active = active
+        if active:
+            self.mark_as_read()
+
+    def mark_as_read(self):
+        """Пометить все сообщения как прочитанные"""
+        if self.unread_count > 0:
+            old_unread = self.unread_count
+            self.unread_count = 0
+            self.unread_count_changed.emit(self.username, 0)
+            logger.info(f"Conversation.mark_as_read: Сброшено {old_unread} непрочитанных сообщений в чате с {self.username}")
+
+
+class ChatMessageDelegate(QStyledItemDelegate):
+    """Отрисовка строки истории с переносом; однострочные сообщения имеют одинаковую
+    высоту и не требуют расчета переноса"""
+
+    PADDING = 6
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.size_cache: Dict[Tuple[int, int], QSize] = {}
+        self.cache_width = -1
+
+    def sizeHint(self, option, index):
+        record = index.data(ChatHistoryModel.MessageRole)
+        width = max(option.rect.width(), 1)
+        if width != self.cache_width:
+            # Ширина изменилась - пересчитываем переносы заново
+            self.size_cache.clear()
+            self.cache_width = width
+
+        key = (record[0], width)
+        size = self.size_cache.get(key)
+        if size is None:
+            metrics = option.fontMetrics
+            text = format_message(record)
+            text_width = width - 2 * self.PADDING
+            if metrics.horizontalAdvance(text) <= text_width:
+                height = metrics.height()
+            else:
+                height = metrics.boundingRect(QRect(0, 0, text_width, 0), Qt.TextWordWrap, text).height()
+            size = QSize(width, height + 2 * self.PADDING)
+            if len(self.size_cache) > 4096:
+                self.size_cache.clear()
+            self.size_cache[key] = size
+        return size
+
+    def paint(self, painter, option, index):
+        record = index.data(ChatHistoryModel.MessageRole)
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        rect = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        painter.drawText(rect, Qt.TextWordWrap, format_message(record))
+        painter.restore()
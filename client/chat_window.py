@@ -1,46 +1,64 @@
 import time
 import logging
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTextEdit, QLineEdit, QPushButton, QHBoxLayout
-from PyQt5.QtCore import Qt, pyqtSignal
-from styles.main_style import CHAT_WINDOW_STYLE
+from collections import OrderedDict
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QListView, QLineEdit, QPushButton, QHBoxLayout, QAbstractItemView
+from PyQt5.QtCore import Qt, QPoint, pyqtSignal
+from chat_model import ChatHistoryModel, ChatMessageDelegate, Conversation
 
 logger = logging.getLogger('dialog_gui')
 
 class ChatWindow(QWidget):
+    """Представление переписки. Окно не хранит сообщений и может быть
+    переназначено другой переписке через bind(); стили задаются на уровне приложения"""
+
     message_sent = pyqtSignal(str, str)  # username, message
-    unread_count_changed = pyqtSignal(str, int)  # username, unread_count
     call_requested = pyqtSignal(str, str)  # username, call_type
     
-    def __init__(self, username):
+    def __init__(self, username=None, store=None):
         super().__init__()
-        self.username = username
-        self.message_count = 0  # Счетчик всех сообщений
-        self.unread_count = 0   # Счетчик непрочитанных сообщений
-        self.is_active_tab = False  # Флаг активности вкладки
+        self.conversation = None
+        self.paging = False  # Идет подгрузка страницы истории
         self.init_ui()
+        if username is not None:
+            self.bind(Conversation(username, store, parent=self))
+
+    @property
+    def username(self):
+        return self.conversation.username if self.conversation else None
+
+    @property
+    def history_model(self):
+        return self.conversation.model if self.conversation else None
+
+    @property
+    def message_count(self):
+        return self.conversation.message_count if self.conversation else 0
+
+    @property
+    def unread_count(self):
+        return self.conversation.unread_count if self.conversation else 0
         
     def init_ui(self):
+        self.setObjectName("chat_window")
         layout = QVBoxLayout()
         layout.setContentsMargins(12, 12, 12, 12)
         layout.setSpacing(12)
         
         # Заголовок с счетчиком сообщений
-        self.title_label = QLabel(f"💬 Чат с {self.username}")
+        self.title_label = QLabel()
+        self.title_label.setObjectName("chat_title")
         self.title_label.setAlignment(Qt.AlignCenter)
-        self.title_label.setStyleSheet("""
-            font-size: 16px; 
-            font-weight: bold; 
-            color: #2c3e50; 
-            padding: 12px;
-            background-color: #f8f9fa;
-            border-radius: 8px;
-        """)
         layout.addWidget(self.title_label)
         
-        # История сообщений
-        self.chat_history = QTextEdit()
+        # История сообщений: отображаются только видимые строки окна модели
+        self.chat_history = QListView()
         self.chat_history.setObjectName("chat_history")
-        self.chat_history.setReadOnly(True)
+        self.chat_history.setItemDelegate(ChatMessageDelegate(self.chat_history))
+        self.chat_history.setWordWrap(True)
+        self.chat_history.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.chat_history.setSelectionMode(QAbstractItemView.NoSelection)
+        self.chat_history.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.chat_history.verticalScrollBar().valueChanged.connect(self.on_history_scrolled)
         layout.addWidget(self.chat_history)
         
         # Кнопки звонков в чате
@@ -78,24 +96,44 @@ class ChatWindow(QWidget):
         layout.addLayout(input_layout)
         self.setLayout(layout)
         
-        # Применяем стили
-        self.setStyleSheet(CHAT_WINDOW_STYLE)
+    def bind(self, conversation):
+        """Переключение окна на другую переписку"""
+        if conversation is self.conversation:
+            return
+        self.unbind()
+
+        self.conversation = conversation
+        conversation.unread_count_changed.connect(self.on_unread_count_changed)
+        conversation.messages_appended.connect(self.on_messages_appended)
+        self.chat_history.setModel(conversation.model)
+        self.message_input.setText(conversation.draft)
         self.update_title()
+        self.chat_history.scrollToBottom()
+
+    def unbind(self):
+        """Отвязка от текущей переписки с сохранением черновика"""
+        if self.conversation is None:
+            return
+        conversation = self.conversation
+        conversation.draft = self.message_input.text()
+        conversation.unread_count_changed.disconnect(self.on_unread_count_changed)
+        conversation.messages_appended.disconnect(self.on_messages_appended)
+        self.chat_history.setModel(None)
+        self.message_input.clear()
+        self.conversation = None
         
     def set_active(self, active):
         """Установка флага активности вкладки"""
-        self.is_active_tab = active
-        if active and self.unread_count > 0:
-            self.mark_as_read()
+        if self.conversation:
+            self.conversation.set_active(active)
             
     def mark_as_read(self):
         """Пометить все сообщения как прочитанные"""
-        if self.unread_count > 0:
-            old_unread = self.unread_count
-            self.unread_count = 0
-            self.update_title()
-            self.unread_count_changed.emit(self.username, 0)
-            logger.info(f"ChatWindow.mark_as_read: Сброшено {old_unread} непрочитанных сообщений в чате с {self.username}")
+        if self.conversation:
+            self.conversation.mark_as_read()
+
+    def on_unread_count_changed(self, username, unread_count):
+        self.update_title()
         
     def update_title(self):
         """Обновление заголовка с учетом непрочитанных"""
@@ -104,45 +142,92 @@ class ChatWindow(QWidget):
         
     def send_message(self):
         message = self.message_input.text().strip()
-        if message:
+        if message and self.conversation:
             self.message_sent.emit(self.username, message)
             self.add_message("Вы", message, is_own=True)
             self.message_input.clear()
             
     def add_message(self, sender, message, is_own=False):
+        """Добавление одного сообщения"""
+        self.add_messages([(sender, message, is_own, time.strftime("%H:%M:%S"))])
+        
+    def add_messages(self, batch):
+        """Добавление пачки сообщений [(sender, message, is_own, timestamp)] в переписку"""
         try:
-            logger.info(f"ChatWindow.add_message: Добавление сообщения в чат {self.username}: {sender} - {message}")
-            
-            # Увеличиваем общий счетчик сообщений
-            self.message_count += 1
-            
-            # Увеличиваем счетчик непрочитанных, если это не наше сообщение и вкладка не активна
-            if not is_own and not self.is_active_tab:
-                self.unread_count += 1
-                self.unread_count_changed.emit(self.username, self.unread_count)
-                logger.info(f"ChatWindow.add_message: Увеличено количество непрочитанных до {self.unread_count}")
+            logger.debug(f"ChatWindow.add_messages: Добавление {len(batch)} сообщений в чат {self.username}")
+            self.conversation.add_messages(batch)
+        except Exception as e:
+            logger.error(f"ChatWindow.add_messages: Ошибка при добавлении сообщений в чат: {e}")
             
-            self.update_title()
+    def on_messages_appended(self):
+        """Прокрутка к новым сообщениям, если окно показывает конец истории"""
+        if not self.history_model.has_newer:
+            self.chat_history.scrollToBottom()
+
+    def on_history_scrolled(self, value):
+        """Подгрузка страниц истории при достижении края списка"""
+        if self.paging or self.conversation is None:
+            return
+        scrollbar = self.chat_history.verticalScrollBar()
+        model = self.history_model
+        if value == scrollbar.minimum() and model.has_older:
+            self.load_history_page(model.load_older)
+        elif value == scrollbar.maximum() and model.has_newer:
+            self.load_history_page(model.load_newer)
             
-            # Простой текст без HTML
-            timestamp = time.strftime("%H:%M:%S")
-            if is_own:
-                full_message = f"[{timestamp}] 👤 Вы: {message}"
+    def load_history_page(self, load):
+        """Загрузка страницы с сохранением видимой позиции списка"""
+        anchor = self.chat_history.indexAt(QPoint(0, 0))
+        anchor_id = anchor.data(ChatHistoryModel.MessageRole)[0] if anchor.isValid() else None
+        self.paging = True
+        try:
+            load()
+            if anchor_id is not None:
+                row = self.history_model.row_of(anchor_id)
+                if row >= 0:
+                    self.chat_history.scrollTo(self.history_model.index(row), QAbstractItemView.PositionAtTop)
+        finally:
+            self.paging = False
+
+
+class ChatWindowPool:
+    """Небольшой пул окон чата: окно создается, только когда вкладка становится
+    видимой, а при исчерпании пула переназначается из давно не показанной вкладки"""
+
+    def __init__(self, size, setup_window):
+        self.size = size
+        self.setup_window = setup_window  # Подключение сигналов нового окна
+        self.bound = OrderedDict()  # username -> окно, от давно показанных к недавним
+        self.free = []
+
+    def acquire(self, conversation, container):
+        """Окно для переписки, размещенное в контейнере вкладки"""
+        window = self.bound.pop(conversation.username, None)
+        if window is None:
+            if self.free:
+                window = self.free.pop()
+            elif len(self.bound) < self.size:
+                window = ChatWindow()
+                self.setup_window(window)
             else:
-                full_message = f"[{timestamp}] 👤 {sender}: {message}"
-            
-            # Добавляем сообщение в историю
-            self.chat_history.append(full_message)
-            
-            # Прокручиваем вниз
-            scrollbar = self.chat_history.verticalScrollBar()
-            scrollbar.setValue(scrollbar.maximum())
-            
-            # Принудительно обновляем отображение
-            self.chat_history.repaint()
-            QApplication.processEvents()
-            
-            logger.info(f"ChatWindow.add_message: Сообщение успешно добавлено в чат {self.username}: '{full_message}'")
-            
-        except Exception as e:
-            logger.error(f"ChatWindow.add_message: Ошибка при добавлении сообщения в чат: {e}")
\ No newline at end of file
+                _, window = self.bound.popitem(last=False)
+            window.bind(conversation)
+
+        if window.parent() is not container:
+            container.layout().addWidget(window)
+            window.show()
+        self.bound[conversation.username] = window
+        return window
+
+    def release(self, username):
+        """Возврат окна закрытой вкладки в пул"""
+        window = self.bound.pop(username, None)
+        if window is not None:
+            window.unbind()
+            window.hide()
+            window.setParent(None)
+            self.free.append(window)
+
+    def window_for(self, username):
+        """Окно, показывающее переписку, или None"""
+        return self.bound.get(username)
@@ -0,0 +1,74 @@
+"""
+Пакетная доставка сетевых событий в виджеты
+"""
+
+import time
+import html
+import logging
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QTextCursor
+
+logger = logging.getLogger('dialog_gui')
+
+
+def append_lines(text_edit, lines):
+    """Добавление строк в QTextEdit одной вставкой и одной прокруткой"""
+    if not lines:
+        return
+    cursor = text_edit.textCursor()
+    cursor.movePosition(QTextCursor.End)
+    prefix = '<br>' if not text_edit.document().isEmpty() else ''
+    cursor.insertHtml(prefix + '<br>'.join(html.escape(line) for line in lines))
+    scrollbar = text_edit.verticalScrollBar()
+    scrollbar.setValue(scrollbar.maximum())
+
+
+class EventDispatcher(QObject):
+    """Накапливает входящие сообщения и системные строки и отдает их виджетам
+    пачками не чаще одного раза за кадр (по умолчанию 16 мс)"""
+
+    def __init__(self, deliver_messages, deliver_system, interval_ms=16, parent=None):
+        super().__init__(parent)
+        self.deliver_messages = deliver_messages  # (username, [(sender, text, is_own, timestamp)])
+        self.deliver_system = deliver_system      # ([строка, ...])
+        self.pending_messages = {}
+        self.pending_system = []
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.flush)
+
+    def post_message(self, username, sender, message, is_own=False):
+        """Сообщение в чат с username"""
+        timestamp = time.strftime("%H:%M:%S")
+        self.pending_messages.setdefault(username, []).append((sender, message, is_own, timestamp))
+        self.schedule()
+
+    def post_system(self, line):
+        """Строка для системной вкладки"""
+        self.pending_system.append(line)
+        self.schedule()
+
+    def schedule(self):
+        """Запуск таймера сброса, если он еще не запущен"""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        """Вывод накопленных событий: одна вставка на чат за кадр"""
+        messages, self.pending_messages = self.pending_messages, {}
+        system_lines, self.pending_system = self.pending_system, []
+
+        for username, batch in messages.items():
+            try:
+                self.deliver_messages(username, batch)
+            except Exception as e:
+                logger.error(f"EventDispatcher.flush: Ошибка вывода сообщений чата {username}: {e}")
+
+        if system_lines:
+            try:
+                self.deliver_system(system_lines)
+            except Exception as e:
+                logger.error(f"EventDispatcher.flush: Ошибка вывода системных сообщений: {e}")
@@ -5,7 +5,7 @@ import time
 import logging
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QTabWidget, QAction, QMenu, 
-                             QMessageBox, QStatusBar, QTextEdit, QDialog,
+                             QMessageBox, QStatusBar, QTextEdit, QDialog, QInputDialog,
                              QSystemTrayIcon, QStyle, QDesktopWidget)
 from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 from PyQt5.QtGui import QIcon
@@ -19,9 +19,13 @@ try:
     from network_secure import SecureNetworkClient
     from auth_window import AuthWindow
     from users_panel import UsersPanel
-    from chat_window import ChatWindow
-    from notifications import NotificationWindow
+    from chat_window import ChatWindowPool
+    from chat_model import Conversation, MemoryTranscriptStore
+    from message_cache import MessageCache
+    from notifications import NotificationManager
     from call_window import CallWindow
+    from qt_transport import QtSocketTransport
+    from event_dispatcher import EventDispatcher, append_lines
 except ImportError as e:
     print(f"Ошибка импорта: {e}")
     print("Убедитесь, что все файлы находятся в той же папке")
@@ -29,19 +33,23 @@ except ImportError as e:
 
 # Импортируем стили
 try:
-    from styles.main_style import MAIN_WINDOW_STYLE
+    from styles.main_style import MAIN_WINDOW_STYLE, CHAT_WINDOW_STYLE
 except ImportError as e:
     print(f"Ошибка импорта стилей: {e}")
     MAIN_WINDOW_STYLE = ""
+    CHAT_WINDOW_STYLE = ""
 
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger('dialog_gui')
 
 class SecureMainWindow(QMainWindow):
+    CHAT_WINDOW_POOL_SIZE = 3  # Окон чата в памяти независимо от числа вкладок
+    
     # Определяем сигналы как атрибуты класса
     sig_message_received = pyqtSignal(str, str)
     sig_user_list_updated = pyqtSignal(list)
+    sig_presence_changed = pyqtSignal(dict)
     sig_connection_status = pyqtSignal(str)
     sig_message_status = pyqtSignal(str, str)
     sig_call_received = pyqtSignal(str, str, str, str)  # action, username, call_type, call_id
@@ -50,20 +58,28 @@ class SecureMainWindow(QMainWindow):
         super().__init__()
         self.network_client = network_client
         self.username = username
-        self.active_chats = {}
+        self.conversations = {}  # username -> Conversation
+        self.active_chats = {}   # username -> контейнер вкладки открытого чата
+        self.current_conversation = None
+        self.transcript_store = self.open_transcript_store()
+        self.chat_pool = ChatWindowPool(self.CHAT_WINDOW_POOL_SIZE, self.setup_chat_window)
         self.update_thread = None
         self.is_authenticated = True
         self.pending_messages = {}
         self.notifications_enabled = True
-        self.active_notifications = []
+        self.notifications = None
         
         # Для звонков
         self.active_calls = {}
         self.pending_calls = {}
         
+        # Входящие сообщения и статусы выводятся в виджеты пачками раз в кадр
+        self.dispatcher = EventDispatcher(self.deliver_messages, self.deliver_system_lines, parent=self)
+        
         # Сразу подключаем сигналы к слотам
         self.sig_message_received.connect(self.handle_message)
         self.sig_user_list_updated.connect(self.update_user_list)
+        self.sig_presence_changed.connect(self.update_presence)
         self.sig_connection_status.connect(self.update_connection_status)
         self.sig_message_status.connect(self.handle_message_status)
         self.sig_call_received.connect(self.handle_call)
@@ -77,7 +93,7 @@ class SecureMainWindow(QMainWindow):
         """Инициализация пользовательского интерфейса"""
         self.setWindowTitle(f'💬 Диалог - Безопасный мессенджер (Пользователь: {self.username})')
         self.setGeometry(100, 100, 1000, 700)
-        self.setStyleSheet(MAIN_WINDOW_STYLE)
+        # Стили задаются один раз на уровне приложения (см. DialogApplication.apply_styles)
         
         # Центральный виджет
         central_widget = QWidget()
@@ -113,15 +129,43 @@ class SecureMainWindow(QMainWindow):
         self.users_panel.user_selected.connect(self.open_chat)
         self.users_panel.refresh_requested.connect(self.refresh_user_list)
         self.users_panel.call_requested.connect(self.start_call)
+        self.users_panel.add_contact_requested.connect(self.add_contact)
+        self.users_panel.remove_contact_requested.connect(self.remove_contact)
         
-        # Создаем системный трей
+        # Создаем системный трей и менеджер уведомлений
         self.setup_system_tray()
+        self.notifications = NotificationManager(self.tray_icon, parent=self)
         
         # Запускаем работу мессенджера
         self.start_messaging()
         
         logger.info("Интерфейс инициализирован, сигналы подключены")
         
+    def open_transcript_store(self):
+        """Локальный кэш истории; при ошибке история хранится только в памяти"""
+        try:
+            return MessageCache(self.username)
+        except Exception as e:
+            logger.error(f"SecureMainWindow.open_transcript_store: Не удалось открыть кэш сообщений: {e}")
+            return MemoryTranscriptStore()
+            
+    def search_history(self):
+        """Поиск по локальной истории переписок"""
+        if not hasattr(self.transcript_store, 'search'):
+            QMessageBox.information(self, 'Поиск', 'Локальный кэш сообщений недоступен')
+            return
+        query, ok = QInputDialog.getText(self, '🔍 Поиск по истории', 'Слова для поиска:')
+        if not ok or not query.strip():
+            return
+            
+        results = self.transcript_store.search(query)
+        lines = [f"🔍 Найдено сообщений по запросу «{query}»: {len(results)}"]
+        for peer, (_, sender, text, is_own, timestamp) in results:
+            author = "Вы" if is_own else sender
+            lines.append(f"[{timestamp}] 💬 {peer} — {author}: {text}")
+        self.deliver_system_lines(lines)
+        self.tabs.setCurrentIndex(0)
+        
     def setup_system_tray(self):
         """Настройка системного трея"""
         if QSystemTrayIcon.isSystemTrayAvailable():
@@ -171,37 +215,28 @@ class SecureMainWindow(QMainWindow):
         if not self.notifications_enabled:
             return
             
-        # Создаем и показываем уведомление
-        notification = NotificationWindow(title, message)
-        notification.show_notification()
-        self.active_notifications.append(notification)
+        # Окно из пула уведомлений и сообщение в трее с ограничением частоты
+        self.notifications.notify(title, message)
         
-        # Удаляем уведомление из списка после закрытия
-        def remove_notification():
-            if notification in self.active_notifications:
-                self.active_notifications.remove(notification)
-                
-        notification.close_animation.finished.connect(remove_notification)
-        
-        # Также показываем уведомление в системном трее если доступно
-        if self.tray_icon:
-            self.tray_icon.showMessage(
-                title,
-                message,
-                QSystemTrayIcon.Information,
-                3000
-            )
+    def show_message_notification(self, sender, message, count=1):
+        """Уведомление о сообщениях: сводится по отправителю"""
+        if not self.notifications_enabled:
+            return
+        self.notifications.notify_message(sender, message, count)
         
     def on_tab_changed(self, index):
-        """Обработка смены вкладки"""
+        """Обработка смены вкладки: окно чата берется из пула только для видимой вкладки"""
+        if self.current_conversation is not None:
+            self.current_conversation.set_active(False)
+            self.current_conversation = None
+            
         if index > 0:  # Не системная вкладка
-            widget = self.tabs.widget(index)
-            if hasattr(widget, 'set_active'):
-                widget.set_active(True)
-                # Помечаем все активные чаты как неактивные, кроме текущего
-                for username, chat in self.active_chats.items():
-                    if chat != widget and hasattr(chat, 'set_active'):
-                        chat.set_active(False)
+            container = self.tabs.widget(index)
+            conversation = self.conversations.get(getattr(container, 'username', None))
+            if conversation is not None:
+                self.chat_pool.acquire(conversation, container)
+                conversation.set_active(True)
+                self.current_conversation = conversation
         
     def start_messaging(self):
         """Запуск работы мессенджера после успешной аутентификации"""
@@ -209,6 +244,7 @@ class SecureMainWindow(QMainWindow):
         logger.info("Установка обработчиков сообщений и статусов")
         self.network_client.set_message_handler(self.handle_incoming_message)
         self.network_client.set_status_handler(self.handle_incoming_status)
+        self.network_client.set_presence_handler(self.sig_presence_changed.emit)
         self.sig_connection_status.emit("✅ Подключено к серверу")
         
         # Инициализируем аудио
@@ -251,10 +287,14 @@ class SecureMainWindow(QMainWindow):
         # Меню Файл
         file_menu = menubar.addMenu('Файл')
         
-        refresh_action = QAction('🔄 Обновить список пользователей', self)
+        refresh_action = QAction('🔄 Обновить список контактов', self)
         refresh_action.triggered.connect(self.refresh_user_list)
         file_menu.addAction(refresh_action)
         
+        search_action = QAction('🔍 Поиск по истории', self)
+        search_action.triggered.connect(self.search_history)
+        file_menu.addAction(search_action)
+        
         file_menu.addSeparator()
         
         # Уведомления
@@ -361,94 +401,125 @@ class SecureMainWindow(QMainWindow):
         self.is_authenticated = False
         
     def listen_for_updates(self):
-        """Прослушивание обновлений от сервера"""
+        """Загрузка списка контактов; дальше статусы приходят от сервера событиями presence_update"""
         while self.network_client.connected and self.is_authenticated:
             try:
-                # Получаем список пользователей
-                users = self.network_client.get_user_list()
-                if users is not None:
-                    self.sig_user_list_updated.emit(users)
-                
-                time.sleep(20)
+                contacts = self.network_client.get_contacts()
+                if contacts is not None:
+                    self.sig_user_list_updated.emit(contacts)
+                    break
             
             except Exception as e:
+                # Виджеты трогаем только из потока GUI - через сигналы
                 error_msg = str(e)
                 if "Не авторизован" in error_msg or "authorized" in error_msg.lower():
                     self.is_authenticated = False
-                    self.system_chat.append("❌ Ошибка авторизации. Требуется повторный вход.")
+                    self.sig_connection_status.emit("❌ Ошибка авторизации. Требуется повторный вход.")
                     break
                 else:
-                    self.system_chat.append(f"⚠️ Ошибка получения обновлений: {e}")
-                time.sleep(20)
+                    self.sig_message_status.emit("error", f"Ошибка получения контактов: {e}")
+            time.sleep(20)
         
     def refresh_user_list(self):
-        """Обновление списка пользователей"""
+        """Обновление списка контактов"""
         if self.network_client.connected and self.is_authenticated:
-            users = self.network_client.get_user_list()
-            if users:
-                self.sig_user_list_updated.emit(users)
+            contacts = self.network_client.get_contacts()
+            if contacts is not None:
+                self.sig_user_list_updated.emit(contacts)
+                
+    def update_presence(self, user):
+        """Изменение статуса контакта"""
+        self.users_panel.update_user(user)
+        
+    def add_contact(self, username=''):
+        """Добавление контакта по имени (из строки поиска или диалога)"""
+        if not username:
+            username, ok = QInputDialog.getText(self, '➕ Новый контакт', 'Имя пользователя:')
+            username = username.strip()
+            if not ok or not username:
+                return
+        contact = self.network_client.add_contact(username)
+        if contact:
+            self.users_panel.update_user(contact)
+            self.statusBar().showMessage(f"Контакт {username} добавлен")
+        else:
+            self.statusBar().showMessage(f"Не удалось добавить контакт {username}")
+            
+    def remove_contact(self, username):
+        """Удаление контакта"""
+        if self.network_client.remove_contact(username):
+            self.users_panel.remove_user(username)
+            self.statusBar().showMessage(f"Контакт {username} удален")
+        
+    def setup_chat_window(self, chat_window):
+        """Подключение сигналов нового окна из пула"""
+        chat_window.message_sent.connect(self.send_message)
+        chat_window.call_requested.connect(self.start_call)
         
-    def open_chat(self, username):
+    def get_conversation(self, username):
+        """Переписка с пользователем; создается при первом обращении"""
+        conversation = self.conversations.get(username)
+        if conversation is None:
+            conversation = Conversation(username, self.transcript_store, parent=self)
+            conversation.unread_count_changed.connect(self.update_tab_title)
+            self.conversations[username] = conversation
+        return conversation
+        
+    def open_chat(self, username, focus=True):
         """Открытие чата с пользователем"""
         logger.info(f"SecureMainWindow.open_chat: Открытие чата с {username}")
         
         # Убираем эмодзи из имени пользователя если есть
         clean_username = username.replace("👤 ", "")
         
-        if clean_username in self.active_chats:
-            chat_window = self.active_chats[clean_username]
-            index = self.tabs.indexOf(chat_window)
-            if index >= 0:
-                self.tabs.setCurrentIndex(index)
-                chat_window.set_active(True)
+        container = self.active_chats.get(clean_username)
+        if container is not None:
+            if focus:
+                self.tabs.setCurrentWidget(container)
                 logger.info(f"SecureMainWindow.open_chat: Чат с {clean_username} уже открыт, переключаемся на него")
-                return
-            else:
-                # Вкладка не найдена, удаляем из активных чатов
-                del self.active_chats[clean_username]
-                logger.warning(f"SecureMainWindow.open_chat: Вкладка чата с {clean_username} не найдена, создаем заново")
+            return
             
-        # Создаем новое окно чата
-        logger.info(f"SecureMainWindow.open_chat: Создание нового чата с {clean_username}")
-        chat_window = ChatWindow(clean_username)
-        chat_window.message_sent.connect(self.send_message)
-        chat_window.unread_count_changed.connect(self.update_tab_title)
-        chat_window.call_requested.connect(self.start_call)
-        
-        # Добавляем вкладку
-        tab_index = self.tabs.addTab(chat_window, f"💬 {clean_username}")
-        self.tabs.setCurrentIndex(tab_index)
-        chat_window.set_active(True)
-        
-        # Сохраняем ссылку на чат
-        self.active_chats[clean_username] = chat_window
-        logger.info(f"SecureMainWindow.open_chat: Чат с {clean_username} создан и добавлен в активные чаты. Индекс вкладки: {tab_index}")
+        # Вкладка - пустой контейнер; окно чата в него помещает пул при показе вкладки
+        logger.info(f"SecureMainWindow.open_chat: Создание новой вкладки чата с {clean_username}")
+        conversation = self.get_conversation(clean_username)
+        container = QWidget()
+        container.username = clean_username
+        container_layout = QVBoxLayout(container)
+        container_layout.setContentsMargins(0, 0, 0, 0)
+        self.active_chats[clean_username] = container
+        
+        tab_index = self.tabs.addTab(container, f"💬 {clean_username}")
+        self.update_tab_title(clean_username, conversation.unread_count)
+        if focus:
+            self.tabs.setCurrentIndex(tab_index)
+        logger.info(f"SecureMainWindow.open_chat: Вкладка чата с {clean_username} создана. Индекс вкладки: {tab_index}")
         
     def close_chat_tab(self, index):
         """Закрытие вкладки чата"""
         if index == 0:  # Не закрываем системную вкладку
             return
             
-        widget = self.tabs.widget(index)
-        tab_text = self.tabs.tabText(index)
-        
-        # Убираем эмодзи из имени пользователя для поиска в active_chats
-        username = tab_text.replace("💬 ", "")
+        container = self.tabs.widget(index)
+        username = getattr(container, 'username', None)
         
         if username in self.active_chats:
             del self.active_chats[username]
+            # История остается в переписке, окно возвращается в пул
+            self.chat_pool.release(username)
             logger.info(f"SecureMainWindow.close_chat_tab: Закрыт чат с {username}")
             
         self.tabs.removeTab(index)
+        container.deleteLater()
         
     def update_tab_title(self, username, unread_count):
         """Обновление заголовка вкладки с непрочитанными"""
-        for i in range(self.tabs.count()):
-            widget = self.tabs.widget(i)
-            if hasattr(widget, 'username') and widget.username == username:
-                unread_text = f" ({unread_count}📩)" if unread_count > 0 else ""
-                self.tabs.setTabText(i, f"💬 {username}{unread_text}")
-                break
+        container = self.active_chats.get(username)
+        if container is None:
+            return
+        index = self.tabs.indexOf(container)
+        if index >= 0:
+            unread_text = f" ({unread_count}📩)" if unread_count > 0 else ""
+            self.tabs.setTabText(index, f"💬 {username}{unread_text}")
         
     def send_message(self, username, message):
         """Отправка сообщения"""
@@ -468,7 +539,7 @@ class SecureMainWindow(QMainWindow):
             self.pending_messages[message_id] = (username, message)
             
             if self.network_client.send_p2p_message(username, message, message_id):
-                self.system_chat.append(f"✅ Сообщение отправлено пользователю {username}")
+                self.dispatcher.post_system(f"✅ Сообщение отправлено пользователю {username}")
                 logger.info(f"SecureMainWindow.send_message: Сообщение успешно отправлено")
             else:
                 self.system_chat.append(f"❌ Не удалось отправить сообщение пользователю {username}")
@@ -479,69 +550,45 @@ class SecureMainWindow(QMainWindow):
             QMessageBox.critical(self, 'Ошибка', f'Ошибка отправки: {e}')
             
     def handle_message(self, username, message):
-        """Обработка полученного сообщения"""
-        logger.info(f"SecureMainWindow.handle_message: НАЧАЛО ОБРАБОТКИ сообщения от {username}: {message}")
-        
-        # ДИАГНОСТИКА: сразу показываем в системной вкладке
-        self.system_chat.append(f"📨 Получено сообщение от {username}: {message}")
+        """Обработка полученного сообщения: постановка в очередь вывода"""
+        logger.debug(f"SecureMainWindow.handle_message: Сообщение от {username}")
         
         # Проверяем, не является ли это системным сообщением
         if username == "system":
-            self.system_chat.append(f"📢 Система: {message}")
+            self.dispatcher.post_system(f"📢 Система: {message}")
             return
             
+        self.dispatcher.post_message(username, username, message)
+        
+    def deliver_messages(self, username, batch):
+        """Вывод пачки входящих сообщений в чат с пользователем"""
         # Показываем уведомление, если окно не активно или свернуто
         if not self.isActiveWindow() or self.isMinimized():
-            self.show_notification(f"💬 Новое сообщение от {username}", message)
+            self.show_message_notification(username, batch[-1][1], len(batch))
             
-        # Открываем чат с пользователем, если он еще не открыт
+        # Открываем вкладку чата, если ее нет; переключаемся на нее, только если
+        # пользователь не читает другой чат
         if username not in self.active_chats:
-            logger.info(f"SecureMainWindow.handle_message: Чат с {username} не открыт, открываем...")
-            self.open_chat(username)
+            logger.info(f"SecureMainWindow.deliver_messages: Чат с {username} не открыт, открываем...")
+            self.open_chat(username, focus=self.current_conversation is None)
         
-        # Добавляем сообщение в чат
-        if username in self.active_chats:
-            logger.info(f"SecureMainWindow.handle_message: Добавление сообщения в чат с {username}")
-            chat_window = self.active_chats[username]
-            
-            # Проверяем, что чат существует и доступен
-            if chat_window and hasattr(chat_window, 'add_message'):
-                # Проверяем, активна ли сейчас эта вкладка
-                current_index = self.tabs.currentIndex()
-                current_widget = self.tabs.widget(current_index)
-                is_active = current_widget == chat_window
-                
-                chat_window.set_active(is_active)
-                chat_window.add_message(username, message, is_own=False)
-                
-                # Активируем вкладку с этим чатом, если она не активна
-                if not is_active:
-                    index = self.tabs.indexOf(chat_window)
-                    if index >= 0:
-                        logger.info(f"SecureMainWindow.handle_message: Вкладка чата с {username} не активна, но сообщение добавлено")
-                else:
-                    logger.info(f"SecureMainWindow.handle_message: Вкладка чата с {username} активна, сообщение добавлено")
-            else:
-                logger.error(f"SecureMainWindow.handle_message: Чат с {username} не инициализирован правильно")
-        else:
-            logger.error(f"SecureMainWindow.handle_message: Не удалось найти чат с {username} после попытки открытия")
-            self.system_chat.append(f"❌ Ошибка: не удалось открыть чат с {username}")
-            
-        # Принудительно обновляем интерфейс
-        QApplication.processEvents()
-        logger.info(f"SecureMainWindow.handle_message: ЗАВЕРШЕНИЕ ОБРАБОТКИ сообщения от {username}")
+        self.get_conversation(username).add_messages(batch)
+        
+    def deliver_system_lines(self, lines):
+        """Вывод пачки строк в системную вкладку"""
+        append_lines(self.system_chat, lines)
             
     def handle_message_status(self, status, details):
         """Обработка статуса доставки сообщения"""
-        logger.info(f"SecureMainWindow.handle_message_status: Обработка статуса сообщения: {status} - {details}")
+        logger.debug(f"SecureMainWindow.handle_message_status: {status} - {details}")
         if status == "delivered":
-            self.system_chat.append(f"✅ Сообщение доставлено: {details}")
+            self.dispatcher.post_system(f"✅ Сообщение доставлено: {details}")
         elif status == "failed":
-            self.system_chat.append(f"❌ Ошибка доставки: {details}")
+            self.dispatcher.post_system(f"❌ Ошибка доставки: {details}")
         elif status == "user_offline":
-            self.system_chat.append(f"⚠️ Пользователь offline: {details}")
+            self.dispatcher.post_system(f"⚠️ Пользователь offline: {details}")
         elif status == "error":
-            self.system_chat.append(f"⚠️ Ошибка: {details}")
+            self.dispatcher.post_system(f"⚠️ Ошибка: {details}")
             
     def start_call_server_listener(self, call_id):
         """Запуск прослушивания входящих медиа-соединений"""
@@ -882,14 +929,18 @@ class SecureMainWindow(QMainWindow):
     def closeEvent(self, event):
         """Обработка закрытия приложения"""
         # Закрываем все активные уведомления
-        for notification in self.active_notifications:
-            notification.close()
+        if self.notifications:
+            self.notifications.close_all()
             
         # Завершаем все активные звонки
         for call_id in list(self.active_calls.keys()):
             self.end_call(call_id)
             
         self.disconnect_from_server()
+        
+        # Дописываем историю на диск
+        if hasattr(self.transcript_store, 'close'):
+            self.transcript_store.close()
         event.accept()
 
 class DialogApplication:
@@ -898,9 +949,16 @@ class DialogApplication:
     def __init__(self):
         self.app = QApplication(sys.argv)
         self.network_client = SecureNetworkClient()
+        # Сообщения сервера читаются в цикле событий Qt и обрабатываются в потоке GUI
+        self.transport = QtSocketTransport(self.network_client)
+        self.network_client.set_transport(self.transport)
         self.auth_window = None
         self.main_window = None
         
+    def apply_styles(self):
+        """Стили главного окна и чатов применяются один раз ко всему приложению"""
+        self.app.setStyleSheet(MAIN_WINDOW_STYLE + CHAT_WINDOW_STYLE)
+        
     def run(self):
         """Запуск приложения"""
         # Показываем окно авторизации сразу
@@ -922,18 +980,21 @@ class DialogApplication:
     def connect_to_server(self):
         """Подключение к серверу в фоновом режиме"""
         def connect_thread():
+            # Окно авторизации обновляем только сигналами: они доставляются в поток GUI
             logger.info("Попытка подключения к серверу...")
-            self.auth_window.update_status("Установка соединения...")
+            self.auth_window.status_changed.emit("Установка соединения...")
             
             if self.network_client.connect():
                 logger.info("Успешное подключение к серверу")
                 # Обновляем статус в UI
-                self.auth_window.update_status("✅ Подключено к серверу")
+                self.auth_window.status_changed.emit("✅ Подключено к серверу")
+                # Пробуем войти по сохраненному токену
+                self.auth_window.connection_ready.emit()
             else:
                 logger.error("Не удалось подключиться к серверу")
                 # Показываем ошибку в UI
-                self.auth_window.update_status("❌ Ошибка подключения")
-                QMessageBox.warning(self.auth_window, 'Ошибка', 'Не удалось подключиться к серверу')
+                self.auth_window.status_changed.emit("❌ Ошибка подключения")
+                self.auth_window.connection_failed.emit()
         
         threading.Thread(target=connect_thread, daemon=True).start()
         
@@ -941,7 +1002,11 @@ class DialogApplication:
         """Обработка успешного входа"""
         logger.info(f"Успешная аутентификация пользователя: {username}")
         # Создаем и показываем главное окно
+        self.apply_styles()
         self.main_window = SecureMainWindow(self.network_client, username)
+        self.transport.disconnected.connect(
+            lambda: self.main_window.sig_connection_status.emit("❌ Соединение с сервером потеряно")
+        )
         self.main_window.show()
         
     def on_auth_cancelled(self):
@@ -0,0 +1,271 @@
+"""
+Локальный зашифрованный кэш сообщений клиента (SQLite, WAL)
+"""
+
+import os
+import re
+import hmac
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from config import PATHS, CACHE_CONFIG
+
+logger = logging.getLogger('dialog_gui')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def load_cache_key(path: str) -> bytes:
+    """Ключ кэша: создается при первом запуске, хранится с правами 0600"""
+    try:
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) == 32:
+            return key
+        logger.warning("Ключ кэша поврежден, создается новый")
+    except FileNotFoundError:
+        pass
+
+    key = os.urandom(32)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    os.replace(tmp_path, path)
+    return key
+
+
+class MessageCache:
+    """История переписок на диске. Текст и отправитель зашифрованы AES-GCM,
+    собеседник хранится как HMAC, поиск идет по HMAC слов (слепой индекс FTS5).
+    Запись выполняет фоновый поток пачками; интерфейс совпадает с MemoryTranscriptStore"""
+
+    def __init__(self, username: str, path: str = None, key: bytes = None):
+        self.path = path or os.path.join(PATHS['cache'], f"messages_{hashlib.sha256(username.encode()).hexdigest()[:16]}.db")
+        master_key = key or load_cache_key(os.path.join(PATHS['config'], CACHE_CONFIG['key_file']))
+        self.aead = AESGCM(hmac.new(master_key, b'dialog-cache-encryption', hashlib.sha256).digest())
+        self.index_key = hmac.new(master_key, b'dialog-cache-index', hashlib.sha256).digest()
+
+        self.conn = self.connect()
+        self.create_schema()
+        self.next_id = (self.conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0) + 1
+
+        # Записи, еще не сохраненные фоновым потоком: видны чтению до коммита
+        self.unflushed: Dict[str, List[tuple]] = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name='message-cache-writer', daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def create_schema(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                peer TEXT NOT NULL,
+                payload BLOB NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_peer ON messages(peer, id)")
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(tokens, content='')")
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 недоступен, локальный поиск отключен: {e}")
+            self.search_enabled = False
+        self.conn.commit()
+
+    def peer_key(self, username: str) -> str:
+        return hmac.new(self.index_key, b'peer:' + username.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def word_tokens(self, text: str) -> List[str]:
+        """HMAC слов текста для слепого индекса"""
+        words = {word.lower() for word in WORD_RE.findall(text)}
+        return [hmac.new(self.index_key, word.encode('utf-8'), hashlib.sha256).hexdigest()[:20] for word in words]
+
+    def encrypt(self, username: str, record) -> bytes:
+        _, sender, text, is_own, timestamp = record
+        nonce = os.urandom(12)
+        plaintext = json.dumps([username, sender, text, is_own, timestamp], ensure_ascii=False).encode('utf-8')
+        return nonce + self.aead.encrypt(nonce, plaintext, None)
+
+    def decrypt_rows(self, rows) -> List[tuple]:
+        """Расшифровка строк (id, payload) в [(peer, record)]; поврежденные пропускаются"""
+        result = []
+        for message_id, payload in rows:
+            try:
+                peer, sender, text, is_own, timestamp = json.loads(self.aead.decrypt(payload[:12], payload[12:], None))
+            except Exception as e:
+                logger.warning(f"MessageCache: Не удалось расшифровать сообщение {message_id}: {e}")
+                continue
+            result.append((peer, (message_id, sender, text, is_own, timestamp)))
+        return result
+
+    def append(self, username: str, batch) -> List[tuple]:
+        """Сохранение пачки [(sender, text, is_own, timestamp)]; запись на диск в фоне"""
+        with self.lock:
+            records = []
+            for sender, text, is_own, timestamp in batch:
+                records.append((self.next_id, sender, text, is_own, timestamp))
+                self.next_id += 1
+            self.unflushed.setdefault(username, []).extend(records)
+            self.queue.put((username, records))
+        return records
+
+    def pending_for(self, username: str) -> List[tuple]:
+        with self.lock:
+            return list(self.unflushed.get(username, ()))
+
+    def load_before(self, username: str, before_id: Optional[int], limit: int) -> List[tuple]:
+        """До `limit` сообщений старше before_id (None - самые новые), по возрастанию ID"""
+        pending = self.pending_for(username)
+        if before_id is not None:
+            pending = [r for r in pending if r[0] < before_id]
+        pending = pending[-limit:]
+
+        upper = before_id if before_id is not None else self.next_id
+        if pending:
+            upper = min(upper, pending[0][0])
+        rows = self.conn.execute(
+            "SELECT id, payload FROM messages WHERE peer = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (self.peer_key(username), upper, limit - len(pending))
+        ).fetchall() if len(pending) < limit else []
+        return [record for _, record in self.decrypt_rows(reversed(rows))] + pending
+
+    def load_after(self, username: str, after_id: int, limit: int) -> List[tuple]:
+        """До `limit` сообщений новее after_id, по возрастанию ID"""
+        # Незаписанные берутся до запроса к базе: пачка, записанная между ними,
+        # окажется хотя бы в одном из результатов
+        pending = [r for r in self.pending_for(username) if r[0] > after_id][:limit]
+        rows = self.conn.execute(
+            "SELECT id, payload FROM messages WHERE peer = ? AND id > ? ORDER BY id LIMIT ?",
+            (self.peer_key(username), after_id, limit)
+        ).fetchall()
+        records = {record[0]: record for _, record in self.decrypt_rows(rows)}
+        for record in pending:
+            records.setdefault(record[0], record)
+        return [records[message_id] for message_id in sorted(records)[:limit]]
+
+    def search(self, query: str, username: str = None, limit: int = None) -> List[tuple]:
+        """Поиск сообщений, содержащих все слова запроса: [(peer, record)], новые первыми"""
+        tokens = self.word_tokens(query)
+        if not tokens or not self.search_enabled:
+            return []
+        limit = limit or CACHE_CONFIG['search_limit']
+
+        sql = ("SELECT m.id, m.payload FROM messages_fts f JOIN messages m ON m.id = f.rowid "
+               "WHERE messages_fts MATCH ?")
+        params = [' '.join(f'"{token}"' for token in tokens)]
+        if username is not None:
+            sql += " AND m.peer = ?"
+            params.append(self.peer_key(username))
+        sql += " ORDER BY m.id DESC LIMIT ?"
+        params.append(limit)
+        found = self.decrypt_rows(self.conn.execute(sql, params).fetchall())
+        # Еще не записанные сообщения проверяются в памяти: ждать фоновый поток
+        # в потоке интерфейса нельзя
+        found_ids = {record[0] for _, record in found}
+        wanted = set(tokens)
+        with self.lock:
+            pending = [(peer, record) for peer, records in self.unflushed.items()
+                       if username is None or peer == username
+                       for record in records if record[0] not in found_ids]
+        found += [(peer, record) for peer, record in pending if wanted <= set(self.word_tokens(record[2]))]
+        found.sort(key=lambda item: item[1][0], reverse=True)
+        return found[:limit]
+
+    def write_loop(self):
+        """Фоновая запись: пачки из очереди объединяются в одну транзакцию"""
+        conn = self.connect()
+        batch_size = CACHE_CONFIG['batch_size']
+        interval = CACHE_CONFIG['flush_interval']
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            items = [item]
+            count = len(item[1]) if isinstance(item, tuple) else batch_size
+            deadline = time.monotonic() + interval
+            while count < batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                items.append(item)
+                if item is None or isinstance(item, threading.Event):
+                    break
+                count += len(item[1])
+
+            if not self.write_items(conn, [i for i in items if isinstance(i, tuple)]) and items[-1] is not None:
+                # Сообщения остаются в unflushed и видны чтению; запись повторяется позже
+                time.sleep(CACHE_CONFIG['retry_interval'])
+                for i in items:
+                    self.queue.put(i)
+                continue
+            for i in items:
+                if isinstance(i, threading.Event):
+                    i.set()
+            if items[-1] is None:
+                break
+        conn.close()
+
+    def write_items(self, conn, items) -> bool:
+        """Запись пачки одной транзакцией; False - ошибка, сообщения остаются в unflushed"""
+        if not items:
+            return True
+        try:
+            with conn:
+                for username, records in items:
+                    peer = self.peer_key(username)
+                    conn.executemany("INSERT INTO messages (id, peer, payload) VALUES (?, ?, ?)",
+                                     [(r[0], peer, self.encrypt(username, r)) for r in records])
+                    if self.search_enabled:
+                        conn.executemany("INSERT INTO messages_fts (rowid, tokens) VALUES (?, ?)",
+                                         [(r[0], ' '.join(self.word_tokens(r[2]))) for r in records])
+        except sqlite3.Error as e:
+            logger.error(f"MessageCache: Ошибка записи {sum(len(r) for _, r in items)} сообщений: {e}")
+            return False
+
+        with self.lock:
+            for username, records in items:
+                pending = self.unflushed.get(username)
+                if pending:
+                    # По ID: после повтора пачки могут записаться не в порядке добавления
+                    written = {r[0] for r in records}
+                    pending[:] = [r for r in pending if r[0] not in written]
+                    if not pending:
+                        del self.unflushed[username]
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Ожидание записи всех поставленных в очередь сообщений"""
+        if not self.writer.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Запись оставшихся сообщений и закрытие базы"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout=10)
+        self.conn.close()
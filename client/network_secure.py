@@ -7,12 +7,17 @@ import hashlib
 import queue
 import uuid
 import struct
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 
+from config import LIVENESS_CONFIG
+from metrics import LatencyStats
+from token_store import TokenStore
+
 class SecureNetworkClient:
     def __init__(self, host='localhost', port=5555):
         self.host = host
@@ -22,6 +27,7 @@ class SecureNetworkClient:
         self.session_token = None
         self.username = None
         self.p2p_sockets = {}
+        self.token_store = TokenStore()
         
         # Генерируем RSA ключи для клиента
         self.private_key = rsa.generate_private_key(
@@ -38,16 +44,24 @@ class SecureNetworkClient:
         self.message_handler = None
         self.status_handler = None
         self.call_handler = None
+        self.presence_handler = None
+        self.user_list_version = None  # Версия снимка онлайн-пользователей на сервере
+        self.user_list_cache = []
         
         # Флаги управления потоками
         self.stop_listener = False
         self.listener_thread = None
+        self.heartbeat_thread = None
+        self.heartbeat_stop = threading.Event()
+        self.transport = None  # Транспорт Qt вместо потока-прослушивателя (см. set_transport)
         self.socket_lock = threading.Lock()
         
-        # Для синхронных запросов
-        self.pending_response = None
-        self.response_event = threading.Event()
-        self.expected_response_type = None
+        # Для синхронных запросов: request_id -> (Future, ожидаемый тип ответа).
+        # Запросов в полете может быть сколько угодно, ответ находится по request_id
+        self.pending_requests = {}
+        self.stream_handlers = {}  # request_id -> обработчик промежуточных кадров (partial)
+        self.pending_lock = threading.Lock()
+        self.request_latency = LatencyStats()
         
         # Для звонков
         self.call_sockets = {}
@@ -80,6 +94,17 @@ class SecureNetworkClient:
         self.logger.info(f"Установлен обработчик звонков: {handler}")
         self.call_handler = handler
 
+    def set_presence_handler(self, handler):
+        """Установка обработчика изменений статуса контактов"""
+        self.logger.info(f"Установлен обработчик статусов контактов: {handler}")
+        self.presence_handler = handler
+
+    def set_transport(self, transport):
+        """Установка транспорта, читающего сокет в цикле событий GUI (QtSocketTransport).
+        Без транспорта сообщения читает отдельный поток"""
+        self.logger.info(f"Установлен транспорт: {transport}")
+        self.transport = transport
+
     def handle_call_accepted(self, from_user, call_id, call_port):
         """Обработка принятия звонка другим пользователем"""
         self.logger.info(f"Звонок принят пользователем {from_user}")
@@ -211,6 +236,11 @@ class SecureNetworkClient:
 
     def start_message_listener(self):
         """Запуск прослушивания сообщений от сервера"""
+        if self.transport is not None:
+            # Подключение транспорта выполнится в потоке GUI
+            self.transport.attach_requested.emit()
+            return
+            
         if self.listener_thread and self.listener_thread.is_alive():
             return
             
@@ -275,14 +305,18 @@ class SecureNetworkClient:
             message_type = message.get('type')
             self.logger.info(f"=== ПОЛУЧЕНО СООБЩЕНИЕ ТИПА: {message_type} ===")
             
-            # Если мы ожидаем ответ определенного типа
-            if (self.expected_response_type and 
-                message_type == self.expected_response_type and 
-                self.response_event and 
-                not self.response_event.is_set()):
-                self.logger.debug(f"Это ожидаемый ответ типа {self.expected_response_type}")
-                self.pending_response = message
-                self.response_event.set()
+            # Промежуточный кадр потокового ответа (например, страница истории)
+            if message.get('partial'):
+                with self.pending_lock:
+                    stream_handler = self.stream_handlers.get(message.get('request_id'))
+                if stream_handler:
+                    stream_handler(message)
+                else:
+                    self.logger.warning(f"Промежуточный кадр {message_type} без ожидающего запроса")
+                return
+            
+            # Если это ответ на один из ожидающих запросов
+            if self.resolve_pending_request(message):
                 return
             
             # Обработка асинхронных сообщений
@@ -322,10 +356,22 @@ class SecureNetworkClient:
                 self.logger.info(f"Получен ответ на аутентификацию: {message.get('status')}")
             elif message_type == 'user_list_update':
                 self.logger.info(f"Получено обновление списка пользователей")
+            elif message_type == 'presence_update':
+                user = {key: value for key, value in message.items() if key != 'type'}
+                self.logger.debug(f"Статус контакта {user.get('username')}: {'онлайн' if user.get('is_online') else 'офлайн'}")
+                if user.get('is_online'):
+                    self.clients_info[user['username']] = {
+                        'external_ip': user.get('external_ip', ''),
+                        'p2p_port': user.get('p2p_port', 0)
+                    }
+                if self.presence_handler:
+                    self.presence_handler(user)
             elif message_type == 'system_message':
                 system_msg = message.get('message', '')
                 if system_msg and self.message_handler:
                     self.message_handler('system', system_msg)
+            elif message_type == 'revoke_token_response':
+                self.logger.info(f"Токенов входа отозвано: {message.get('revoked', 0)}")
             elif message_type == 'heartbeat_ack':
                 self.logger.debug("Получено подтверждение heartbeat")
             elif message_type == 'error':
@@ -439,8 +485,9 @@ class SecureNetworkClient:
 
                 # Логируем отправляемые данные (без пароля)
                 logged_data = data.copy()
-                if 'password' in logged_data:
-                    logged_data['password'] = '***'
+                for secret_field in ('password', 'refresh_token'):
+                    if secret_field in logged_data:
+                        logged_data[secret_field] = '***'
                 self.logger.info(f"📤 Отправляемые данные: {logged_data}")
 
 
@@ -500,33 +547,63 @@ class SecureNetworkClient:
                 self.logger.error(f"Трассировка: {traceback.format_exc()}")
                 return False
 
-    def send_request(self, request_data, expected_response_type, timeout=10):
-        """Отправка запроса на сервер и ожидание ответа определенного типа"""
+    def resolve_pending_request(self, message):
+        """Передача ответа ожидающему запросу. Возвращает True, если ответ кому-то предназначался"""
+        request_id = message.get('request_id')
+        if not request_id:
+            # Без request_id это push-сообщение сервера, а не ответ: сопоставление
+            # по типу отдало бы его постороннему ожидающему запросу
+            return False
+        with self.pending_lock:
+            pending = self.pending_requests.pop(request_id, None)
+        
+        if pending is None:
+            return False
+        
+        future, expected_type = pending
+        self.logger.debug(f"Получен ответ на запрос {request_id}")
+        future.set_result(message)
+        return True
+
+    def send_request(self, request_data, expected_response_type, timeout=10, on_stream=None):
+        """Отправка запроса на сервер и ожидание ответа на него.
+        on_stream получает промежуточные кадры потокового ответа до финального"""
         if not self.connected or not self.server_socket:
             self.logger.error("Нет подключения к серверу для отправки запроса")
             return None
         
-        # Сбрасываем состояние ожидания
-        self.pending_response = None
-        self.response_event.clear()
-        self.expected_response_type = expected_response_type
+        request_id = uuid.uuid4().hex
+        request_data = dict(request_data, request_id=request_id)
+        future = Future()
+        with self.pending_lock:
+            self.pending_requests[request_id] = (future, expected_response_type)
+            if on_stream:
+                self.stream_handlers[request_id] = on_stream
+        start_time = time.perf_counter()
         
         try:
             # Логируем запрос (без пароля в открытом виде)
             logged_request = request_data.copy()
-            if 'password' in logged_request:
-                logged_request['password'] = '***'
+            for secret_field in ('password', 'refresh_token'):
+                if secret_field in logged_request:
+                    logged_request[secret_field] = '***'
             self.logger.info(f"Отправка запроса: {logged_request}")
             
             if self.send_encrypted_message(request_data):
-                # Ждем ответа определенного типа
-                if self.response_event.wait(timeout=timeout):
-                    response = self.pending_response
-                    self.logger.info(f"Получен ответ: {response}")
-                    return response
-                else:
-                    self.logger.error(f"Таймаут ожидания ответа типа {expected_response_type}")
+                # Ждем ответа именно на этот запрос
+                try:
+                    if self.transport is not None and self.transport.is_gui_thread():
+                        # Ответ читает сам поток GUI, блокировать его нельзя
+                        response = self.transport.wait_for(future, timeout)
+                    else:
+                        response = future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    self.logger.error(f"Таймаут ожидания ответа на {request_data['type']} ({request_id})")
                     return None
+                
+                self.request_latency.observe(request_data['type'], time.perf_counter() - start_time)
+                self.logger.info(f"Получен ответ: {response.get('type')} ({request_id})")
+                return response
             else:
                 self.logger.error("Не удалось отправить запрос")
                 return None
@@ -535,10 +612,13 @@ class SecureNetworkClient:
             self.logger.error(f"Ошибка отправки запроса: {e}")
             return None
         finally:
-            # Сбрасываем ожидание
-            self.expected_response_type = None
-            self.response_event.clear()
-            self.pending_response = None
+            with self.pending_lock:
+                self.pending_requests.pop(request_id, None)
+                self.stream_handlers.pop(request_id, None)
+
+    def get_latency_stats(self):
+        """Задержки запросов по типам: количество, среднее, p50/p99 (сек)"""
+        return self.request_latency.summary()
 
     def send_p2p_message(self, to_username, message, message_id=None):
         """Отправка P2P сообщения другому пользователю"""
@@ -725,14 +805,15 @@ class SecureNetworkClient:
             self.logger.error(f"Ошибка регистрации: {error_msg}")
             return False
 
-    def login(self, username, password):
+    def login(self, username, password, remember=False):
         """Аутентификация пользователя"""
         self.logger.info(f"Вход пользователя {username}")
         
         request_data = {
             'type': 'login',
             'username': username,
-            'password': password
+            'password': password,
+            'remember_me': remember
         }
         
         response = self.send_request(request_data, 'auth_response')
@@ -744,6 +825,10 @@ class SecureNetworkClient:
         if response.get('status') == 'success':
             self.session_token = response.get('session_token')
             self.username = username
+            if response.get('refresh_token'):
+                self.token_store.save(username, response['refresh_token'])
+            elif not remember:
+                self.token_store.clear()
             self.logger.info("Вход выполнен успешно")
             return True
         else:
@@ -751,6 +836,159 @@ class SecureNetworkClient:
             self.logger.error(f"Ошибка входа: {error_msg}")
             return False
 
+    def has_saved_login(self):
+        """Есть ли сохраненный токен для входа без пароля"""
+        return self.token_store.load() is not None
+
+    def token_login(self):
+        """Вход по сохраненному токену (без пароля). Возвращает имя пользователя или None"""
+        saved = self.token_store.load()
+        if not saved:
+            return None
+        
+        username, refresh_token = saved
+        self.logger.info(f"Вход по сохраненному токену пользователя {username}")
+        
+        request_data = {
+            'type': 'token_login',
+            'username': username,
+            'refresh_token': refresh_token
+        }
+        
+        response = self.send_request(request_data, 'auth_response')
+        
+        if response is None:
+            # Токен не трогаем: сервер мог быть недоступен
+            self.logger.error("Не получен ответ от сервера при входе по токену")
+            return None
+        
+        if response.get('status') == 'success':
+            self.session_token = response.get('session_token')
+            self.username = response.get('username', username)
+            # Токен одноразовый: сервер выдал новый взамен использованного
+            self.token_store.save(self.username, response['refresh_token'])
+            self.logger.info("Вход по токену выполнен успешно")
+            return self.username
+        else:
+            self.token_store.clear()
+            self.logger.warning(f"Вход по токену отклонен: {response.get('message')}")
+            return None
+
+    def get_history(self, with_user, cursor=None, limit=100, pages=1, on_page=None):
+        """История переписки с with_user, начиная со страницы старше cursor.
+        Страницы идут от новых к старым; on_page(messages, next_cursor) вызывается
+        на каждую по мере получения. Возвращает (сообщения по порядку, курсор) или None"""
+        if not self.session_token:
+            self.logger.error("Попытка получить историю без авторизации")
+            return None
+        
+        received = []
+        
+        def handle_page(page):
+            received.append(page.get('messages', []))
+            if on_page:
+                on_page(page.get('messages', []), page.get('next_cursor'))
+        
+        request_data = {
+            'type': 'get_history',
+            'session_token': self.session_token,
+            'with': with_user,
+            'cursor': cursor,
+            'limit': limit,
+            'pages': pages
+        }
+        response = self.send_request(request_data, 'history_response', timeout=30, on_stream=handle_page)
+        if response is None or response.get('status') != 'success':
+            self.logger.error(f"Не удалось получить историю с {with_user}")
+            return None
+        
+        handle_page(response)
+        messages = [message for page in reversed(received) for message in page]
+        return messages, response.get('next_cursor')
+
+    def search_users(self, query, cursor=None, limit=20):
+        """Поиск пользователей на сервере. Возвращает (пользователи, курсор следующей страницы) или None"""
+        if not self.session_token:
+            self.logger.error("Попытка поиска пользователей без авторизации")
+            return None
+        
+        request_data = {
+            'type': 'search_users',
+            'session_token': self.session_token,
+            'query': query,
+            'cursor': cursor,
+            'limit': limit
+        }
+        response = self.send_request(request_data, 'search_users_response')
+        if response is None or response.get('status') != 'success':
+            self.logger.error(f"Не удалось выполнить поиск пользователей: '{query}'")
+            return None
+        
+        return response.get('users', []), response.get('next_cursor')
+
+    def admin_broadcast(self, message):
+        """Системное сообщение всем онлайн-пользователям (нужны права на сервере).
+        Возвращает ход рассылки с broadcast_id или None"""
+        if not self.session_token:
+            self.logger.error("Попытка рассылки без авторизации")
+            return None
+
+        request_data = {
+            'type': 'admin_broadcast',
+            'session_token': self.session_token,
+            'message': message
+        }
+        response = self.send_request(request_data, 'admin_broadcast_response')
+        if response is None or response.get('status') != 'accepted':
+            self.logger.error(f"Рассылка не принята: {response.get('message') if response else 'нет ответа'}")
+            return None
+        return response
+
+    def broadcast_status(self, broadcast_id):
+        """Ход рассылки: total, sent, failed, reached_99_seconds, finished_seconds"""
+        response = self.send_request({'type': 'broadcast_status', 'session_token': self.session_token,
+                                      'broadcast_id': broadcast_id}, 'broadcast_status_response')
+        if response is None or response.get('type') != 'broadcast_status_response':
+            return None
+        return response
+
+    def get_contacts(self):
+        """Список контактов со статусом онлайн или None"""
+        if not self.session_token:
+            self.logger.error("Попытка получить контакты без авторизации")
+            return None
+        
+        response = self.send_request({'type': 'get_contacts', 'session_token': self.session_token},
+                                     'contacts_response')
+        if response is None or response.get('status') != 'success':
+            self.logger.error("Не удалось получить список контактов")
+            return None
+        
+        contacts = response.get('contacts', [])
+        self.update_clients_info([c for c in contacts if c.get('is_online')])
+        return contacts
+    
+    def add_contact(self, username, alias=None):
+        """Добавление контакта; возвращает данные контакта со статусом или None"""
+        return self.change_contact('add_contact', username, alias=alias)
+    
+    def remove_contact(self, username):
+        """Удаление контакта; True при успехе"""
+        return self.change_contact('remove_contact', username) is not None
+    
+    def change_contact(self, request_type, username, **fields):
+        if not self.session_token:
+            self.logger.error("Попытка изменить контакты без авторизации")
+            return None
+        
+        request_data = dict(fields, type=request_type, session_token=self.session_token, username=username)
+        response = self.send_request(request_data, 'contact_response')
+        if response is None or response.get('status') != 'success':
+            message = response.get('message') if response else 'нет ответа'
+            self.logger.error(f"Не удалось изменить контакт {username}: {message}")
+            return None
+        return response.get('contact')
+    
     def get_user_list(self):
         """Получение списка пользователей от сервера"""
         if not self.session_token:
@@ -761,6 +999,9 @@ class SecureNetworkClient:
             'type': 'get_user_list',
             'session_token': self.session_token
         }
+        # Сервер не пересылает список, если он не менялся с полученной версии
+        if self.user_list_version is not None:
+            request_data['version'] = self.user_list_version
         
         self.logger.info("Запрос списка пользователей")
         
@@ -769,8 +1010,19 @@ class SecureNetworkClient:
         if response is None:
             self.logger.error("Не получен ответ при запросе списка пользователей")
             return None
-            
-        users = response.get('users', [])
+        
+        if response.get('type') == 'error':
+            # Сервер ограничил частоту или перегружен - остается прежний список
+            self.logger.warning(f"Список пользователей не получен: {response.get('message')} "
+                                f"(повтор через {response.get('retry_after', '?')} с)")
+            return None
+        
+        if response.get('unchanged'):
+            users = self.user_list_cache
+        else:
+            users = response.get('users', [])
+            self.user_list_version = response.get('version')
+            self.user_list_cache = users
         self.logger.info(f"Получено пользователей: {len(users)}")
         
         # ✅ ОБНОВЛЯЕМ ИНФОРМАЦИЮ О КЛИЕНТАХ
@@ -801,6 +1053,14 @@ class SecureNetworkClient:
 
     def logout(self):
         """Выход из системы"""
+        saved = self.token_store.load()
+        if saved and self.connected and self.session_token:
+            self.send_encrypted_message({
+                'type': 'revoke_token',
+                'refresh_token': saved[1],
+                'session_token': self.session_token
+            })
+        self.token_store.clear()
         self.session_token = None
         self.username = None
         self.logger.info("Выход из системы выполнен")
@@ -810,11 +1070,16 @@ class SecureNetworkClient:
         try:
             self.connected = False
             self.stop_listener = True
+            self.heartbeat_stop.set()
+            # Версии снимка сервера не переживают переподключение
+            self.user_list_version = None
             
             # Закрываем все звонки
             for call_id in list(self.call_threads.keys()):
                 self.stop_call(call_id)
                 
+            if self.transport is not None:
+                self.transport.detach()
             if self.listener_thread and self.listener_thread.is_alive():
                 self.listener_thread.join(timeout=2.0)
             if self.server_socket:
@@ -860,9 +1125,20 @@ class SecureNetworkClient:
         return self.reconnect()
 
     def start_heartbeat(self):
-        """Периодическая отправка heartbeat для поддержания сессии"""
-        def send_heartbeat():
-            if self.connected and not self.stop_listener:
+        """Периодическая отправка heartbeat для поддержания сессии - один поток на все время
+        соединения вместо нового таймера на каждый heartbeat"""
+        if self.heartbeat_thread is not None and self.heartbeat_thread.is_alive():
+            if not self.heartbeat_stop.is_set():
+                return
+            # Поток прежнего соединения еще завершается
+            self.heartbeat_thread.join(timeout=1.0)
+        self.heartbeat_stop.clear()
+
+        def heartbeat_loop():
+            interval = LIVENESS_CONFIG['heartbeat_interval']
+            while not self.heartbeat_stop.wait(interval):
+                if not self.connected or self.stop_listener:
+                    break
                 try:
                     heartbeat_data = {
                         'type': 'heartbeat',
@@ -871,13 +1147,11 @@ class SecureNetworkClient:
                     self.send_encrypted_message(heartbeat_data)
                 except Exception as e:
                     self.logger.error(f"Ошибка heartbeat: {e}")
-            # Перезапускаем таймер
-            if self.connected and not self.stop_listener:
-                threading.Timer(30.0, send_heartbeat).start()
 
-        # Запускаем первый heartbeat
+        # Запускаем heartbeat
         if self.connected and not self.stop_listener:
-            threading.Timer(30.0, send_heartbeat).start()
+            self.heartbeat_thread = threading.Thread(target=heartbeat_loop, name='heartbeat', daemon=True)
+            self.heartbeat_thread.start()
 
     # Методы для работы с медиа-звонками
     def start_call_server(self, call_id, port=0):
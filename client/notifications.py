@@ -1,16 +1,21 @@
 import time
+from collections import OrderedDict
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QPushButton, 
                              QSystemTrayIcon, QMenu, QAction, QStyle, QDesktopWidget)
-from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve
+from PyQt5.QtCore import Qt, QObject, QTimer, QPropertyAnimation, QEasingCurve, pyqtSignal
 from PyQt5.QtGui import QIcon, QPixmap, QPainter
 
 class NotificationWindow(QWidget):
     """Всплывающее окно уведомления"""
     
+    closed = pyqtSignal(object)  # окно скрыто и может быть переиспользовано
+    
     def __init__(self, title, message, parent=None):
         super().__init__(parent)
         self.title = title
         self.message = message
+        self.key = None    # Отправитель, уведомления которого собраны в окне
+        self.count = 0     # Сколько сообщений отправителя показано в окне
         self.init_ui()
         self.setup_animation()
         
@@ -41,7 +46,7 @@ class NotificationWindow(QWidget):
         layout.setSpacing(8)
         
         # Заголовок уведомления
-        title_label = QLabel(self.title)
+        self.title_label = title_label = QLabel(self.title)
         title_label.setStyleSheet("""
             QLabel {
                 color: #ecf0f1;
@@ -52,7 +57,7 @@ class NotificationWindow(QWidget):
         layout.addWidget(title_label)
         
         # Текст сообщения
-        message_label = QLabel(self.message)
+        self.message_label = message_label = QLabel(self.message)
         message_label.setStyleSheet("""
             QLabel {
                 color: #bdc3c7;
@@ -96,20 +101,193 @@ class NotificationWindow(QWidget):
         self.close_animation.setStartValue(1)
         self.close_animation.setEndValue(0)
         self.close_animation.setEasingCurve(QEasingCurve.InCubic)
-        self.close_animation.finished.connect(self.hide)
+        self.close_animation.finished.connect(self.on_closed)
+        
+        # Автоматическое закрытие через 5 секунд; таймер перезапускается при обновлении
+        self.close_timer = QTimer(self)
+        self.close_timer.setSingleShot(True)
+        self.close_timer.setInterval(5000)
+        self.close_timer.timeout.connect(self.close_notification)
+        
+    def set_content(self, title, message):
+        """Замена текста уведомления без пересоздания окна"""
+        self.title = title
+        self.message = message
+        self.title_label.setText(title)
+        self.message_label.setText(message)
         
     def show_notification(self):
         """Показать уведомление с анимацией"""
-        self.show()
-        self.animation.start()
-        
-        # Автоматическое закрытие через 5 секунд
-        QTimer.singleShot(5000, self.close_notification)
+        if self.close_animation.state() == QPropertyAnimation.Running:
+            self.close_animation.stop()
+        if not self.isVisible():
+            self.show()
+            self.animation.start()
+        else:
+            self.setWindowOpacity(1)
+        self.close_timer.start()
         
     def close_notification(self):
         """Закрыть уведомление с анимацией"""
-        self.close_animation.start()
+        self.close_timer.stop()
+        if self.isVisible() and self.close_animation.state() != QPropertyAnimation.Running:
+            self.close_animation.start()
+            
+    def on_closed(self):
+        self.hide()
+        self.key = None
+        self.count = 0
+        self.closed.emit(self)
         
     def mousePressEvent(self, event):
         """Закрытие при клике"""
-        self.close_notification()
\ No newline at end of file
+        self.close_notification()
+
+
+class NotificationManager(QObject):
+    """Уведомления без лавины окон: сообщения одного отправителя собираются за
+    короткое окно в одно уведомление, окна берутся из фиксированного пула,
+    всплывающие сообщения трея не чаще одного за интервал"""
+    
+    def __init__(self, tray_icon=None, pool_size=3, aggregate_ms=1000, tray_interval=5.0, parent=None):
+        super().__init__(parent)
+        self.tray_icon = tray_icon
+        self.tray_interval = tray_interval
+        self.last_tray_time = 0.0
+        self.pending_tray = None     # Последнее отложенное сообщение трея
+        self.suppressed_tray = 0     # Сколько сообщений трея отложено с прошлого показа
+        self.dropped = 0             # Уведомлений, вытеснивших показанные окна
+        
+        self.pool = [NotificationWindow("", "") for _ in range(pool_size)]
+        for slot, window in enumerate(self.pool):
+            window.slot = slot
+            window.closed.connect(self.on_window_closed)
+        self.visible = []  # Показанные окна, от старых к новым
+        
+        # Сообщения, ожидающие сброса: sender -> [count, последний текст]
+        self.pending = OrderedDict()
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(aggregate_ms)
+        self.flush_timer.timeout.connect(self.flush)
+        
+        self.tray_timer = QTimer(self)
+        self.tray_timer.setSingleShot(True)
+        self.tray_timer.timeout.connect(self.flush_tray)
+        
+    def notify_message(self, sender, message, count=1):
+        """Входящие сообщения от sender: показываются сводно после окна агрегации"""
+        entry = self.pending.get(sender)
+        if entry is None:
+            self.pending[sender] = [count, message]
+        else:
+            entry[0] += count
+            entry[1] = message
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+            
+    def notify(self, title, message):
+        """Немедленное уведомление (звонки и другие важные события)"""
+        self.show_window(None, title, message)
+        self.show_tray(title, message)
+        
+    def flush(self):
+        """Показ накопленных за окно агрегации уведомлений"""
+        pending, self.pending = self.pending, OrderedDict()
+        for sender, (count, message) in pending.items():
+            window = self.window_for(sender)
+            if window is not None:
+                count += window.count
+            if count > 1:
+                title = f"💬 {count} новых сообщений от {sender}"
+            else:
+                title = f"💬 Новое сообщение от {sender}"
+            self.show_window(sender, title, message, count)
+            
+        if pending:
+            if len(pending) == 1:
+                sender, (count, message) = next(iter(pending.items()))
+                self.show_tray(title, message)
+            else:
+                total = sum(count for count, _ in pending.values())
+                self.show_tray(f"💬 {total} новых сообщений", f"От: {', '.join(pending)}")
+                
+    def window_for(self, key):
+        """Показанное окно с уведомлениями отправителя"""
+        if key is None:
+            return None
+        for window in self.visible:
+            if window.key == key:
+                return window
+        return None
+        
+    def show_window(self, key, title, message, count=1):
+        """Показ уведомления в окне из пула: окно отправителя обновляется,
+        при занятом пуле переиспользуется самое старое окно"""
+        window = self.window_for(key)
+        if window is None:
+            free = [w for w in self.pool if w not in self.visible]
+            if free:
+                window = min(free, key=lambda w: w.slot)
+            else:
+                window = self.visible[0]
+                self.dropped += 1
+            self.place(window)
+        if window in self.visible:
+            self.visible.remove(window)
+        self.visible.append(window)
+        
+        window.key = key
+        window.count = count
+        window.set_content(title, message)
+        window.show_notification()
+        
+    def place(self, window):
+        """Позиция окна в стопке у правого верхнего угла"""
+        screen_geometry = QDesktopWidget().availableGeometry()
+        x = screen_geometry.width() - window.width() - 20
+        y = 50 + window.slot * (window.height() + 10)
+        window.move(x, y)
+        
+    def on_window_closed(self, window):
+        if window in self.visible:
+            self.visible.remove(window)
+            
+    def show_tray(self, title, message):
+        """Сообщение трея с ограничением частоты; лишние сводятся в одно отложенное"""
+        if not self.tray_icon:
+            return
+        now = time.monotonic()
+        wait = self.last_tray_time + self.tray_interval - now
+        if wait <= 0 and not self.tray_timer.isActive():
+            self.last_tray_time = now
+            self.tray_icon.showMessage(title, message, QSystemTrayIcon.Information, 3000)
+            return
+        
+        self.pending_tray = (title, message)
+        self.suppressed_tray += 1
+        if not self.tray_timer.isActive():
+            self.tray_timer.start(max(0, int(wait * 1000)))
+            
+    def flush_tray(self):
+        """Показ отложенного сообщения трея"""
+        if self.pending_tray is None:
+            return
+        title, message = self.pending_tray
+        if self.suppressed_tray > 1:
+            message = f"{message}\n(и еще уведомлений: {self.suppressed_tray - 1})"
+        self.pending_tray = None
+        self.suppressed_tray = 0
+        self.last_tray_time = time.monotonic()
+        if self.tray_icon:
+            self.tray_icon.showMessage(title, message, QSystemTrayIcon.Information, 3000)
+            
+    def close_all(self):
+        """Скрытие всех уведомлений"""
+        self.flush_timer.stop()
+        self.tray_timer.stop()
+        self.pending.clear()
+        for window in self.pool:
+            window.close_timer.stop()
+            window.close()
+        self.visible.clear()
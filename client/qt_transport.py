@@ -0,0 +1,115 @@
+"""
+Чтение сообщений сервера в цикле событий Qt (без потока-прослушивателя)
+"""
+
+import socket
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from PyQt5.QtCore import QObject, QSocketNotifier, QEventLoop, QTimer, QThread, pyqtSignal
+
+logger = logging.getLogger('dialog_network')
+
+FRAME_END = b"<END>"
+
+
+class QtSocketTransport(QObject):
+    """Транспорт клиента на QSocketNotifier: чтение только при наличии данных,
+    разбор кадров и вызов обработчиков в потоке GUI"""
+
+    attach_requested = pyqtSignal()  # Можно испускать из любого потока
+    disconnected = pyqtSignal()
+
+    def __init__(self, network_client, parent=None):
+        super().__init__(parent)
+        self.network_client = network_client
+        self.notifier = None
+        self.buffer = bytearray()
+        self.wakeups = 0  # Сколько раз цикл событий будил нас ради чтения
+
+        # Сигнал из потока подключения доставляется в поток GUI через очередь событий
+        self.attach_requested.connect(self.attach)
+
+    def is_gui_thread(self):
+        """Выполняется ли код в потоке, которому принадлежит транспорт"""
+        return QThread.currentThread() is self.thread()
+
+    def attach(self):
+        """Подписка на готовность сокета к чтению"""
+        self.detach()
+
+        server_socket = self.network_client.server_socket
+        if not server_socket or not self.network_client.connected:
+            logger.error("Нет сокета для подключения транспорта Qt")
+            return
+
+        # Таймаут нужен только для отправки: чтение происходит, когда данные уже пришли
+        server_socket.settimeout(10)
+        self.buffer.clear()
+        self.notifier = QSocketNotifier(server_socket.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.on_readable)
+        logger.info("Транспорт Qt подключен к сокету сервера")
+
+    def detach(self):
+        """Отписка от сокета"""
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+            self.notifier.deleteLater()
+            self.notifier = None
+
+    def on_readable(self, fd=None):
+        """Сокет готов к чтению: читаем один раз и разбираем полные кадры"""
+        self.wakeups += 1
+        server_socket = self.network_client.server_socket
+
+        try:
+            # Одно чтение на уведомление: если данные остались, уведомление придет снова
+            chunk = server_socket.recv(65536)
+        except (socket.timeout, BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            if self.network_client.connected:
+                logger.error(f"Ошибка чтения из сокета: {e}")
+            self.handle_disconnect()
+            return
+
+        if not chunk:
+            logger.error("Соединение закрыто сервером")
+            self.handle_disconnect()
+            return
+
+        self.buffer += chunk
+        start = 0
+        while True:
+            message_end = self.buffer.find(FRAME_END, start)
+            if message_end == -1:
+                break
+            if message_end > start:
+                self.network_client.process_received_message(bytes(self.buffer[start:message_end]))
+            start = message_end + len(FRAME_END)
+        if start:
+            del self.buffer[:start]
+
+    def handle_disconnect(self):
+        """Обработка разрыва соединения"""
+        self.detach()
+        self.network_client.connected = False
+        self.disconnected.emit()
+
+    def wait_for(self, future, timeout):
+        """Ожидание ответа в потоке GUI: вложенный цикл событий продолжает читать сокет"""
+        if not future.done():
+            loop = QEventLoop()
+            timer = QTimer()
+            timer.setSingleShot(True)
+            timer.timeout.connect(loop.quit)
+            future.add_done_callback(lambda _: loop.quit())
+            timer.start(int(timeout * 1000))
+            if not future.done():
+                # Пользовательский ввод не обрабатываем, чтобы не запускать новые действия
+                loop.exec_(QEventLoop.ExcludeUserInputEvents)
+            timer.stop()
+
+        if not future.done():
+            raise FutureTimeoutError()
+        return future.result()
@@ -153,7 +153,15 @@ MAIN_WINDOW_STYLE = """
 """
 
 CHAT_WINDOW_STYLE = """
-    QTextEdit#chat_history {
+    QLabel#chat_title {
+        font-size: 16px;
+        font-weight: bold;
+        color: #2c3e50;
+        padding: 12px;
+        background-color: #f8f9fa;
+        border-radius: 8px;
+    }
+    QListView#chat_history {
         border: 1px solid #e0e0e0;
         border-radius: 8px;
         background-color: white;
@@ -198,7 +206,7 @@ CHAT_WINDOW_STYLE = """
 """
 
 USERS_PANEL_STYLE = """
-    QListWidget {
+    QListView {
         border: 1px solid #e0e0e0;
         border-radius: 8px;
         background-color: white;
@@ -206,15 +214,15 @@ USERS_PANEL_STYLE = """
         font-family: 'System UI', Arial, sans-serif;
         outline: none;
     }
-    QListWidget::item {
+    QListView::item {
         padding: 12px 16px;
         border-bottom: 1px solid #f5f5f5;
         color: #333;
     }
-    QListWidget::item:hover {
+    QListView::item:hover {
         background-color: #f8f9fa;
     }
-    QListWidget::item:selected {
+    QListView::item:selected {
         background-color: #007bff;
         color: white;
         border-radius: 6px;
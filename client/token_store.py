@@ -0,0 +1,59 @@
+"""
+Хранение токена повторного входа ("запомнить меня") на клиенте
+"""
+
+import os
+import json
+import logging
+from typing import Optional, Tuple
+
+from config import PATHS, AUTH_CONFIG
+
+logger = logging.getLogger('dialog_network')
+
+
+class TokenStore:
+    """Файл с токеном в PATHS['config'], доступный только владельцу (0600)"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(PATHS['config'], AUTH_CONFIG['refresh_token_file'])
+
+    def load(self) -> Optional[Tuple[str, str]]:
+        """Загрузка сохраненной пары (username, refresh_token)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            username = data.get('username')
+            refresh_token = data.get('refresh_token')
+            if username and refresh_token:
+                return username, refresh_token
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать сохраненный токен: {e}")
+        return None
+
+    def save(self, username: str, refresh_token: str):
+        """Атомарная запись токена с правами 0600"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'username': username, 'refresh_token': refresh_token}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить токен: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Удаление сохраненного токена"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Не удалось удалить сохраненный токен: {e}")
@@ -1,14 +1,138 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QListWidget, QPushButton, QHBoxLayout
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QListView, QLineEdit, QPushButton, QHBoxLayout
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractListModel, QModelIndex, QSortFilterProxyModel, QTimer
 from styles.main_style import USERS_PANEL_STYLE
 
+
+class UsersModel(QAbstractListModel):
+    """Список пользователей с ключом по имени: обновление изменяет только
+    добавленные, удаленные и измененные строки"""
+    
+    UsernameRole = Qt.UserRole + 1
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.usernames = []   # Порядок строк
+        self.rows = {}        # username -> номер строки
+        self.info = {}        # username -> данные пользователя с сервера
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.usernames)
+        
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.usernames):
+            return None
+        username = self.usernames[index.row()]
+        if role == Qt.DisplayRole:
+            info = self.info[username]
+            if 'is_online' not in info:
+                return f"👤 {username}"
+            # Контакт: индикатор статуса и псевдоним
+            return f"{'🟢' if info['is_online'] else '⚪'} {info.get('alias') or username}"
+        if role == self.UsernameRole:
+            return username
+        return None
+        
+    def update_users(self, users):
+        """Применение нового списка пользователей в виде разницы с текущим"""
+        new_info = {}
+        for user in users or []:
+            if isinstance(user, dict):
+                username = user.get('username')
+                if username:
+                    new_info[username] = user
+            elif isinstance(user, str):
+                # Убираем эмодзи если уже есть
+                clean_username = user.replace("👤 ", "")
+                new_info[clean_username] = {'username': clean_username}
+        
+        # Удаление: непрерывными диапазонами с конца, чтобы номера строк не сдвигались
+        removed = sorted((self.rows[name] for name in self.info.keys() - new_info.keys()), reverse=True)
+        if removed:
+            start = 0
+            while start < len(removed):
+                end = start
+                while end + 1 < len(removed) and removed[end + 1] == removed[end] - 1:
+                    end += 1
+                first, last = removed[end], removed[start]
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self.usernames[first:last + 1]
+                self.endRemoveRows()
+                start = end + 1
+            self.rows = {name: row for row, name in enumerate(self.usernames)}
+        
+        # Изменение данных оставшихся пользователей: новые данные должны быть в модели
+        # до dataChanged, представление читает data() сразу
+        old_info, self.info = self.info, new_info
+        for username in self.usernames:
+            if old_info[username] != new_info[username]:
+                index = self.index(self.rows[username])
+                self.dataChanged.emit(index, index)
+        
+        # Добавление новых одной вставкой в конец (порядок задает прокси-модель)
+        added = [name for name in new_info if name not in self.rows]
+        if added:
+            first = len(self.usernames)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            self.usernames.extend(added)
+            for row, username in enumerate(added, first):
+                self.rows[username] = row
+            self.endInsertRows()
+        
+    def update_user(self, user):
+        """Изменение одного пользователя (статус контакта) без пересчета списка"""
+        username = user.get('username')
+        if not username:
+            return
+        if username in self.rows:
+            info = dict(self.info[username], **user)
+            if info != self.info[username]:
+                self.info[username] = info
+                index = self.index(self.rows[username])
+                self.dataChanged.emit(index, index)
+        else:
+            row = len(self.usernames)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.usernames.append(username)
+            self.rows[username] = row
+            self.info[username] = dict(user)
+            self.endInsertRows()
+            
+    def remove_user(self, username):
+        row = self.rows.get(username)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.usernames[row]
+        del self.info[username]
+        self.endRemoveRows()
+        self.rows = {name: row for row, name in enumerate(self.usernames)}
+
+
 class UsersPanel(QWidget):
     user_selected = pyqtSignal(str)
     refresh_requested = pyqtSignal()
     call_requested = pyqtSignal(str, str)  # username, call_type
+    add_contact_requested = pyqtSignal(str)     # текст строки поиска
+    remove_contact_requested = pyqtSignal(str)
     
     def __init__(self):
         super().__init__()
+        self.users_model = UsersModel(self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.users_model)
+        self.proxy_model.setFilterRole(UsersModel.UsernameRole)
+        self.proxy_model.setSortRole(UsersModel.UsernameRole)
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.proxy_model.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.proxy_model.setDynamicSortFilter(True)
+        self.proxy_model.sort(0)
+        
+        # Фильтр применяется после паузы в наборе текста
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        
         self.init_ui()
         
     def init_ui(self):
@@ -17,7 +141,7 @@ class UsersPanel(QWidget):
         layout.setSpacing(12)
         
         # Заголовок
-        title = QLabel("Пользователи онлайн")
+        title = QLabel("Контакты")
         title.setAlignment(Qt.AlignCenter)
         title.setStyleSheet("""
             font-size: 16px; 
@@ -29,9 +153,18 @@ class UsersPanel(QWidget):
         """)
         layout.addWidget(title)
         
+        # Поиск
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Поиск контакта...")
+        self.search_input.textChanged.connect(self.filter_timer.start)
+        layout.addWidget(self.search_input)
+        
         # Список пользователей
-        self.users_list = QListWidget()
-        self.users_list.itemDoubleClicked.connect(self.on_user_double_clicked)
+        self.users_list = QListView()
+        self.users_list.setModel(self.proxy_model)
+        self.users_list.setUniformItemSizes(True)
+        self.users_list.setEditTriggers(QListView.NoEditTriggers)
+        self.users_list.doubleClicked.connect(self.on_user_double_clicked)
         layout.addWidget(self.users_list)
         
         # Кнопки звонков
@@ -50,45 +183,64 @@ class UsersPanel(QWidget):
         
         layout.addLayout(call_buttons_layout)
         
-        # Кнопка обновления
+        # Кнопки контактов и обновления
         button_layout = QHBoxLayout()
         
+        self.add_contact_btn = QPushButton("➕")
+        self.add_contact_btn.setToolTip("Добавить контакт")
+        self.add_contact_btn.clicked.connect(lambda: self.add_contact_requested.emit(self.search_input.text().strip()))
+        
+        self.remove_contact_btn = QPushButton("➖")
+        self.remove_contact_btn.setToolTip("Удалить выбранный контакт")
+        self.remove_contact_btn.clicked.connect(self.request_remove_contact)
+        
         self.refresh_btn = QPushButton("🔄 Обновить")
         self.refresh_btn.clicked.connect(self.refresh_requested.emit)
         
+        button_layout.addWidget(self.add_contact_btn)
+        button_layout.addWidget(self.remove_contact_btn)
         button_layout.addWidget(self.refresh_btn)
         layout.addLayout(button_layout)
         
         self.setLayout(layout)
         self.setStyleSheet(USERS_PANEL_STYLE)
         
-    def on_user_double_clicked(self, item):
-        self.user_selected.emit(item.text())
+    def on_user_double_clicked(self, index):
+        self.user_selected.emit(index.data(UsersModel.UsernameRole))
+        
+    def current_username(self):
+        """Имя выбранного пользователя или None"""
+        index = self.users_list.currentIndex()
+        return index.data(UsersModel.UsernameRole) if index.isValid() else None
         
     def start_audio_call(self):
         """Начать аудио звонок"""
-        current_item = self.users_list.currentItem()
-        if current_item:
-            username = current_item.text().replace("👤 ", "")
+        username = self.current_username()
+        if username:
             self.call_requested.emit(username, 'audio')
         
     def start_video_call(self):
         """Начать видео звонок"""
-        current_item = self.users_list.currentItem()
-        if current_item:
-            username = current_item.text().replace("👤 ", "")
+        username = self.current_username()
+        if username:
             self.call_requested.emit(username, 'video')
         
+    def request_remove_contact(self):
+        username = self.current_username()
+        if username:
+            self.remove_contact_requested.emit(username)
+        
+    def apply_filter(self):
+        """Применение строки поиска"""
+        self.proxy_model.setFilterFixedString(self.search_input.text().strip())
+        
     def update_users(self, users):
         """Обновление списка пользователей"""
-        self.users_list.clear()
-        if users:
-            for user in users:
-                if isinstance(user, dict):
-                    username = user.get('username')
-                    if username:
-                        self.users_list.addItem(f"👤 {username}")
-                elif isinstance(user, str):
-                    # Убираем эмодзи если уже есть
-                    clean_username = user.replace("👤 ", "")
-                    self.users_list.addItem(f"👤 {clean_username}")
\ No newline at end of file
+        self.users_model.update_users(users)
+        
+    def update_user(self, user):
+        """Изменение статуса одного контакта"""
+        self.users_model.update_user(user)
+        
+    def remove_user(self, username):
+        self.users_model.remove_user(username)
@@ -100,7 +100,9 @@ TURN_SERVERS = RUSSIAN_TURN_SERVERS + INTERNATIONAL_TURN_SERVERS
 DATABASE_CONFIG = {
     'path': 'users.db',
     'timeout': 30,
-    'check_same_thread': False
+    'check_same_thread': False,
+    'pool_size': 16,              # Соединений в общем пуле сервера (server/connection_pool.py)
+    'pool_timeout': 30            # Сколько ждать свободного соединения (сек)
 }
 
 # Настройки шифрования
@@ -112,6 +114,148 @@ ENCRYPTION_CONFIG = {
     'encryption_mode': 'AES-GCM'
 }
 
+# Настройки аутентификации (хеширование паролей на сервере)
+AUTH_CONFIG = {
+    'bcrypt_rounds': 12,           # Стоимость bcrypt; при изменении хеши обновляются при входе
+    'hash_workers': os.cpu_count() or 1,  # Размер пула процессов для bcrypt
+    'hash_queue_size': 64,         # Максимум задач хеширования в очереди
+    'hash_per_ip_limit': 4,        # Одновременных задач хеширования с одного IP
+    'hash_per_user_limit': 2,      # Одновременных задач хеширования на одного пользователя
+    'hash_timeout': 10,            # Таймаут ожидания результата хеширования (сек)
+    'refresh_token_ttl_days': 30,  # Срок действия токена "запомнить меня"
+    'revoked_tokens_kept': 5,      # Замененных токенов на пользователя для обнаружения повторного использования
+    'refresh_token_file': 'session.json'  # Файл токена клиента в PATHS['config']
+}
+
+# История сообщений на сервере
+HISTORY_CONFIG = {
+    'page_size': 100,             # Сообщений на страницу по умолчанию
+    'max_page_size': 500,         # Максимум сообщений на страницу
+    'max_pages': 20               # Максимум страниц, отправляемых потоком на один запрос
+}
+
+# Движок хранения истории сообщений на сервере (server/message_store.py)
+STORAGE_CONFIG = {
+    'engine': None,               # None - таблица messages, 'sqlite' - message_log, 'log' - сегментированный журнал
+    'db_path': 'messages.db',     # База для engine='sqlite'
+    'log_dir': 'message_log',     # Каталог сегментов для engine='log'
+    'segment_size': 64 * 1024 * 1024,  # Размер сегмента журнала (байт)
+    'group_commit_interval': 0.0,      # Доп. ожидание перед fsync для укрупнения группы (сек)
+    'retention_days': None,       # Удалять сегменты старше (None - хранить всегда)
+    'retention_bytes': None,      # Ограничение общего размера журнала (None - без ограничения)
+    'compaction_interval': 60,    # Период проверки сегментов на сжатие и удаление (сек)
+    'compaction_threshold': 0.5   # Сжимать сегмент, если живых записей меньше этой доли
+}
+
+# Отложенная запись истории звонков на сервере (server/call_journal.py)
+CALL_HISTORY_CONFIG = {
+    'journal_file': 'call_history.journal',  # Журнал изменений, еще не записанных в базу
+    'batch_size': 256,            # Максимум изменений в одной транзакции
+    'flush_interval': 0.2         # Как часто фоновый поток пишет накопленное (сек)
+}
+
+# Обработка запросов клиентов (server/dispatch.py, server/rate_limit.py)
+REQUEST_CONFIG = {
+    # Корзины токенов пользователя (до входа - IP клиента): тип -> (запросов в секунду, запас)
+    'rate_limits': {
+        'register': (0.2, 3),
+        'login': (0.5, 5),
+        'token_login': (0.5, 5),
+        'revoke_token': (1, 5),
+        'heartbeat': (1, 5),
+        'p2p_message': (5, 20),
+        'call_request': (1, 5),
+        'call_answer': (2, 5),
+        'call_end': (2, 10),
+        'ice_candidate': (50, 200),
+        'get_user_list': (1, 5),
+        'get_contacts': (1, 5),
+        'search_users': (5, 10),
+        'get_history': (5, 20),
+        'server_status': (1, 3),
+        'admin_broadcast': (0.2, 2)
+    },
+    'default_rate_limit': (10, 30),
+    'rate_limit_sweep_interval': 60,  # Период удаления простаивающих корзин (сек)
+    # Критичные не сбрасываются никогда, низкие - первыми при перегрузке, остальные - обычные
+    'priorities': {
+        'critical': ('register', 'login', 'token_login', 'revoke_token', 'heartbeat', 'p2p_message',
+                     'call_request', 'call_answer', 'call_end', 'ice_candidate'),
+        'low': ('get_user_list', 'get_contacts', 'search_users', 'server_status', 'broadcast_status')
+    },
+    'overload_inflight': 64,        # Одновременно обрабатываемых запросов до перегрузки
+    'overload_latency': 0.25,       # Сглаженная задержка некритичных запросов до перегрузки (сек)
+    'overload_half_life': 2.0,      # Период полураспада сглаженной задержки без запросов (сек)
+    'overload_buffer_share': 0.5,   # Доля бюджета буферов соединений, с которой считается перегрузка
+    'shed_retry_after': 5           # Через сколько секунд повторить сброшенный запрос
+}
+
+# Соединения клиентов на сервере (server/client_writer.py, server/frame_reader.py)
+CONNECTION_CONFIG = {
+    'max_send_buffer': 4 * 1024 * 1024,  # Неотправленных байт на клиента, после - отключение
+    'max_frame_size': 1024 * 1024,       # Максимальный кадр запроса (server/frame_reader.py)
+    'max_handshake_size': 16 * 1024,     # Максимальный кадр с публичным ключом клиента
+    'handshake_timeout': 30,             # Сколько ждать публичный ключ после подключения (сек)
+    'idle_timeout': 360,                 # Без единого байта дольше - отключение (сек)
+    'frame_timeout': 30,                 # Начатый кадр должен прийти целиком за это время (сек)
+    'memory_budget': 256 * 1024 * 1024,  # Общий объем буферов всех соединений
+    'shed_threshold': 0.9                # Доля бюджета, выше которой новые соединения отклоняются
+}
+
+# Рассылка системных сообщений (server/broadcast.py)
+BROADCAST_CONFIG = {
+    'admins': [],                 # Пользователи, которым разрешен запрос admin_broadcast
+    'workers': 4,                 # Потоков шифрования в пуле рассылки
+    'batch_size': 512,            # Получателей в одной задаче пула
+    'keep_finished': 100          # Сколько последних рассылок доступно для broadcast_status
+}
+
+# Отслеживание активности клиентов (server/liveness.py)
+LIVENESS_CONFIG = {
+    'heartbeat_interval': 30,     # Период heartbeat клиента (сек)
+    'timeout': 300,               # Клиент без активности дольше этого отключается (сек)
+    'tick': 1.0                   # Шаг колеса таймеров (сек)
+}
+
+# Метрики сервера в формате OpenMetrics (server/openmetrics.py)
+METRICS_CONFIG = {
+    'enabled': False,             # HTTP-слушатель /metrics для Prometheus
+    'host': '127.0.0.1',          # Только локальный интерфейс: метрики содержат имена типов и нагрузку
+    'port': 9464
+}
+
+# Снимки памяти сервера (server/memory_profile.py)
+MEMORY_PROFILE_CONFIG = {
+    'enabled': False,             # tracemalloc замедляет выделение памяти - только для диагностики
+    'frames': 1,                  # Глубина стека для каждого выделения
+    'snapshot_dir': 'memory_snapshots',
+    'top': 25                     # Сколько строк выводить в лог
+}
+
+# Активные звонки на сервере (server/call_registry.py)
+CALL_CONFIG = {
+    'ring_timeout': 120,          # Сколько ждать ответа на звонок (сек)
+    'idle_timeout': 90,           # Принятый звонок завершается без активности участников (3 heartbeat)
+    'cleanup_max_sleep': 5,       # Максимальная пауза потока очистки между проверками дедлайнов (сек)
+    'call_types': ('audio', 'video')  # Допустимые типы звонка
+}
+
+# Поиск пользователей на сервере
+SEARCH_CONFIG = {
+    'page_size': 20,              # Результатов на страницу по умолчанию
+    'max_page_size': 100,         # Максимум результатов на страницу
+    'min_substring': 3            # Короче - только поиск по началу имени (триграммам нужно 3 символа)
+}
+
+# Локальный кэш сообщений клиента (в PATHS['cache'])
+CACHE_CONFIG = {
+    'key_file': 'cache.key',      # Ключ шифрования кэша в PATHS['config'], права 0600
+    'batch_size': 500,            # Максимум сообщений в одной транзакции записи
+    'flush_interval': 0.05,       # Сколько ждать пополнения пачки перед записью (сек)
+    'retry_interval': 1.0,        # Пауза перед повтором неудавшейся записи (сек)
+    'search_limit': 50            # Результатов локального поиска
+}
+
 # Настройки аудио
 AUDIO_CONFIG = {
     'sample_rate': 44100,
@@ -0,0 +1,24 @@
+"""
+Задачи bcrypt для процессов пула хеширования паролей (server/password_hasher.py).
+
+Процесс пула запускается через spawn и импортирует модуль функции заново, поэтому
+модуль лежит вне пакета server и при импорте ничего не делает: не настраивает
+логирование, не открывает базы
+"""
+
+import bcrypt
+
+
+def hash_password(password: bytes, rounds: int) -> bytes:
+    """Вычисление bcrypt-хеша"""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def check_password(password: bytes, password_hash: bytes) -> bool:
+    """Проверка пароля по bcrypt-хешу"""
+    return bcrypt.checkpw(password, password_hash)
+
+
+def noop() -> None:
+    """Пустая задача для прогрева процессов пула"""
+    return None
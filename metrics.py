@@ -0,0 +1,154 @@
+"""
+Метрики мессенджера Диалог: гистограммы задержек и счетчики
+"""
+
+import time
+import bisect
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Границы корзин гистограммы задержек (секунды)
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (последняя корзина - +Inf)"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Добавление наблюдения"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, q: float) -> float:
+        """Оценка квантиля сверху: граница корзины, в которую попадает q-я доля наблюдений"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+
+        rank = q * total
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Согласованная копия: счетчики корзин, количество, сумма"""
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def summary(self) -> Dict:
+        """Краткая сводка: количество, среднее, p50/p99"""
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99)
+        }
+
+
+class LatencyStats:
+    """Набор гистограмм задержек по типу запроса"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        """Гистограмма для типа запроса (создается при первом обращении)"""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, name: str, seconds: float):
+        """Добавление замера задержки для типа запроса"""
+        self.histogram(name).observe(seconds)
+
+    def items(self) -> List[Tuple[str, Histogram]]:
+        """Пары (тип запроса, гистограмма) по имени"""
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def summary(self) -> Dict[str, Dict]:
+        """Сводка по всем типам запросов"""
+        with self._lock:
+            items = list(self._histograms.items())
+        return {name: histogram.summary() for name, histogram in sorted(items)}
+
+
+class Counter:
+    """Один счетчик. Связывается заранее (Counters.counter), чтобы на горячем пути
+    не собирать ключ и не искать его в словаре"""
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counters:
+    """Счетчики событий по ключу (например, ('requests', тип запроса))"""
+
+    def __init__(self):
+        self._counters: Dict = {}
+        self._lock = threading.Lock()
+
+    def counter(self, key) -> Counter:
+        """Счетчик для ключа (создается при первом обращении)"""
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def inc(self, key, amount: int = 1):
+        """Увеличение счетчика"""
+        self.counter(key).inc(amount)
+
+    def get(self, key) -> int:
+        counter = self._counters.get(key)
+        return counter.value if counter is not None else 0
+
+    def snapshot(self) -> Dict:
+        """Копия всех счетчиков"""
+        with self._lock:
+            items = list(self._counters.items())
+        return {key: counter.value for key, counter in items}
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор SQLite, замеряющий каждый execute в гистограмму histogram:
+    connection.cursor(TimedCursor), затем cursor.histogram = Histogram()"""
+
+    histogram = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            if self.histogram is not None:
+                self.histogram.observe(time.perf_counter() - start)
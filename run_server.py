@@ -11,19 +11,20 @@ import logging
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('server.log')
-    ]
-)
-
 logger = logging.getLogger('dialog_server')
 
 def main():
+    # Настройка логирования в main(): процессы пула хеширования (spawn) импортируют
+    # этот модуль заново и не должны открывать server.log
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('server.log')
+        ]
+    )
+
     try:
         from server.server_secure import SecureDialogServer
         
@@ -15,7 +15,13 @@ class SimpleUserManager:
         return []
     
     def search_users(self, term):
-        return []
+        """Совпадения по имени: точные, затем по началу, затем по подстроке"""
+        term = term.strip().lower()
+        if not term:
+            return []
+        matches = [name for name in self.users if term in name.lower()]
+        matches.sort(key=lambda name: (name.lower() != term, not name.lower().startswith(term), name.lower()))
+        return [{'username': name, 'is_online': False} for name in matches]
     
     def add_friend(self, user1, user2):
         return True
@@ -0,0 +1,100 @@
+"""
+Рассылка системных сообщений всем подключенным клиентам
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence
+
+from config import BROADCAST_CONFIG
+
+logger = logging.getLogger('dialog_network')
+
+
+class Broadcast:
+    """Ход одной рассылки: сколько кадров поставлено в очереди клиентов и сколько не удалось"""
+
+    def __init__(self, broadcast_id: str, total: int):
+        self.id = broadcast_id
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.reached_99 = None   # секунд до 99% получателей
+        self.finished = None     # секунд до обработки всех получателей
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        if total == 0:
+            self.finished = 0.0
+            self.done.set()
+
+    def progress(self, sent: int, failed: int):
+        with self.lock:
+            self.sent += sent
+            self.failed += failed
+            elapsed = time.monotonic() - self.started
+            if self.reached_99 is None and self.sent >= self.total * 0.99:
+                self.reached_99 = elapsed
+            if self.sent + self.failed >= self.total:
+                self.finished = elapsed
+                self.done.set()
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {
+                'broadcast_id': self.id,
+                'total': self.total,
+                'sent': self.sent,
+                'failed': self.failed,
+                'reached_99_seconds': self.reached_99,
+                'finished_seconds': self.finished
+            }
+
+
+class Broadcaster:
+    """Сообщение сериализуется один раз; шифрование ключом каждого клиента и постановка
+    в его ClientWriter выполняются пачками в пуле потоков, не занимая потоки запросов"""
+
+    def __init__(self, workers: int = None, batch_size: int = None, keep_finished: int = None):
+        self.batch_size = batch_size or BROADCAST_CONFIG['batch_size']
+        self.keep_finished = keep_finished or BROADCAST_CONFIG['keep_finished']
+        self.pool = ThreadPoolExecutor(max_workers=workers or BROADCAST_CONFIG['workers'],
+                                       thread_name_prefix='broadcast')
+        self.broadcasts: 'OrderedDict[str, Broadcast]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def broadcast(self, message: Dict, sessions: Sequence) -> Broadcast:
+        """Рассылка message сессиям (ClientSession с cipher и writer); возвращает ход рассылки"""
+        data = json.dumps(message).encode()
+        sessions = list(sessions)
+        broadcast = Broadcast(uuid.uuid4().hex, len(sessions))
+        with self.lock:
+            self.broadcasts[broadcast.id] = broadcast
+            while len(self.broadcasts) > self.keep_finished:
+                self.broadcasts.popitem(last=False)
+        for start in range(0, len(sessions), self.batch_size):
+            self.pool.submit(self.deliver, broadcast, data, sessions[start:start + self.batch_size])
+        logger.info(f"Рассылка {broadcast.id}: {len(sessions)} получателей")
+        return broadcast
+
+    def deliver(self, broadcast: Broadcast, data: bytes, sessions: Sequence):
+        sent = failed = 0
+        for session in sessions:
+            try:
+                if session.writer.write(session.cipher.encrypt(data) + b"<END>"):
+                    sent += 1
+                else:
+                    failed += 1
+            except Exception as e:
+                logger.debug(f"Рассылка {broadcast.id}: ошибка отправки {session.username}: {e}")
+                failed += 1
+        broadcast.progress(sent, failed)
+
+    def get(self, broadcast_id: str) -> Optional[Broadcast]:
+        with self.lock:
+            return self.broadcasts.get(broadcast_id)
@@ -0,0 +1,255 @@
+"""
+Отложенная запись истории звонков: изменения call_history попадают в журнал
+в памяти и в файл, фоновый поток применяет их к базе пачками
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from config import CALL_HISTORY_CONFIG
+
+logger = logging.getLogger('dialog_storage')
+
+# Поля, без которых изменение нельзя применить (в call_history они NOT NULL)
+REQUIRED_FIELDS = {
+    'start': ('call_id', 'from_user', 'to_user', 'call_type', 'status', 'start_time'),
+    'update': ('call_id', 'status')
+}
+
+# Ошибки, которые повтор не исправит: изменение откладывается в файл отклоненных
+PERMANENT_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError,
+                    LookupError, TypeError, ValueError)
+
+
+def utc_timestamp() -> str:
+    """Время в формате CURRENT_TIMESTAMP SQLite: запись в базу происходит позже события"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class CallHistoryJournal:
+    """Журнал изменений call_history. Порядок гарантирован: каждое изменение получает seq,
+    дописывается в файл журнала до возврата, а в базу попадает пачкой в одной транзакции
+    вместе с отметкой последнего примененного seq. После сбоя процесса записи с seq больше
+    отметки повторно применяются из файла. Изменение, которое база отвергает (нарушение
+    ограничений, испорченная запись журнала), не блокирует остальные: оно пишется в файл
+    отклоненных и пропускается"""
+
+    def __init__(self, db_path: str, journal_path: str = None, batch_size: int = None,
+                 flush_interval: float = None):
+        self.db_path = db_path
+        self.journal_path = journal_path or CALL_HISTORY_CONFIG['journal_file']
+        self.rejected_path = self.journal_path + '.rejected'
+        self.batch_size = batch_size or CALL_HISTORY_CONFIG['batch_size']
+        self.flush_interval = flush_interval or CALL_HISTORY_CONFIG['flush_interval']
+
+        # Соединение принадлежит фоновому потоку; до его запуска им пользуется восстановление
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS call_history_checkpoint (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                seq INTEGER NOT NULL
+            )
+        ''')
+        # UPDATE по call_id без индекса просматривал всю таблицу
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_call_history_call_id ON call_history (call_id)")
+        self.conn.commit()
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.applied = threading.Condition(self.lock)
+        self.pending = deque()
+        self.applied_seq = self.checkpoint()
+        self.next_seq = self.applied_seq + 1
+        self.closing = False
+
+        self.recover()
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+        self.writer = threading.Thread(target=self.write_loop, name='call-history-writer', daemon=True)
+        self.writer.start()
+
+    def checkpoint(self) -> int:
+        row = self.conn.execute("SELECT seq FROM call_history_checkpoint WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def recover(self):
+        """Возврат в очередь записей журнала, не попавших в базу до остановки: их применит
+        фоновый поток, как обычные изменения. Не бросает исключений - сервер должен
+        запуститься при любом содержимом журнала"""
+        entries = []
+        try:
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # Оборванная строка - изменение не успело записаться
+                            logger.warning("Журнал истории звонков: пропущена поврежденная строка")
+                            continue
+                        if not self.well_formed(entry):
+                            self.reject(entry, 'некорректная запись журнала')
+                            continue
+                        if entry[0] > self.applied_seq:
+                            entries.append(entry)
+            # Журнал переписывается только невыполненными изменениями: новые строки
+            # не должны склеиться с оборванной последней
+            with open(self.journal_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"Журнал истории звонков {self.journal_path} не прочитан: {e}")
+        if entries:
+            entries.sort(key=lambda entry: entry[0])
+            self.pending.extend(entries)
+            self.next_seq = entries[-1][0] + 1
+            logger.info(f"Журнал истории звонков: к применению восстановлено изменений: {len(entries)}")
+
+    @staticmethod
+    def well_formed(entry) -> bool:
+        return (isinstance(entry, list) and len(entry) == 3 and isinstance(entry[0], int)
+                and entry[1] in REQUIRED_FIELDS and isinstance(entry[2], dict))
+
+    @staticmethod
+    def check_fields(op: str, fields: dict):
+        missing = [name for name in REQUIRED_FIELDS[op] if fields.get(name) is None]
+        if missing:
+            raise ValueError(f"не заданы поля {', '.join(missing)}")
+
+    def record(self, op: str, **fields):
+        """Постановка изменения в журнал; не ждет базы. ValueError - изменение неполное"""
+        self.check_fields(op, fields)
+        with self.lock:
+            if self.closing:
+                raise RuntimeError('Журнал истории звонков закрыт')
+            entry = [self.next_seq, op, fields]
+            self.next_seq += 1
+            # Файл в кэше ОС переживает падение процесса; fsync делает SQLite при применении
+            self.journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.journal.flush()
+            self.pending.append(entry)
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.notify()
+
+    def call_started(self, call_id: str, from_user: str, to_user: str, call_type: str, status: str = 'initiated'):
+        self.record('start', call_id=str(call_id), from_user=from_user, to_user=to_user,
+                    call_type=str(call_type) if call_type else None, status=status,
+                    start_time=utc_timestamp())
+
+    def call_updated(self, call_id: str, status: str, end_time=None, duration: int = None):
+        """Изменение статуса; end_time=True - текущее время (как CURRENT_TIMESTAMP)"""
+        if end_time is True:
+            end_time = utc_timestamp()
+        elif end_time is not None:
+            end_time = str(end_time)
+        if duration is not None:
+            duration = int(duration)
+        self.record('update', call_id=str(call_id), status=status, end_time=end_time, duration=duration)
+
+    def apply(self, entries: List[list]):
+        """Применение пачки изменений и отметки seq одной транзакцией"""
+        with self.conn:
+            for seq, op, fields in entries:
+                if op == 'start':
+                    self.conn.execute(
+                        "INSERT INTO call_history (call_id, from_user, to_user, call_type, status, start_time) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (fields['call_id'], fields['from_user'], fields['to_user'],
+                         fields['call_type'], fields['status'], fields['start_time'])
+                    )
+                else:
+                    self.conn.execute(
+                        "UPDATE call_history SET status = ?, end_time = COALESCE(?, end_time), "
+                        "duration = COALESCE(?, duration) WHERE call_id = ?",
+                        (fields['status'], fields['end_time'], fields['duration'], fields['call_id'])
+                    )
+            self.conn.execute("INSERT OR REPLACE INTO call_history_checkpoint (id, seq) VALUES (1, ?)",
+                              (entries[-1][0],))
+
+    def apply_each(self, entries: List[list]) -> int:
+        """Применение по одному изменению после отказа всей пачки: отвергнутые базой
+        откладываются в файл отклоненных. Возвращает число обработанных изменений -
+        на временной ошибке (база занята) остальные остаются в очереди"""
+        for index, entry in enumerate(entries):
+            try:
+                self.apply([entry])
+            except PERMANENT_ERRORS as e:
+                self.reject(entry, e)
+                try:
+                    with self.conn:
+                        self.conn.execute("INSERT OR REPLACE INTO call_history_checkpoint (id, seq) VALUES (1, ?)",
+                                          (entry[0],))
+                except sqlite3.Error:
+                    pass  # После перезапуска запись снова попадет в файл отклоненных
+            except sqlite3.Error:
+                return index
+        return len(entries)
+
+    def reject(self, entry, error):
+        """Изменение, которое нельзя применить, - в файл отклоненных для разбора вручную"""
+        logger.error(f"Изменение истории звонков отклонено ({error}): {entry}")
+        try:
+            with open(self.rejected_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'entry': entry, 'error': str(error)}, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            logger.error(f"Не удалось записать отклоненное изменение в {self.rejected_path}: {e}")
+
+    def write_loop(self):
+        while True:
+            with self.lock:
+                if len(self.pending) < self.batch_size and not self.closing:
+                    self.wakeup.wait(self.flush_interval)
+                if not self.pending:
+                    if self.closing:
+                        break
+                    continue
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.batch_size))]
+
+            try:
+                self.apply(batch)
+                done = len(batch)
+            except PERMANENT_ERRORS as e:
+                logger.warning(f"Пачка истории звонков отвергнута ({e}), применение по одному")
+                done = self.apply_each(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи истории звонков ({len(batch)} изменений), повтор: {e}")
+                done = 0
+
+            if done < len(batch):
+                # Остаток возвращается в начало очереди, чтобы не нарушить порядок
+                with self.lock:
+                    self.pending.extendleft(reversed(batch[done:]))
+                    self.wakeup.wait(1.0)
+                if not done:
+                    continue
+                batch = batch[:done]
+
+            with self.lock:
+                self.applied_seq = batch[-1][0]
+                self.applied.notify_all()
+                # Все изменения в базе - файл журнала можно очистить
+                if not self.pending and self.journal.tell() > 0:
+                    self.journal.truncate(0)
+        self.conn.close()
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Ожидание применения всех поставленных изменений"""
+        with self.lock:
+            target = self.next_seq - 1
+            self.wakeup.notify()
+            return self.applied.wait_for(lambda: self.applied_seq >= target, timeout)
+
+    def close(self):
+        with self.lock:
+            if self.closing:
+                return
+            self.closing = True
+            self.wakeup.notify()
+        self.writer.join()
+        self.journal.close()
@@ -0,0 +1,155 @@
+"""
+Реестр активных звонков: индекс по пользователям и дедлайны в min-куче
+"""
+
+import time
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import CALL_CONFIG
+
+
+class CallRegistry:
+    """Звонки по call_id с индексом username -> call_id: проверка занятости за O(1),
+    завершение звонков отключившегося пользователя за O(k).
+    Дедлайн звонка (monotonic) сдвигается активностью участников - heartbeat, ICE;
+    куча хранит дедлайны лениво: устаревшая запись перепроверяется при извлечении"""
+
+    def __init__(self, ring_timeout: float = None, idle_timeout: float = None):
+        self.ring_timeout = ring_timeout or CALL_CONFIG['ring_timeout']
+        self.idle_timeout = idle_timeout or CALL_CONFIG['idle_timeout']
+        self.calls: Dict[str, dict] = {}
+        self.by_user: Dict[str, Set[str]] = {}
+        self.heap: List[Tuple[float, str]] = []
+        self.lock = threading.Lock()
+
+    def __contains__(self, call_id) -> bool:
+        return call_id in self.calls
+
+    def __getitem__(self, call_id) -> dict:
+        return self.calls[call_id]
+
+    def __len__(self) -> int:
+        return len(self.calls)
+
+    def get(self, call_id) -> Optional[dict]:
+        return self.calls.get(call_id)
+
+    def keys(self) -> List[str]:
+        with self.lock:
+            return list(self.calls)
+
+    def is_busy(self, username: str) -> bool:
+        return bool(self.by_user.get(username))
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Число звонков в каждом состоянии (ringing, active)"""
+        with self.lock:
+            counts: Dict[str, int] = {}
+            for call in self.calls.values():
+                counts[call['status']] = counts.get(call['status'], 0) + 1
+            return counts
+
+    def calls_of(self, username: str) -> List[str]:
+        with self.lock:
+            return list(self.by_user.get(username, ()))
+
+    def add(self, call_id: str, from_user: str, to_user: str, call_type: str,
+            now: float = None) -> Optional[dict]:
+        """Регистрация звонка в состоянии ringing; None, если получатель уже в звонке.
+        ValueError - звонок с таким call_id уже есть (call_id задает клиент)"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if call_id in self.calls:
+                raise ValueError(f"Звонок {call_id} уже существует")
+            if self.by_user.get(to_user):
+                return None
+            call = {
+                'from': from_user,
+                'to': to_user,
+                'call_type': call_type,
+                'start_time': datetime.now(),
+                'status': 'ringing',
+                'deadline': now + self.ring_timeout
+            }
+            self.calls[call_id] = call
+            self.by_user.setdefault(from_user, set()).add(call_id)
+            self.by_user.setdefault(to_user, set()).add(call_id)
+            heapq.heappush(self.heap, (call['deadline'], call_id))
+            return call
+
+    def set_deadline(self, call_id: str, call: dict, deadline: float):
+        # Более поздний дедлайн не требует новой записи в куче - проверится при извлечении
+        if deadline < call['deadline']:
+            heapq.heappush(self.heap, (deadline, call_id))
+        call['deadline'] = deadline
+
+    def activate(self, call_id: str, now: float = None) -> Optional[dict]:
+        """Звонок принят: дальше он живет, пока участники активны"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            call = self.calls.get(call_id)
+            if call is not None:
+                call['status'] = 'active'
+                call['answer_time'] = datetime.now()
+                self.set_deadline(call_id, call, now + self.idle_timeout)
+            return call
+
+    def touch(self, call_id: str, now: float = None):
+        """Активность в звонке продлевает принятый звонок; ожидание ответа не продлевается"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            call = self.calls.get(call_id)
+            if call is not None and call['status'] == 'active':
+                self.set_deadline(call_id, call, now + self.idle_timeout)
+
+    def touch_user(self, username: str, now: float = None):
+        """Активность пользователя (heartbeat) продлевает все его принятые звонки"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for call_id in self.by_user.get(username, ()):
+                call = self.calls.get(call_id)
+                if call is not None and call['status'] == 'active':
+                    self.set_deadline(call_id, call, now + self.idle_timeout)
+
+    def unindex(self, call_id: str) -> Optional[dict]:
+        # Вызывается под self.lock
+        call = self.calls.pop(call_id, None)
+        if call is None:
+            return None
+        for username in (call['from'], call['to']):
+            user_calls = self.by_user.get(username)
+            if user_calls is not None:
+                user_calls.discard(call_id)
+                if not user_calls:
+                    del self.by_user[username]
+        return call
+
+    def remove(self, call_id: str) -> Optional[dict]:
+        """Удаление звонка; запись в куче остается и отбрасывается при извлечении"""
+        with self.lock:
+            return self.unindex(call_id)
+
+    def expire(self, now: float = None) -> List[Tuple[str, dict]]:
+        """Удаление звонков с наступившим дедлайном: [(call_id, данные)]"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, call_id = heapq.heappop(self.heap)
+                call = self.calls.get(call_id)
+                if call is None:
+                    continue
+                if call['deadline'] > now:
+                    # Дедлайн был продлен - возвращаем в кучу с актуальным значением
+                    if call['deadline'] > deadline:
+                        heapq.heappush(self.heap, (call['deadline'], call_id))
+                    continue
+                expired.append((call_id, self.unindex(call_id)))
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        with self.lock:
+            return self.heap[0][0] if self.heap else None
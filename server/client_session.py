@@ -0,0 +1,42 @@
+"""
+Сессия онлайн-клиента сервера
+"""
+
+import sys
+from typing import Any, Optional, Tuple
+
+from .liveness import wall_clock
+
+
+class ClientSession:
+    """Онлайн-клиент в SecureDialogServer.clients. __slots__ вместо словаря на каждого
+    клиента; имя и адреса интернированы - строки общие для словаря клиентов, контактов,
+    звонков и потока клиента, а клиенты за одним NAT делят одну строку IP"""
+
+    __slots__ = ('username', 'socket', 'cipher', 'address', 'last_seen',
+                 'user_id', 'p2p_port', 'external_ip', 'writer')
+
+    def __init__(self, username: str, socket, cipher, address: Tuple[str, int], user_id: int,
+                 last_seen: float, p2p_port: int = 0, external_ip: Optional[str] = '', writer=None):
+        self.username = sys.intern(username)
+        self.socket = socket
+        self.cipher = cipher
+        self.address = (sys.intern(address[0]), address[1])
+        self.last_seen = last_seen
+        self.user_id = user_id
+        self.p2p_port = p2p_port
+        self.external_ip = sys.intern(external_ip) if isinstance(external_ip, str) else external_ip
+        self.writer = writer  # ClientWriter соединения
+
+    def set_endpoint(self, p2p_port: int, external_ip: Any):
+        self.p2p_port = p2p_port
+        self.external_ip = sys.intern(external_ip) if isinstance(external_ip, str) else external_ip
+
+    def presence(self) -> dict:
+        """Адрес и активность для списков пользователей и контактов"""
+        return {
+            'username': self.username,
+            'p2p_port': self.p2p_port,
+            'external_ip': self.external_ip,
+            'last_seen': wall_clock(self.last_seen)
+        }
@@ -0,0 +1,180 @@
+"""
+Запись кадров в сокеты клиентов без блокировки вызывающего потока
+"""
+
+import socket
+import logging
+import selectors
+import threading
+from collections import deque
+
+from config import CONNECTION_CONFIG
+
+logger = logging.getLogger('dialog_network')
+
+
+class ClientWriter:
+    """Очередь исходящих кадров одного соединения. Кадры пишутся по порядку и целиком,
+    из какого бы потока их ни отправляли. Запись не блокирует: что не вошло в буфер сокета,
+    дописывает поток WriterLoop, когда сокет готов. Клиент, накопивший больше max_buffer
+    неотправленных байт или не уместившийся в общий бюджет памяти (MemoryBudget), отключается"""
+
+    __slots__ = ('socket', 'raw', 'loop', 'max_buffer', 'budget', 'lock', 'frames', 'buffered', 'closed')
+
+    def __init__(self, client_socket: socket.socket, loop: 'WriterLoop', max_buffer: int = None,
+                 budget=None):
+        self.socket = client_socket
+        # Копия дескриптора в неблокирующем режиме: у основного сокета таймаут для recv,
+        # и send на нем ждал бы освобождения буфера
+        self.raw = client_socket.dup()
+        self.raw.setblocking(False)
+        self.loop = loop
+        self.max_buffer = max_buffer or CONNECTION_CONFIG['max_send_buffer']
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.frames = deque()
+        self.buffered = 0
+        self.closed = False
+
+    def write(self, frame: bytes) -> bool:
+        """Постановка кадра в очередь; False - соединение закрыто или переполнено"""
+        with self.lock:
+            if self.closed:
+                return False
+            if self.buffered + len(frame) > self.max_buffer:
+                logger.warning(f"Клиент не читает данные ({self.buffered} байт в очереди), соединение закрывается")
+                self.close_locked(shutdown=True)
+                return False
+            if self.budget is not None and not self.budget.reserve(len(frame)):
+                logger.warning("Общий буфер соединений заполнен, медленный клиент отключается")
+                self.close_locked(shutdown=True)
+                return False
+            self.frames.append(memoryview(frame))
+            self.buffered += len(frame)
+            if len(self.frames) == 1:
+                self.flush_locked()
+            return not self.closed
+
+    def flush(self) -> bool:
+        """Дозапись очереди; True - очередь пуста"""
+        with self.lock:
+            if not self.closed:
+                self.flush_locked()
+            return self.closed or not self.frames
+
+    def flush_locked(self):
+        frames = self.frames
+        while frames:
+            frame = frames[0]
+            try:
+                sent = self.raw.send(frame)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.close_locked()
+                return
+            self.buffered -= sent
+            if self.budget is not None:
+                self.budget.release(sent)
+            if sent < len(frame):
+                frames[0] = frame[sent:]
+                break
+            frames.popleft()
+        if frames:
+            self.loop.want_write(self)
+
+    def close_locked(self, shutdown: bool = False):
+        self.closed = True
+        self.frames.clear()
+        if self.budget is not None:
+            self.budget.release(self.buffered)
+        self.buffered = 0
+        self.loop.forget(self)
+        if shutdown:
+            # Поток клиента получит ошибку чтения и выполнит обычное отключение
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            self.raw.close()
+        except OSError:
+            pass
+
+    def close(self, shutdown: bool = False):
+        """Закрытие очереди; shutdown - еще и разрыв соединения: raw держит копию
+        дескриптора, так что закрытие основного сокета соединение не завершает"""
+        with self.lock:
+            if not self.closed:
+                self.close_locked(shutdown)
+
+
+class WriterLoop:
+    """Один поток, дописывающий очереди ClientWriter, когда сокеты готовы к записи"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.added = set()
+        self.removed = set()
+        self.waker, self.wake_socket = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wake_socket.setblocking(False)
+        self.selector.register(self.waker, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.run, name='client-writer', daemon=True)
+        self.thread.start()
+
+    def want_write(self, writer: ClientWriter):
+        with self.lock:
+            self.removed.discard(writer)
+            self.added.add(writer)
+        self.wake()
+
+    def forget(self, writer: ClientWriter):
+        with self.lock:
+            self.added.discard(writer)
+            self.removed.add(writer)
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wake_socket.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Пробуждение уже ожидает в буфере
+
+    def run(self):
+        registered = set()
+        while True:
+            with self.lock:
+                added, self.added = self.added, set()
+                removed, self.removed = self.removed, set()
+            for writer in removed:
+                if writer in registered:
+                    registered.discard(writer)
+                    try:
+                        self.selector.unregister(writer.raw)
+                    except (KeyError, ValueError, OSError):
+                        pass
+            for writer in added:
+                if writer not in registered and not writer.closed:
+                    try:
+                        self.selector.register(writer.raw, selectors.EVENT_WRITE, writer)
+                        registered.add(writer)
+                    except (KeyError, ValueError, OSError):
+                        pass
+
+            for key, _ in self.selector.select():
+                if key.fileobj is self.waker:
+                    try:
+                        while self.waker.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                writer = key.data
+                if writer.flush():
+                    registered.discard(writer)
+                    try:
+                        self.selector.unregister(writer.raw)
+                    except (KeyError, ValueError, OSError):
+                        pass
@@ -0,0 +1,84 @@
+"""
+Ограниченный пул соединений SQLite, общий для всех потоков сервера
+"""
+
+import queue
+import sqlite3
+import threading
+from typing import Callable, List
+
+from config import DATABASE_CONFIG
+
+
+class ConnectionPool:
+    """Не больше size соединений на все потоки. Соединение берется из пула на время
+    операции и возвращается после нее: число открытых файлов не зависит от числа
+    потоков клиентов. Вложенные acquire() в одном потоке получают то же соединение"""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int = None, timeout: float = None):
+        self.connect = connect
+        self.size = size or DATABASE_CONFIG['pool_size']
+        self.timeout = DATABASE_CONFIG['pool_timeout'] if timeout is None else timeout
+        self.idle = queue.LifoQueue()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def depth(self) -> int:
+        """Вложенность acquire() в текущем потоке; 0 - соединение не взято"""
+        return getattr(self.local, 'depth', 0)
+
+    def acquire(self) -> sqlite3.Connection:
+        if self.depth():
+            self.local.depth += 1
+            return self.local.conn
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.open() or self.wait()
+        self.local.conn = conn
+        self.local.depth = 1
+        return conn
+
+    def open(self):
+        with self.lock:
+            if len(self.connections) >= self.size:
+                return None
+            conn = self.connect()
+            self.connections.append(conn)
+            return conn
+
+    def wait(self) -> sqlite3.Connection:
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"нет свободного соединения с базой за {self.timeout} с")
+
+    def release(self, conn: sqlite3.Connection) -> bool:
+        """Возврат соединения; True - завершена внешняя операция и соединение вернулось в пул.
+        Незавершенная транзакция откатывается"""
+        self.local.depth -= 1
+        if self.local.depth:
+            return False
+        self.local.conn = None
+        with self.lock:
+            if conn not in self.connections:
+                return True  # Пул закрыт во время операции
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            pass
+        self.idle.put(conn)
+        return True
+
+    def close(self):
+        """Закрытие всех соединений пула, в том числе взятых другими потоками"""
+        with self.lock:
+            connections, self.connections = self.connections, []
+            self.idle = queue.LifoQueue()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,175 @@
+"""
+Маршрутизация запросов клиента: таблица обработчиков и цепочка промежуточных слоев
+(замеры, ошибки, авторизация, проверка полей; ограничение частоты - server/rate_limit.py)
+"""
+
+import time
+import logging
+from typing import Callable, Dict, Optional, Sequence
+
+from metrics import Counters, LatencyStats
+
+# Имя в метриках для запросов неизвестного типа - чтобы не плодить гистограммы
+UNKNOWN_REQUEST = 'unknown'
+
+
+class RequestError(Exception):
+    """Ошибка запроса: сообщение передается клиенту в ответе об ошибке"""
+
+
+class RequestContext:
+    """Состояние соединения для обработчиков; request - текущий запрос"""
+
+    __slots__ = ('client_ip', 'address', 'writer', 'cipher', 'username', 'user_id', 'request')
+
+    def __init__(self, client_ip: str, address, writer, cipher):
+        self.client_ip = client_ip
+        self.address = address
+        self.writer = writer
+        self.cipher = cipher
+        self.username = None
+        self.user_id = None
+        self.request = None
+
+
+class Handler:
+    """Обработчик типа запроса. auth: False - без входа, True - после входа на соединении,
+    'session' - еще и действительный session_token в запросе. required и schema -
+    обязательные поля и типы полей. error - начало сообщения при исключении,
+    response_type - тип ответа об ошибке со status='error' (иначе type='error')"""
+
+    __slots__ = ('type', 'func', 'auth', 'required', 'schema', 'error', 'response_type')
+
+    def __init__(self, request_type: str, func: Callable, auth=True, required: Sequence[str] = (),
+                 schema: Dict[str, type] = None, error: str = None, response_type: str = None):
+        self.type = request_type
+        self.func = func
+        self.auth = auth
+        self.required = tuple(required)
+        self.schema = schema or {}
+        self.error = error or 'Ошибка обработки запроса'
+        self.response_type = response_type
+
+    def error_response(self, message: str) -> Dict:
+        if self.response_type:
+            return {'type': self.response_type, 'status': 'error', 'message': message}
+        return {'type': 'error', 'message': message}
+
+
+class Dispatcher:
+    """Таблица тип запроса -> Handler. Промежуточный слой - функция (ctx, handler, call_next),
+    первый в списке выполняется первым"""
+
+    def __init__(self, middlewares: Sequence[Callable] = ()):
+        self.handlers: Dict[str, Handler] = {}
+        self.middlewares = list(middlewares)
+        self.chain = self.build_chain()
+
+    def register(self, request_type: str, func: Callable, **options) -> Handler:
+        handler = Handler(request_type, func, **options)
+        self.handlers[request_type] = handler
+        return handler
+
+    def use(self, middleware: Callable):
+        self.middlewares.append(middleware)
+        self.chain = self.build_chain()
+
+    def build_chain(self):
+        def call(ctx, handler):
+            return handler.func(ctx)
+        for middleware in reversed(self.middlewares):
+            call = self.wrap(middleware, call)
+        return call
+
+    @staticmethod
+    def wrap(middleware, call_next):
+        return lambda ctx, handler: middleware(ctx, handler, call_next)
+
+    def dispatch(self, ctx: RequestContext):
+        """Ответ на ctx.request: словарь или готовые байты"""
+        request_type = ctx.request.get('type')
+        handler = self.handlers.get(request_type)
+        if handler is None:
+            handler = Handler(UNKNOWN_REQUEST, self.unknown, auth=False)
+        return self.chain(ctx, handler)
+
+    @staticmethod
+    def unknown(ctx):
+        return {'type': 'error', 'message': f'Неизвестный тип запроса: {ctx.request.get("type")}'}
+
+
+class TimingMiddleware:
+    """Гистограмма задержки, число запросов и ошибок по типу запроса. Гистограмма и
+    счетчики типа связываются при первом запросе, дальше - без выделения ключей"""
+
+    def __init__(self, latency: LatencyStats, counters: Counters):
+        self.latency = latency
+        self.counters = counters
+        self.bound = {}  # тип запроса -> (гистограмма, запросы, ошибки)
+
+    def bind(self, request_type: str):
+        bound = self.bound[request_type] = (self.latency.histogram(request_type),
+                                            self.counters.counter(('requests', request_type)),
+                                            self.counters.counter(('errors', request_type)))
+        return bound
+
+    def __call__(self, ctx, handler, call_next):
+        histogram, requests, errors = self.bound.get(handler.type) or self.bind(handler.type)
+        start = time.perf_counter()
+        response = call_next(ctx, handler)
+        histogram.observe(time.perf_counter() - start)
+        requests.inc()
+        if isinstance(response, dict) and (response.get('type') == 'error' or response.get('status') == 'error'):
+            errors.inc()
+        return response
+
+
+class ErrorMiddleware:
+    """Исключение обработчика -> ответ об ошибке. RequestError - сообщение как есть,
+    исключения из expected - заданное сообщение без трассировки в логе"""
+
+    def __init__(self, expected: Dict[type, str] = None):
+        self.expected = expected or {}
+
+    def __call__(self, ctx, handler, call_next):
+        try:
+            return call_next(ctx, handler)
+        except RequestError as e:
+            return handler.error_response(str(e))
+        except Exception as e:
+            for error_type, message in self.expected.items():
+                if isinstance(e, error_type):
+                    logging.warning(f"Запрос {handler.type} от {ctx.username or ctx.client_ip} отклонен: {e}")
+                    return handler.error_response(message)
+            logging.error(f"{handler.error} ({handler.type}, {ctx.username or 'unknown'}): {e}")
+            return handler.error_response(f'{handler.error}: {e}')
+
+
+class AuthMiddleware:
+    """Проверка входа на соединении и, для auth='session', токена сессии"""
+
+    def __init__(self, validate_session: Callable[[str], Optional[int]]):
+        self.validate_session = validate_session
+
+    def __call__(self, ctx, handler, call_next):
+        if handler.auth:
+            if not ctx.username or not ctx.user_id:
+                return handler.error_response('Не авторизован')
+            if handler.auth == 'session':
+                session_token = ctx.request.get('session_token')
+                if not session_token or not self.validate_session(session_token):
+                    return handler.error_response('Невалидная сессия')
+        return call_next(ctx, handler)
+
+
+def schema_middleware(ctx, handler, call_next):
+    """Обязательные поля и типы полей запроса"""
+    request = ctx.request
+    for field in handler.required:
+        if request.get(field) in (None, ''):
+            return handler.error_response(f'Не указано поле {field}')
+    for field, expected in handler.schema.items():
+        value = request.get(field)
+        if value is not None and not isinstance(value, expected):
+            return handler.error_response(f'Некорректное поле {field}')
+    return call_next(ctx, handler)
@@ -0,0 +1,193 @@
+"""
+Чтение кадров клиента с ограничениями: размер кадра, дедлайны ожидания и приема кадра,
+общий бюджет памяти буферов всех соединений
+"""
+
+import time
+import socket
+import threading
+from typing import Dict, List, Optional
+
+from config import CONNECTION_CONFIG
+
+FRAME_END = b"<END>"
+
+
+class FrameError(Exception):
+    """Соединение нарушило ограничения чтения и должно быть закрыто"""
+
+
+class FrameTooLarge(FrameError):
+    """Кадр больше допустимого размера"""
+
+
+class FrameTimeout(FrameError):
+    """Истек дедлайн ожидания или приема кадра"""
+
+
+class MemoryOverload(FrameError):
+    """Исчерпан общий бюджет памяти буферов соединений"""
+
+
+class MemoryBudget:
+    """Общий счетчик байт в буферах соединений (входящие кадры и очереди отправки).
+    Выше shed_threshold бюджета новые соединения не принимаются, при исчерпании
+    соединение, которому не хватило места, закрывается"""
+
+    def __init__(self, limit: int = None, shed_threshold: float = None):
+        self.limit = limit or CONNECTION_CONFIG['memory_budget']
+        self.shed_threshold = shed_threshold or CONNECTION_CONFIG['shed_threshold']
+        self.used = 0
+        self.peak = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        with self.lock:
+            if self.used + size > self.limit:
+                self.rejected += 1
+                return False
+            self.used += size
+            if self.used > self.peak:
+                self.peak = self.used
+            return True
+
+    def release(self, size: int):
+        with self.lock:
+            self.used -= size
+
+    def overloaded(self) -> bool:
+        """Пора сбрасывать нагрузку: новые соединения не принимаются"""
+        return self.used >= self.limit * self.shed_threshold
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'limit': self.limit, 'used': self.used, 'peak': self.peak, 'rejected': self.rejected}
+
+
+class FrameReader:
+    """Кадры одного соединения, разделенные <END>. Буфер ограничен max_frame; первый байт
+    кадра должен прийти за idle_timeout, весь кадр - за frame_timeout после первого байта
+    (медленная посылка по байту не удерживает поток). Байты после <END> остаются в буфере
+    как начало следующего кадра"""
+
+    __slots__ = ('socket', 'budget', 'max_frame', 'idle_timeout', 'frame_timeout',
+                 'buffer', 'scan_from', 'frame_started')
+
+    def __init__(self, client_socket: socket.socket, budget: Optional[MemoryBudget] = None,
+                 max_frame: int = None, idle_timeout: float = None, frame_timeout: float = None):
+        self.socket = client_socket
+        self.budget = budget
+        self.max_frame = max_frame or CONNECTION_CONFIG['max_frame_size']
+        self.idle_timeout = idle_timeout or CONNECTION_CONFIG['idle_timeout']
+        self.frame_timeout = frame_timeout or CONNECTION_CONFIG['frame_timeout']
+        self.buffer = bytearray()
+        self.scan_from = 0
+        self.frame_started = 0.0
+
+    @property
+    def buffered(self) -> int:
+        return len(self.buffer)
+
+    def read_frame(self, max_frame: int = None, idle_timeout: float = None) -> Optional[bytes]:
+        """Следующий кадр без <END>; None - клиент закрыл соединение.
+        max_frame и idle_timeout переопределяют ограничения для одного кадра (рукопожатие)"""
+        max_frame = max_frame or self.max_frame
+        idle_deadline = time.monotonic() + (idle_timeout or self.idle_timeout)
+        buffer = self.buffer
+        while True:
+            end = buffer.find(FRAME_END, self.scan_from)
+            if end >= 0:
+                frame = bytes(buffer[:end])
+                del buffer[:end + len(FRAME_END)]
+                self.release(end + len(FRAME_END))
+                self.scan_from = 0
+                self.frame_started = time.monotonic()
+                return frame
+            # Разделитель может быть разрезан между чтениями
+            self.scan_from = max(0, len(buffer) - len(FRAME_END) + 1)
+            if len(buffer) > max_frame:
+                raise FrameTooLarge(f"кадр больше {max_frame} байт")
+
+            now = time.monotonic()
+            deadline = self.frame_started + self.frame_timeout if buffer else idle_deadline
+            if now >= deadline:
+                if buffer:
+                    raise FrameTimeout(f"кадр не получен за {self.frame_timeout} с ({len(buffer)} байт)")
+                raise FrameTimeout(f"нет данных {idle_timeout or self.idle_timeout} с")
+
+            self.socket.settimeout(deadline - now)
+            try:
+                chunk = self.socket.recv(min(65536, max_frame + len(FRAME_END) - len(buffer)))
+            except socket.timeout:
+                continue
+            if not chunk:
+                return None
+            if self.budget is not None and not self.budget.reserve(len(chunk)):
+                raise MemoryOverload(f"общий буфер соединений заполнен ({self.budget.used} байт)")
+            if not buffer:
+                self.frame_started = now
+            buffer += chunk
+
+    def release(self, size: int):
+        if self.budget is not None and size:
+            self.budget.release(size)
+
+    def close(self):
+        """Освобождение буфера и его доли в бюджете"""
+        self.release(len(self.buffer))
+        self.buffer = bytearray()
+
+
+class ConnectionEntry:
+    """Соединение в ConnectionRegistry"""
+
+    __slots__ = ('address', 'reader', 'writer', 'username')
+
+    def __init__(self, address, reader: FrameReader, writer=None):
+        self.address = address
+        self.reader = reader
+        self.writer = writer
+        self.username = None
+
+    def stats(self) -> Dict:
+        return {
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'username': self.username,
+            'incoming': self.reader.buffered,
+            'outgoing': self.writer.buffered if self.writer is not None else 0
+        }
+
+
+class ConnectionRegistry:
+    """Открытые соединения сервера для статистики буферов"""
+
+    def __init__(self):
+        self.connections = {}  # id(entry) -> ConnectionEntry
+        self.lock = threading.Lock()
+
+    def add(self, address, reader: FrameReader, writer=None) -> ConnectionEntry:
+        entry = ConnectionEntry(address, reader, writer)
+        with self.lock:
+            self.connections[id(entry)] = entry
+        return entry
+
+    def remove(self, entry: ConnectionEntry):
+        with self.lock:
+            self.connections.pop(id(entry), None)
+
+    def __len__(self):
+        return len(self.connections)
+
+    def stats(self, top: int = 20) -> Dict:
+        """Суммы буферов и top соединений с наибольшим числом байт в буферах"""
+        with self.lock:
+            entries = list(self.connections.values())
+        rows: List[Dict] = [entry.stats() for entry in entries]
+        rows.sort(key=lambda row: row['incoming'] + row['outgoing'], reverse=True)
+        return {
+            'connections': len(rows),
+            'incoming': sum(row['incoming'] for row in rows),
+            'outgoing': sum(row['outgoing'] for row in rows),
+            'largest': rows[:top]
+        }
@@ -0,0 +1,76 @@
+"""
+Отслеживание активности клиентов: monotonic-время и хешированное колесо таймеров
+"""
+
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Set, Tuple
+
+from config import LIVENESS_CONFIG
+
+
+def wall_clock(monotonic_ts: float) -> str:
+    """ISO-время по monotonic-отметке - для передачи клиентам"""
+    return (datetime.now() - timedelta(seconds=time.monotonic() - monotonic_ts)).isoformat()
+
+
+class TimingWheel:
+    """Колесо из слотов по tick секунд. Ключ лежит в слоте своего дедлайна;
+    продление переносит его в другой слот за O(1). Истечение просматривает
+    только прошедшие слоты, а не всех клиентов.
+    Слотов хватает на timeout, поэтому в слоте только дедлайны текущего оборота"""
+
+    def __init__(self, timeout: float = None, tick: float = None):
+        self.timeout = timeout or LIVENESS_CONFIG['timeout']
+        self.tick = tick or LIVENESS_CONFIG['tick']
+        self.slots: List[Set[Hashable]] = [set() for _ in range(int(self.timeout // self.tick) + 2)]
+        self.entries: Dict[Hashable, Tuple[float, int]] = {}  # ключ -> (дедлайн, номер тика)
+        self.current_tick = int(time.monotonic() // self.tick)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def touch(self, key: Hashable, now: float = None):
+        """Активность: дедлайн ключа переносится на now + timeout"""
+        now = time.monotonic() if now is None else now
+        deadline = now + self.timeout
+        tick = int(deadline // self.tick)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] != tick:
+                self.slots[entry[1] % len(self.slots)].discard(key)
+            if entry is None or entry[1] != tick:
+                self.slots[tick % len(self.slots)].add(key)
+            self.entries[key] = (deadline, tick)
+
+    def remove(self, key: Hashable):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.slots[entry[1] % len(self.slots)].discard(key)
+
+    def expire(self, now: float = None) -> List[Hashable]:
+        """Ключи с истекшим дедлайном (удаляются из колеса). Слот тика T
+        обрабатывается, когда тик полностью прошел, - все его дедлайны наступили"""
+        now = time.monotonic() if now is None else now
+        last_tick = int(now // self.tick) - 1
+        expired = []
+        with self.lock:
+            # После долгого простоя не крутим колесо больше одного оборота
+            start = max(self.current_tick, last_tick - len(self.slots) + 1)
+            for tick in range(start, last_tick + 1):
+                slot = self.slots[tick % len(self.slots)]
+                if not slot:
+                    continue
+                due = [key for key in slot if self.entries[key][1] <= tick]
+                slot.difference_update(due)
+                for key in due:
+                    del self.entries[key]
+                expired.extend(due)
+            self.current_tick = max(self.current_tick, last_tick + 1)
+        return expired
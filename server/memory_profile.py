@@ -0,0 +1,70 @@
+"""
+Снимки памяти сервера через tracemalloc.
+
+Включается MEMORY_PROFILE_CONFIG['enabled']; снимок пишется по SIGUSR1
+(kill -USR1 <pid>) в snapshot_dir, верхние строки - в лог.
+Сравнение двух снимков:
+    python -m server.memory_profile old.snapshot new.snapshot
+"""
+
+import os
+import sys
+import signal
+import logging
+import tracemalloc
+from datetime import datetime
+from typing import Optional
+
+from config import MEMORY_PROFILE_CONFIG
+
+logger = logging.getLogger('dialog_memory')
+
+
+def start(config: dict = None) -> bool:
+    """Запуск трассировки и обработчика SIGUSR1; False, если профилирование выключено"""
+    config = config or MEMORY_PROFILE_CONFIG
+    if not config['enabled']:
+        return False
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(config['frames'])
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: take_snapshot(config))
+    logger.info(f"tracemalloc включен ({config['frames']} кадров), снимок - SIGUSR1 процессу {os.getpid()}")
+    return True
+
+
+def take_snapshot(config: dict = None) -> Optional[str]:
+    """Снимок в файл и верхние строки по размеру в лог. Возвращает путь к файлу"""
+    config = config or MEMORY_PROFILE_CONFIG
+    if not tracemalloc.is_tracing():
+        logger.warning("Снимок памяти невозможен: tracemalloc не запущен")
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    os.makedirs(config['snapshot_dir'], exist_ok=True)
+    path = os.path.join(config['snapshot_dir'], datetime.now().strftime('server-%Y%m%d-%H%M%S-%f.snapshot'))
+    snapshot.dump(path)
+
+    current, peak = tracemalloc.get_traced_memory()
+    logger.info(f"Снимок памяти {path}: сейчас {current / 1048576:.1f} МБ, пик {peak / 1048576:.1f} МБ")
+    for stat in snapshot.statistics('lineno')[:config['top']]:
+        logger.info(f"  {stat}")
+    return path
+
+
+def compare(old_path: str, new_path: str, top: int = None):
+    """Рост памяти между двумя снимками по строкам кода"""
+    top = top or MEMORY_PROFILE_CONFIG['top']
+    old = tracemalloc.Snapshot.load(old_path)
+    new = tracemalloc.Snapshot.load(new_path)
+    for stat in new.compare_to(old, 'lineno')[:top]:
+        print(stat)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    compare(sys.argv[1], sys.argv[2])
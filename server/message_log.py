@@ -0,0 +1,448 @@
+"""
+Сегментированный журнал только на добавление - движок MessageStore для нагрузки
+"записать и прочитать последнее": групповой fsync, индекс смещений по потокам,
+чтение через mmap, фоновое сжатие и удаление старых сегментов
+"""
+
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+from .message_store import MessageStore, LogRecord
+
+logger = logging.getLogger('dialog_storage')
+
+# Запись: длина данных, CRC32 остальной части | seq, время, длина имени потока | имя | данные
+LEAD = struct.Struct('<II')
+REST = struct.Struct('<QdH')
+HEADER_SIZE = LEAD.size + REST.size
+
+# Служебный поток с отметками trim: удаление из очереди переживает перезапуск
+TRIM_STREAM = '\x00trim'
+
+
+def encode_record(seq: int, timestamp: float, stream: str, payload: bytes) -> bytes:
+    name = stream.encode('utf-8')
+    tail = REST.pack(seq, timestamp, len(name)) + name + payload
+    return LEAD.pack(len(payload), zlib.crc32(tail)) + tail
+
+
+def decode_record(buf, offset: int, limit: int, verify: bool = True):
+    """(seq, timestamp, stream, payload, конец записи) или None на конце данных / поврежденной записи"""
+    if offset + HEADER_SIZE > limit:
+        return None
+    length, crc = LEAD.unpack_from(buf, offset)
+    seq, timestamp, name_len = REST.unpack_from(buf, offset + LEAD.size)
+    start = offset + HEADER_SIZE
+    end = start + name_len + length
+    if length == 0 or end > limit:
+        return None
+    if verify and zlib.crc32(buf[offset + LEAD.size:end]) != crc:
+        return None
+    stream = bytes(buf[start:start + name_len]).decode('utf-8')
+    return seq, timestamp, stream, buf[start + name_len:end], end
+
+
+class StreamIndex:
+    """Смещения записей одного потока: два массива по 8 байт на запись"""
+    __slots__ = ('seqs', 'offsets')
+
+    def __init__(self):
+        self.seqs = array('Q')
+        self.offsets = array('Q')
+
+
+class Segment:
+    """Файл сегмента. Активный сегмент выделяется заранее и отображается в память целиком,
+    поэтому чтение через mmap видит записанное без переотображения"""
+
+    def __init__(self, path: str, base_seq: int, capacity: int = None):
+        self.path = path
+        self.base_seq = base_seq
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if capacity is not None and os.fstat(self.fd).st_size < capacity:
+            os.ftruncate(self.fd, capacity)
+        self.map = None
+        self.remap()
+        self.used = 0
+        self.records = 0
+        self.live = 0
+        self.last_seq = base_seq - 1
+        self.last_timestamp = 0.0
+        self.sealed = False
+
+    def remap(self):
+        if self.map is not None:
+            self.map.close()
+        self.capacity = os.fstat(self.fd).st_size
+        self.map = mmap.mmap(self.fd, self.capacity, access=mmap.ACCESS_READ) if self.capacity else b''
+
+    def seal(self):
+        """Обрезка файла до записанных данных"""
+        self.sealed = True
+        if self.capacity > self.used:
+            os.ftruncate(self.fd, self.used)
+            self.remap()
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        os.close(self.fd)
+
+
+class SegmentedMessageLog(MessageStore):
+    """Журнал из сегментов <base_seq>.log. Запись идет в активный сегмент под блокировкой,
+    fsync выполняет фоновый поток - одна синхронизация на все записи, пришедшие за время предыдущей"""
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024,
+                 group_commit_interval: float = 0.0, retention_seconds: float = None,
+                 retention_bytes: int = None, compaction_interval: float = 60.0,
+                 compaction_threshold: float = 0.5):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.group_commit_interval = group_commit_interval
+        self.retention_seconds = retention_seconds
+        self.retention_bytes = retention_bytes
+        self.compaction_interval = compaction_interval
+        self.compaction_threshold = compaction_threshold
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.synced = threading.Condition(self.lock)
+        self.segments: List[Segment] = []
+        self.bases: List[int] = []            # base_seq сегментов для поиска по seq
+        self.index: Dict[str, StreamIndex] = {}
+        self.trimmed: Dict[str, int] = {}
+        self.next_seq = 1
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.unsynced: List[Segment] = []     # Сегменты с записями после последнего fsync
+        self.closing = False
+
+        self.recover()
+
+        self.dirty = threading.Event()
+        self.stop_event = threading.Event()
+        self.flusher = threading.Thread(target=self.flush_loop, name='message-log-flusher', daemon=True)
+        self.flusher.start()
+        self.maintainer = threading.Thread(target=self.maintenance_loop, name='message-log-maintenance', daemon=True)
+        self.maintainer.start()
+
+    # Восстановление
+
+    def recover(self):
+        """Чтение сегментов и построение индекса; оборванная запись в конце отбрасывается"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.log'))
+        for name in names:
+            segment = Segment(os.path.join(self.directory, name), int(name[:-4]))
+            self.segments.append(segment)
+            self.bases.append(segment.base_seq)
+            self.scan(segment)
+            if name != names[-1] and segment.used < segment.capacity:
+                logger.warning(f"Сегмент {name}: повреждены данные после смещения {segment.used}, хвост отброшен")
+            self.next_seq = max(self.next_seq, segment.last_seq + 1)
+
+        for segment in self.segments[:-1]:
+            segment.seal()
+        self.written_seq = self.synced_seq = self.next_seq - 1
+
+        if not self.segments or self.segments[-1].capacity - self.segments[-1].used < HEADER_SIZE:
+            self.roll(0)
+        if names:
+            logger.info(f"Журнал {self.directory}: {len(names)} сегментов, {len(self.index)} потоков, "
+                        f"следующий seq {self.next_seq}")
+
+    def scan(self, segment: Segment):
+        offset = 0
+        while True:
+            record = decode_record(segment.map, offset, segment.capacity)
+            if record is None:
+                break
+            seq, timestamp, stream, payload, end = record
+            self.add_record(segment, seq, timestamp, stream, payload, offset)
+            offset = end
+        segment.used = offset
+
+    def add_record(self, segment: Segment, seq: int, timestamp: float, stream: str, payload, offset: int):
+        segment.records += 1
+        segment.live += 1
+        segment.last_seq = seq
+        segment.last_timestamp = timestamp
+        if stream == TRIM_STREAM:
+            trim = json.loads(bytes(payload))
+            self.apply_trim(trim['stream'], trim['upto'])
+            return
+        index = self.index.get(stream)
+        if index is None:
+            index = self.index[stream] = StreamIndex()
+        index.seqs.append(seq)
+        index.offsets.append(offset)
+
+    # Запись
+
+    def segment_for(self, seq: int) -> Segment:
+        return self.segments[bisect_right(self.bases, seq) - 1]
+
+    def roll(self, needed: int):
+        """Закрытие активного сегмента и создание нового"""
+        if self.segments and not self.segments[-1].sealed:
+            self.segments[-1].seal()
+        path = os.path.join(self.directory, f"{self.next_seq:020d}.log")
+        segment = Segment(path, self.next_seq, max(self.segment_size, needed))
+        self.segments.append(segment)
+        self.bases.append(segment.base_seq)
+        # Новый файл должен пережить сбой вместе с записью в каталоге
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def write_buffer(self, segment: Segment, buffer: bytearray):
+        if buffer:
+            os.pwrite(segment.fd, buffer, segment.used)
+            segment.used += len(buffer)
+            if segment not in self.unsynced:
+                self.unsynced.append(segment)
+
+    def append_many(self, items, durable: bool = True) -> List[int]:
+        encoded = [(stream, json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                   for stream, record in items]
+        with self.lock:
+            if self.closing:
+                raise RuntimeError('Журнал закрыт')
+            now = time.time()
+            seqs = []
+            segment = self.segments[-1]
+            buffer = bytearray()
+            for stream, payload in encoded:
+                seq = self.next_seq
+                self.next_seq += 1
+                data = encode_record(seq, now, stream, payload)
+                if segment.used + len(buffer) + len(data) > segment.capacity:
+                    self.write_buffer(segment, buffer)
+                    buffer = bytearray()
+                    self.roll(len(data))
+                    segment = self.segments[-1]
+                self.add_record(segment, seq, now, stream, payload, segment.used + len(buffer))
+                buffer += data
+                seqs.append(seq)
+            self.write_buffer(segment, buffer)
+            self.written_seq = self.next_seq - 1
+            self.dirty.set()
+
+            if durable:
+                last_seq = seqs[-1]
+                while self.synced_seq < last_seq:
+                    self.synced.wait()
+        return seqs
+
+    def flush(self):
+        with self.lock:
+            target = self.written_seq
+            self.dirty.set()
+            while self.synced_seq < target:
+                self.synced.wait()
+
+    def flush_loop(self):
+        """Групповой fsync: одна синхронизация на все записи, накопленные за интервал"""
+        while True:
+            self.dirty.wait()
+            if self.group_commit_interval and not self.closing:
+                time.sleep(self.group_commit_interval)
+            with self.lock:
+                self.dirty.clear()
+                target = self.written_seq
+                segments, self.unsynced = self.unsynced, []
+            for segment in segments:
+                try:
+                    os.fsync(segment.fd)
+                except OSError as e:
+                    # Сегмент мог быть удален или заменен сжатием - его данные уже на диске
+                    logger.debug(f"fsync {segment.path}: {e}")
+            with self.lock:
+                self.synced_seq = max(self.synced_seq, target)
+                self.synced.notify_all()
+                if self.closing and self.synced_seq >= self.written_seq:
+                    return
+
+    # Чтение
+
+    def read_positions(self, stream: str, start_end) -> List[LogRecord]:
+        with self.lock:
+            index = self.index.get(stream)
+            if index is None:
+                return []
+            start, end = start_end(index)
+            raw = []
+            for i in range(start, end):
+                seq, offset = index.seqs[i], index.offsets[i]
+                segment = self.segment_for(seq)
+                _, timestamp, _, payload, _ = decode_record(segment.map, offset, segment.used, verify=False)
+                raw.append((seq, timestamp, bytes(payload)))
+        return [(seq, timestamp, json.loads(payload)) for seq, timestamp, payload in raw]
+
+    def read_before(self, stream: str, before_seq: Optional[int] = None, limit: int = 100) -> List[LogRecord]:
+        def bounds(index):
+            end = len(index.seqs) if before_seq is None else bisect_left(index.seqs, before_seq)
+            return max(0, end - limit), end
+        return self.read_positions(stream, bounds)
+
+    def read_after(self, stream: str, after_seq: int = 0, limit: int = 100) -> List[LogRecord]:
+        def bounds(index):
+            start = bisect_right(index.seqs, after_seq)
+            return start, min(len(index.seqs), start + limit)
+        return self.read_positions(stream, bounds)
+
+    # Удаление
+
+    def trim(self, stream: str, upto_seq: int):
+        self.append(TRIM_STREAM, {'stream': stream, 'upto': upto_seq})
+
+    def apply_trim(self, stream: str, upto_seq: int):
+        if upto_seq <= self.trimmed.get(stream, 0):
+            return
+        self.trimmed[stream] = upto_seq
+        index = self.index.get(stream)
+        if index is None:
+            return
+        count = bisect_right(index.seqs, upto_seq)
+        for seq in index.seqs[:count]:
+            self.segment_for(seq).live -= 1
+        del index.seqs[:count]
+        del index.offsets[:count]
+        if not index.seqs:
+            del self.index[stream]
+
+    def maintenance_loop(self):
+        while not self.stop_event.wait(self.compaction_interval):
+            try:
+                self.enforce_retention()
+                self.compact()
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания журнала {self.directory}: {e}")
+
+    def enforce_retention(self):
+        """Удаление старейших закрытых сегментов по возрасту и общему размеру"""
+        with self.lock:
+            sealed = [segment for segment in self.segments if segment.sealed]
+            total = sum(segment.used for segment in self.segments)
+            cutoff = time.time() - self.retention_seconds if self.retention_seconds else None
+            dropped = []
+            for segment in sealed:
+                too_old = cutoff is not None and segment.last_timestamp < cutoff
+                too_big = self.retention_bytes is not None and total > self.retention_bytes
+                if not (too_old or too_big):
+                    break
+                dropped.append(segment)
+                total -= segment.used
+            if not dropped:
+                return
+
+            del self.segments[:len(dropped)]
+            del self.bases[:len(dropped)]
+            first_seq = self.bases[0]
+            for stream in list(self.index):
+                index = self.index[stream]
+                count = bisect_left(index.seqs, first_seq)
+                if count:
+                    del index.seqs[:count]
+                    del index.offsets[:count]
+                    if not index.seqs:
+                        del self.index[stream]
+            self.unsynced = [segment for segment in self.unsynced if segment not in dropped]
+
+        for segment in dropped:
+            segment.close()
+            os.remove(segment.path)
+        logger.info(f"Журнал {self.directory}: удалено сегментов по сроку хранения: {len(dropped)}")
+
+    def compact(self):
+        with self.lock:
+            candidates = [segment for segment in self.segments
+                          if segment.sealed and segment.records
+                          and segment.live / segment.records < self.compaction_threshold]
+        for segment in candidates:
+            self.compact_segment(segment)
+
+    def compact_segment(self, segment: Segment):
+        """Перезапись сегмента без удаленных записей. Копирование идет без блокировки,
+        замена файла и смещений в индексе - под ней"""
+        with self.lock:
+            if segment not in self.segments:
+                return
+            data = segment.map[:segment.used]
+            trimmed = dict(self.trimmed)
+
+        out = bytearray()
+        moved = []
+        offset = 0
+        while True:
+            record = decode_record(data, offset, len(data), verify=False)
+            if record is None:
+                break
+            seq, timestamp, stream, payload, end = record
+            if stream == TRIM_STREAM or seq > trimmed.get(stream, 0):
+                moved.append((stream, seq, timestamp, len(out)))
+                out += data[offset:end]
+            offset = end
+
+        tmp_path = segment.path + '.compact'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, out)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        with self.lock:
+            if segment not in self.segments:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, segment.path)
+            compacted = Segment(segment.path, segment.base_seq)
+            compacted.used = len(out)
+            compacted.sealed = True
+            compacted.last_seq = segment.last_seq
+            compacted.last_timestamp = segment.last_timestamp
+            for stream, seq, timestamp, new_offset in moved:
+                compacted.records += 1
+                if stream == TRIM_STREAM:
+                    compacted.live += 1
+                    continue
+                index = self.index.get(stream)
+                if index is None:
+                    continue
+                i = bisect_left(index.seqs, seq)
+                if i < len(index.seqs) and index.seqs[i] == seq:
+                    index.offsets[i] = new_offset
+                    compacted.live += 1
+            position = self.segments.index(segment)
+            self.segments[position] = compacted
+            self.unsynced = [s for s in self.unsynced if s is not segment]
+            segment.close()
+        logger.info(f"Сжат сегмент {os.path.basename(segment.path)}: "
+                    f"{segment.used} -> {len(out)} байт, записей {segment.records} -> {len(moved)}")
+
+    def close(self):
+        with self.lock:
+            if self.closing:
+                return
+            self.closing = True
+            self.dirty.set()
+        self.flusher.join()
+        self.stop_event.set()
+        self.maintainer.join()
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+            self.bases = []
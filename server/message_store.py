@@ -0,0 +1,140 @@
+"""
+Хранилище потоков записей (история сообщений, офлайн-очередь): общий интерфейс,
+реализация на SQLite и выбор движка по STORAGE_CONFIG
+"""
+
+import abc
+import json
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import STORAGE_CONFIG
+from .connection_pool import ConnectionPool
+
+logger = logging.getLogger('dialog_storage')
+
+# Запись потока: (seq, timestamp, данные)
+LogRecord = Tuple[int, float, Dict]
+
+
+class MessageStore(abc.ABC):
+    """Упорядоченные потоки записей с ключом-строкой. seq растет монотонно в пределах хранилища.
+    История читает страницы назад (read_before), офлайн-очередь - вперед (read_after)
+    и подтверждает доставку через trim"""
+
+    def append(self, stream: str, record: Dict, durable: bool = True) -> int:
+        """Добавление записи; durable - дождаться записи на диск. Возвращает seq"""
+        return self.append_many([(stream, record)], durable)[0]
+
+    @abc.abstractmethod
+    def append_many(self, items, durable: bool = True) -> List[int]:
+        """Добавление пачки [(stream, record)]"""
+
+    @abc.abstractmethod
+    def read_before(self, stream: str, before_seq: Optional[int] = None, limit: int = 100) -> List[LogRecord]:
+        """До limit записей старше before_seq (None - самые новые), по возрастанию seq"""
+
+    @abc.abstractmethod
+    def read_after(self, stream: str, after_seq: int = 0, limit: int = 100) -> List[LogRecord]:
+        """До limit записей новее after_seq, по возрастанию seq"""
+
+    @abc.abstractmethod
+    def trim(self, stream: str, upto_seq: int):
+        """Удаление записей потока с seq <= upto_seq (например, доставленных из офлайн-очереди)"""
+
+    def flush(self):
+        """Запись на диск всего добавленного"""
+
+    def close(self):
+        """Закрытие хранилища"""
+
+
+class SQLiteMessageStore(MessageStore):
+    """Потоки в таблице SQLite: строка на запись, коммит на каждую пачку"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.pool = ConnectionPool(self.open_connection)
+        with self.connection() as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS message_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stream TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_message_log_stream ON message_log (stream, seq)")
+
+    def open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Соединение из общего пула на время операции"""
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    def append_many(self, items, durable: bool = True) -> List[int]:
+        now = time.time()
+        seqs = []
+        with self.connection() as conn, conn:
+            for stream, record in items:
+                cursor = conn.execute(
+                    "INSERT INTO message_log (stream, timestamp, payload) VALUES (?, ?, ?)",
+                    (stream, now, json.dumps(record, ensure_ascii=False))
+                )
+                seqs.append(cursor.lastrowid)
+        return seqs
+
+    def read_before(self, stream: str, before_seq: Optional[int] = None, limit: int = 100) -> List[LogRecord]:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT seq, timestamp, payload FROM message_log WHERE stream = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (stream, before_seq if before_seq is not None else 2 ** 63 - 1, limit)
+            ).fetchall()
+        return [(seq, timestamp, json.loads(payload)) for seq, timestamp, payload in reversed(rows)]
+
+    def read_after(self, stream: str, after_seq: int = 0, limit: int = 100) -> List[LogRecord]:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT seq, timestamp, payload FROM message_log WHERE stream = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (stream, after_seq, limit)
+            ).fetchall()
+        return [(seq, timestamp, json.loads(payload)) for seq, timestamp, payload in rows]
+
+    def trim(self, stream: str, upto_seq: int):
+        with self.connection() as conn, conn:
+            conn.execute("DELETE FROM message_log WHERE stream = ? AND seq <= ?", (stream, upto_seq))
+
+    def close(self):
+        self.pool.close()
+
+
+def open_message_store(config: Dict = None) -> Optional[MessageStore]:
+    """Хранилище по настройке engine: 'log' - сегментированный журнал,
+    'sqlite' - таблица message_log; None - история остается в таблице messages UserManager"""
+    config = config or STORAGE_CONFIG
+    engine = config.get('engine')
+    if engine == 'log':
+        from .message_log import SegmentedMessageLog
+        return SegmentedMessageLog(
+            config['log_dir'],
+            segment_size=config['segment_size'],
+            group_commit_interval=config['group_commit_interval'],
+            retention_seconds=config['retention_days'] * 86400 if config.get('retention_days') else None,
+            retention_bytes=config.get('retention_bytes'),
+            compaction_interval=config['compaction_interval'],
+            compaction_threshold=config['compaction_threshold']
+        )
+    if engine == 'sqlite':
+        return SQLiteMessageStore(config['db_path'])
+    return None
@@ -0,0 +1,148 @@
+"""
+Метрики сервера в текстовом формате OpenMetrics по HTTP (только локальный слушатель)
+"""
+
+import math
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+from config import METRICS_CONFIG
+from metrics import Counter, Histogram
+
+logger = logging.getLogger('dialog_network')
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+Labels = Sequence[Tuple[str, str]]
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{name}="{escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+class MetricsWriter:
+    """Сборка ответа: семейства метрик в порядке добавления и # EOF в конце"""
+
+    def __init__(self, prefix: str = 'dialog_'):
+        self.prefix = prefix
+        self.lines = []
+
+    def family(self, name: str, kind: str, help_text: str, unit: str = None) -> str:
+        """Заголовок семейства; имя с единицей измерения оканчивается на нее (_seconds, _bytes)"""
+        name = self.prefix + name
+        if unit and not name.endswith('_' + unit):
+            name += '_' + unit
+        self.lines.append(f'# TYPE {name} {kind}')
+        if unit:
+            self.lines.append(f'# UNIT {name} {unit}')
+        self.lines.append(f'# HELP {name} {escape(help_text)}')
+        return name
+
+    def counter(self, name: str, help_text: str, samples: Iterable[Tuple[Labels, float]], unit: str = None):
+        """samples - пары (метки, значение); значение - число или Counter"""
+        name = self.family(name, 'counter', help_text, unit)
+        for labels, value in samples:
+            if isinstance(value, Counter):
+                value = value.value
+            self.lines.append(f'{name}_total{format_labels(labels)} {format_value(value)}')
+
+    def gauge(self, name: str, help_text: str, samples: Iterable[Tuple[Labels, float]], unit: str = None):
+        name = self.family(name, 'gauge', help_text, unit)
+        for labels, value in samples:
+            self.lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+    def histogram(self, name: str, help_text: str, samples: Iterable[Tuple[Labels, Histogram]],
+                  unit: str = 'seconds'):
+        name = self.family(name, 'histogram', help_text, unit)
+        for labels, histogram in samples:
+            counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + format_value(float(bound)) + '"'
+                self.lines.append(f'{name}_bucket{format_labels(labels, le)} {cumulative}')
+            self.lines.append(f'{name}_count{format_labels(labels)} {count}')
+            self.lines.append(f'{name}_sum{format_labels(labels)} {format_value(float(total))}')
+
+    def text(self) -> bytes:
+        return ('\n'.join(self.lines) + '\n# EOF\n').encode('utf-8')
+
+
+class ServerCounters:
+    """Счетчики событий сервера, связанные заранее: на горячем пути - только inc()"""
+
+    __slots__ = ('connections_accepted', 'connections_rejected', 'logins_success', 'logins_failed',
+                 'relay_messages', 'relay_bytes')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, Counter())
+
+
+class MetricsServer:
+    """HTTP-слушатель /metrics. collect(writer) вызывается на каждый запрос сбора и
+    заполняет MetricsWriter из текущего состояния - на горячем пути остаются только
+    заранее связанные счетчики и гистограммы"""
+
+    def __init__(self, collect: Callable[[MetricsWriter], None], host: str = None, port: int = None):
+        self.collect = collect
+        self.host = host or METRICS_CONFIG['host']
+        self.port = METRICS_CONFIG['port'] if port is None else port
+        self.httpd: Optional[ThreadingHTTPServer] = None
+
+    def render(self) -> bytes:
+        writer = MetricsWriter()
+        self.collect(writer)
+        return writer.text()
+
+    def start(self):
+        metrics_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                try:
+                    body = metrics_server.render()
+                except Exception as e:
+                    logger.error(f"Ошибка сбора метрик: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Сборщик опрашивает часто, в лог сервера не пишем
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info(f"Метрики OpenMetrics: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1,130 @@
+"""
+Хеширование паролей bcrypt в отдельном пуле процессов
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from config import AUTH_CONFIG
+from hashing_worker import hash_password, check_password, noop
+
+logger = logging.getLogger('dialog_auth')
+
+
+class HasherBusyError(Exception):
+    """Очередь хеширования переполнена или превышен лимит одновременных задач"""
+
+
+class PasswordHasher:
+    """Пул процессов для bcrypt с ограниченной очередью и лимитами на IP/пользователя"""
+
+    def __init__(self, workers: int = None, rounds: int = None, queue_size: int = None,
+                 per_ip_limit: int = None, per_user_limit: int = None, timeout: float = None):
+        self.workers = workers or AUTH_CONFIG['hash_workers']
+        self.rounds = rounds or AUTH_CONFIG['bcrypt_rounds']
+        self.queue_size = queue_size or AUTH_CONFIG['hash_queue_size']
+        self.per_ip_limit = per_ip_limit or AUTH_CONFIG['hash_per_ip_limit']
+        self.per_user_limit = per_user_limit or AUTH_CONFIG['hash_per_user_limit']
+        self.timeout = timeout or AUTH_CONFIG['hash_timeout']
+
+        # spawn вместо fork: сервер многопоточный, fork копирует захваченные блокировки.
+        # Задачи - из hashing_worker: процесс пула не импортирует пакет server
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._lock = threading.Lock()
+        self._per_ip: Dict[str, int] = {}
+        self._per_user: Dict[str, int] = {}
+        self.in_flight = 0
+        self.rejected = 0
+
+        logger.info(f"Пул хеширования паролей: процессов={self.workers}, "
+                    f"очередь={self.queue_size}, bcrypt rounds={self.rounds}")
+
+    def warm_up(self):
+        """Запуск всех процессов пула заранее, чтобы первый вход не ждал их старта"""
+        futures = [self._executor.submit(noop) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def _acquire(self, client_ip: Optional[str], username: Optional[str]):
+        """Резервирование места в очереди с учетом лимитов"""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusyError('Очередь хеширования переполнена')
+
+        with self._lock:
+            if client_ip and self._per_ip.get(client_ip, 0) >= self.per_ip_limit:
+                self._slots.release()
+                self.rejected += 1
+                raise HasherBusyError(f'Слишком много одновременных запросов с {client_ip}')
+            if username and self._per_user.get(username, 0) >= self.per_user_limit:
+                self._slots.release()
+                self.rejected += 1
+                raise HasherBusyError(f'Слишком много одновременных запросов для {username}')
+
+            if client_ip:
+                self._per_ip[client_ip] = self._per_ip.get(client_ip, 0) + 1
+            if username:
+                self._per_user[username] = self._per_user.get(username, 0) + 1
+            self.in_flight += 1
+
+    def _release(self, client_ip: Optional[str], username: Optional[str]):
+        """Освобождение места в очереди после завершения задачи"""
+        with self._lock:
+            if client_ip:
+                count = self._per_ip.get(client_ip, 0) - 1
+                if count > 0:
+                    self._per_ip[client_ip] = count
+                else:
+                    self._per_ip.pop(client_ip, None)
+            if username:
+                count = self._per_user.get(username, 0) - 1
+                if count > 0:
+                    self._per_user[username] = count
+                else:
+                    self._per_user.pop(username, None)
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _run(self, func, *args, client_ip: str = None, username: str = None):
+        """Выполнение задачи в пуле и ожидание результата в текущем потоке"""
+        self._acquire(client_ip, username)
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._release(client_ip, username)
+            raise
+        # Место освобождается только когда процесс действительно закончил работу,
+        # даже если ожидающий поток уже ушел по таймауту
+        future.add_done_callback(lambda _: self._release(client_ip, username))
+        return future.result(timeout=self.timeout)
+
+    def hash_password(self, password: str, client_ip: str = None, username: str = None) -> str:
+        """Хеширование пароля с текущей стоимостью bcrypt"""
+        password_hash = self._run(hash_password, password.encode('utf-8'), self.rounds,
+                                  client_ip=client_ip, username=username)
+        return password_hash.decode('utf-8')
+
+    def verify_password(self, password: str, password_hash: str,
+                        client_ip: str = None, username: str = None) -> bool:
+        """Проверка пароля"""
+        return self._run(check_password, password.encode('utf-8'), password_hash.encode('utf-8'),
+                         client_ip=client_ip, username=username)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Проверка, создан ли хеш с другой стоимостью bcrypt"""
+        try:
+            # Формат: $2b$<rounds>$<salt+hash>
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        """Остановка пула процессов"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,66 @@
+"""
+Снимок онлайн-пользователей для ответов user_list_update: сериализуется один раз
+на изменение присутствия, а не на каждый запрос
+"""
+
+import json
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+class PresenceSnapshot:
+    """Версионированный снимок: JSON-массив пользователей в байтах и смещения записи
+    каждого пользователя в нем. Ответ без запрашивающего - два среза готовых байтов.
+    Снимок и его версия меняются только при изменении присутствия: вход, выход и смена
+    P2P-адреса сбрасывают снимок (invalidate). Heartbeat его не трогает, поэтому last_seen
+    в снимке - время последнего изменения, а клиент с актуальной версией получает unchanged"""
+
+    def __init__(self, source: Callable[[], Iterable[Dict]]):
+        self.source = source
+        self.version = 0
+        self.dirty = True
+        self.body = b'[]'
+        self.count = 0
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.dirty = True
+
+    def current(self):
+        """Актуальный снимок (version, body, offsets, count); пересборка при необходимости"""
+        with self.lock:
+            if self.dirty:
+                self.rebuild()
+            return self.version, self.body, self.offsets, self.count
+
+    def rebuild(self):
+        # Сбрасываем флаг до чтения источника: изменение во время сборки пометит снимок снова
+        self.dirty = False
+        parts = []
+        offsets = {}
+        position = 1
+        for user in self.source():
+            encoded = json.dumps(user).encode()
+            if parts:
+                position += 1  # запятая
+            offsets[user['username']] = (position, position + len(encoded))
+            parts.append(encoded)
+            position += len(encoded)
+        self.body = b'[' + b','.join(parts) + b']'
+        self.offsets = offsets
+        self.count = len(parts)
+        self.version += 1
+
+    def users_excluding(self, username: Optional[str]):
+        """(version, JSON-массив без username в байтах, число пользователей в нем)"""
+        version, body, offsets, count = self.current()
+        span = offsets.get(username)
+        if span is None:
+            return version, body, count
+        start, end = span
+        if start > 1:
+            start -= 1  # запятая перед записью
+        elif end + 1 < len(body):
+            end += 1    # первая запись - запятая после нее
+        return version, body[:start] + body[end:], count - 1
@@ -0,0 +1,187 @@
+"""
+Ограничение частоты запросов (корзины токенов по типу запроса на пользователя, до входа -
+на IP клиента) и сброс малоприоритетных запросов при перегрузке сервера
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from config import REQUEST_CONFIG
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+LOW = 'low'
+
+# Какие приоритеты сбрасываются на каждом уровне перегрузки
+SHED_PRIORITIES = {0: (), 1: (LOW,), 2: (LOW, NORMAL)}
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst про запас"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+    def wait_time(self) -> float:
+        """Через сколько секунд появится токен"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def idle_since(self, now: float) -> bool:
+        """Корзина снова полная - ее можно удалить, новая будет такой же"""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class RateLimiter:
+    """Лимиты (запросов в секунду, запас) по типам запроса. Корзины общие для сервера и
+    хранятся по паре (клиент, тип): переподключение не обнуляет лимиты. Корзина,
+    которая успела снова наполниться, ничем не отличается от новой и удаляется при
+    периодической очистке"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = None,
+                 default: Tuple[float, float] = None, sweep_interval: float = None):
+        self.limits = dict(REQUEST_CONFIG['rate_limits'] if limits is None else limits)
+        self.default = default or REQUEST_CONFIG['default_rate_limit']
+        self.sweep_interval = sweep_interval or REQUEST_CONFIG['rate_limit_sweep_interval']
+        self.buckets: Dict[Tuple[Hashable, str], TokenBucket] = {}
+        self.lock = threading.Lock()
+        self.next_sweep = time.monotonic() + self.sweep_interval
+
+    def allow(self, client: Hashable, request_type: str, now: float) -> Optional[float]:
+        """None - запрос разрешен, иначе через сколько секунд повторить"""
+        key = (client, request_type)
+        with self.lock:
+            if now >= self.next_sweep:
+                self.sweep(now)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate, burst = self.limits.get(request_type, self.default)
+                bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+            if bucket.take(now):
+                return None
+            return bucket.wait_time()
+
+    def sweep(self, now: float):
+        # Вызывается под self.lock
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if not bucket.idle_since(now)}
+        self.next_sweep = now + self.sweep_interval
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+
+class OverloadDetector:
+    """Уровень перегрузки по числу одновременно обрабатываемых запросов и сглаженной
+    задержке обработчиков: 0 - норма, 1 - превышен порог, 2 - превышен вдвое.
+    Сглаженная задержка затухает со временем (half_life), иначе после всплеска, пока
+    сбрасываются все некритичные запросы, ей нечем было бы обновиться.
+    pressure - дополнительная доля загрузки (например, заполнение буферов отправки)"""
+
+    def __init__(self, max_inflight: int = None, max_latency: float = None,
+                 pressure: Callable[[], float] = None, alpha: float = 0.1, half_life: float = None):
+        self.max_inflight = max_inflight or REQUEST_CONFIG['overload_inflight']
+        self.max_latency = max_latency or REQUEST_CONFIG['overload_latency']
+        self.half_life = half_life or REQUEST_CONFIG['overload_half_life']
+        self.pressure = pressure
+        self.alpha = alpha
+        self.inflight = 0
+        self.latency = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.inflight += 1
+
+    def leave(self, seconds: Optional[float]):
+        """Завершение запроса; seconds=None - задержка не учитывается (вход с bcrypt и т.п.)"""
+        with self.lock:
+            self.inflight -= 1
+            if seconds is not None:
+                now = time.monotonic()
+                latency = self.decayed(now)
+                self.latency = latency + self.alpha * (seconds - latency)
+                self.updated = now
+
+    def decayed(self, now: float) -> float:
+        return self.latency * 0.5 ** ((now - self.updated) / self.half_life)
+
+    def load(self) -> float:
+        """Загрузка относительно порогов: 1.0 - на пороге"""
+        load = max(self.inflight / self.max_inflight, self.decayed(time.monotonic()) / self.max_latency)
+        if self.pressure is not None:
+            load = max(load, self.pressure())
+        return load
+
+    def level(self) -> int:
+        load = self.load()
+        if load >= 2:
+            return 2
+        return 1 if load >= 1 else 0
+
+    def stats(self) -> Dict:
+        return {'level': self.level(), 'load': round(self.load(), 3), 'inflight': self.inflight,
+                'latency': round(self.decayed(time.monotonic()), 4)}
+
+
+def priority_map(priorities: Dict[str, Tuple[str, ...]] = None) -> Dict[str, str]:
+    """Тип запроса -> приоритет; не перечисленные типы - NORMAL"""
+    priorities = REQUEST_CONFIG['priorities'] if priorities is None else priorities
+    return {request_type: priority for priority, types in priorities.items() for request_type in types}
+
+
+def retry_after(seconds: float) -> float:
+    return round(max(seconds, 0.1), 1)
+
+
+class RateLimitMiddleware:
+    """Промежуточный слой диспетчера: сначала сброс по уровню перегрузки и приоритету типа,
+    затем корзина токенов пользователя (до входа - IP клиента). Отказы считаются в counters как ('throttled', тип)
+    и ('shed', тип); ответ содержит retry_after - через сколько секунд повторить"""
+
+    def __init__(self, counters, limiter: RateLimiter = None, detector: OverloadDetector = None,
+                 priorities: Dict[str, str] = None):
+        self.counters = counters
+        self.limiter = limiter or RateLimiter()
+        self.detector = detector or OverloadDetector()
+        self.priorities = priority_map() if priorities is None else priorities
+        self.shed_retry = REQUEST_CONFIG['shed_retry_after']
+
+    def __call__(self, ctx, handler, call_next):
+        request_type = handler.type
+        priority = self.priorities.get(request_type, NORMAL)
+        if priority in SHED_PRIORITIES[self.detector.level()]:
+            self.counters.inc(('shed', request_type))
+            response = handler.error_response('Сервер перегружен, повторите попытку позже')
+            response['retry_after'] = self.shed_retry
+            return response
+
+        now = time.monotonic()
+        client = ('user', ctx.username) if ctx.username else ('ip', ctx.client_ip)
+        wait = self.limiter.allow(client, request_type, now)
+        if wait is not None:
+            self.counters.inc(('throttled', request_type))
+            response = handler.error_response('Слишком много запросов, повторите позже')
+            response['retry_after'] = retry_after(wait)
+            return response
+
+        self.detector.enter()
+        try:
+            return call_next(ctx, handler)
+        finally:
+            # Задержка критичных запросов (вход с bcrypt) не говорит о перегрузке остальных
+            self.detector.leave(time.monotonic() - now if priority != CRITICAL else None)
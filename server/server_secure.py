@@ -7,8 +7,9 @@ import logging
 import sqlite3
 import hashlib
 import secrets
-import bcrypt
 import os
+import re
+import sys
 import time
 import uuid
 from cryptography.hazmat.primitives import serialization
@@ -16,6 +17,26 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.fernet import Fernet
 
+from config import (AUTH_CONFIG, HISTORY_CONFIG, SEARCH_CONFIG, CALL_CONFIG, BROADCAST_CONFIG,
+                    CONNECTION_CONFIG, REQUEST_CONFIG, METRICS_CONFIG)
+from .password_hasher import PasswordHasher, HasherBusyError
+from .user_manager import UserManager
+from .message_store import open_message_store
+from .call_journal import CallHistoryJournal
+from .call_registry import CallRegistry
+from .liveness import TimingWheel
+from .client_session import ClientSession
+from .presence_snapshot import PresenceSnapshot
+from .client_writer import ClientWriter, WriterLoop
+from .broadcast import Broadcaster
+from .frame_reader import FrameReader, FrameError, MemoryBudget, ConnectionRegistry
+from .dispatch import (Dispatcher, RequestContext, TimingMiddleware, ErrorMiddleware,
+                       AuthMiddleware, schema_middleware)
+from .rate_limit import RateLimitMiddleware, OverloadDetector
+from .openmetrics import MetricsServer, ServerCounters
+from . import memory_profile
+from metrics import Counters, Histogram, LatencyStats, TimedCursor
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.DEBUG,
@@ -30,19 +51,48 @@ class SecureDialogServer:
     def __init__(self, host='localhost', port=5555):
         self.host = host
         self.port = port
-        self.clients = {}
+        self.clients = {}  # username -> ClientSession
         self.user_sessions = {}
         self.nat_mapping = {}
-        self.active_calls = {}  # Словарь для отслеживания активных звонков
+        self.active_calls = CallRegistry()  # Активные звонки с индексом по пользователям
+        self.liveness = TimingWheel()  # Дедлайны активности онлайн-клиентов
+        self.presence_snapshot = PresenceSnapshot(self.get_online_users)  # Готовый ответ на get_user_list
+        self.writer_loop = WriterLoop()  # Дозапись исходящих кадров, не поместившихся в сокет
+        self.memory_budget = MemoryBudget()  # Общий лимит буферов чтения и отправки соединений
+        self.connections = ConnectionRegistry()
+        self.broadcaster = Broadcaster()
+        # Граф контактов онлайн-пользователей, загружается при входе:
+        # contacts - username -> {контакт: псевдоним}, watchers - username -> кто держит его в контактах
+        self.contacts = {}
+        self.watchers = {}
+        self.contacts_lock = threading.Lock()
         self.server_socket = None
+        self.password_hasher = PasswordHasher()
+        self.db_latency = Histogram()  # Запросы сервера к базе (сессии, токены, вход)
+        self.event_counters = ServerCounters()
+        self.metrics_server = None
         self.setup_database()
+        # Изменения call_history пишутся в базу фоновым потоком, сигнализация не ждет диска
+        self.call_journal = CallHistoryJournal('users.db')
+        self.user_manager = UserManager('users.db')
+        # Отдельный движок истории (STORAGE_CONFIG['engine']); None - таблица messages
+        self.message_store = open_message_store()
+        # Задержка и число запросов по типам
+        self.request_latency = LatencyStats()
+        self.request_counters = Counters()
+        # Перегрузка: одновременные запросы, их задержка и заполнение буферов соединений
+        self.overload = OverloadDetector(pressure=self.buffer_pressure)
+        self.register_handlers()
         self.setup_server()
 
     def setup_database(self):
         """Инициализация базы данных для пользователей"""
         try:
             self.conn = sqlite3.connect('users.db', check_same_thread=False)
-            self.cursor = self.conn.cursor()
+            self.cursor = self.conn.cursor(TimedCursor)
+            self.cursor.histogram = self.db_latency
+            # Общий курсор: последовательность запросов к токенам входа выполняется под блокировкой
+            self.db_lock = threading.RLock()
             
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -65,6 +115,23 @@ class SecureDialogServer:
                 )
             ''')
             
+            # Токены для повторного входа без пароля ("запомнить меня").
+            # Хранится только SHA-256 токена; UNIQUE дает индекс для поиска
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS refresh_tokens (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    token_hash TEXT UNIQUE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    expires_at REAL NOT NULL,
+                    revoked INTEGER DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user ON refresh_tokens (user_id)"
+            )
+            
             # Таблица для хранения истории звонков
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS call_history (
@@ -100,13 +167,29 @@ class SecureDialogServer:
             logging.error(f"[-] Ошибка настройки сервера: {e}")
             raise
 
-    def hash_password(self, password):
-        """Хеширование пароля с использованием bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    def hash_password(self, password, client_ip=None, username=None):
+        """Хеширование пароля с использованием bcrypt (в пуле процессов)"""
+        return self.password_hasher.hash_password(password, client_ip, username)
 
-    def verify_password(self, password, password_hash):
-        """Проверка пароля"""
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    def verify_password(self, password, password_hash, client_ip=None, username=None):
+        """Проверка пароля (в пуле процессов)"""
+        return self.password_hasher.verify_password(password, password_hash, client_ip, username)
+
+    def rehash_password_if_needed(self, user_id, password, password_hash, client_ip=None):
+        """Пересчет хеша при изменении стоимости bcrypt"""
+        if not self.password_hasher.needs_rehash(password_hash):
+            return
+        try:
+            new_hash = self.hash_password(password, client_ip)
+            self.cursor.execute(
+                "UPDATE users SET password_hash = ? WHERE id = ?",
+                (new_hash, user_id)
+            )
+            self.conn.commit()
+            logging.info(f"Хеш пароля пользователя {user_id} обновлен до bcrypt rounds={self.password_hasher.rounds}")
+        except HasherBusyError as e:
+            # Не критично: хеш будет обновлен при следующем входе
+            logging.warning(f"Отложено обновление хеша пароля пользователя {user_id}: {e}")
 
     def create_session(self, user_id):
         """Создание сессии для пользователя"""
@@ -145,6 +228,83 @@ class SecureDialogServer:
         except:
             return None
 
+    def hash_refresh_token(self, refresh_token):
+        """Хеш токена для хранения в базе (токен случайный, соль и bcrypt не нужны)"""
+        return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+    def issue_refresh_token(self, user_id):
+        """Выдача нового токена повторного входа"""
+        refresh_token = secrets.token_urlsafe(32)
+        expires_at = datetime.now().timestamp() + AUTH_CONFIG['refresh_token_ttl_days'] * 24 * 60 * 60
+        
+        with self.db_lock:
+            self.cursor.execute(
+                "INSERT INTO refresh_tokens (user_id, token_hash, expires_at) VALUES (?, ?, ?)",
+                (user_id, self.hash_refresh_token(refresh_token), expires_at)
+            )
+            self.conn.commit()
+        
+        return refresh_token
+
+    def rotate_refresh_token(self, refresh_token):
+        """Проверка токена и замена его новым. Возвращает (user_id, username, новый токен) или None.
+        Замена выполняется один раз: из двух одновременных входов с одним токеном второй
+        считается повторным использованием"""
+        with self.db_lock:
+            self.cursor.execute(
+                """SELECT t.id, t.user_id, t.expires_at, t.revoked, u.username
+                   FROM refresh_tokens t JOIN users u ON u.id = t.user_id
+                   WHERE t.token_hash = ?""",
+                (self.hash_refresh_token(refresh_token),)
+            )
+            result = self.cursor.fetchone()
+            if not result:
+                return None
+            
+            token_id, user_id, expires_at, revoked, username = result
+            if not revoked and datetime.now().timestamp() > expires_at:
+                self.cursor.execute("DELETE FROM refresh_tokens WHERE id = ?", (token_id,))
+                self.conn.commit()
+                return None
+            
+            if not revoked:
+                self.cursor.execute("UPDATE refresh_tokens SET revoked = 1 WHERE id = ? AND revoked = 0", (token_id,))
+                revoked = self.cursor.rowcount != 1
+            if revoked:
+                # Повторное использование уже замененного токена - признак утечки,
+                # отзываем все токены пользователя
+                self.conn.rollback()
+                logging.warning(f"Повторное использование токена входа пользователя {username}, все токены отозваны")
+                self.revoke_refresh_tokens(user_id)
+                return None
+            
+            self.prune_refresh_tokens(user_id)
+            new_token = self.issue_refresh_token(user_id)
+            return user_id, username, new_token
+
+    def prune_refresh_tokens(self, user_id):
+        """Удаление истекших токенов пользователя и замененных сверх последних revoked_tokens_kept:
+        иначе каждый вход по токену оставляет строку навсегда"""
+        self.cursor.execute(
+            """DELETE FROM refresh_tokens WHERE user_id = ? AND (expires_at < ? OR (revoked = 1 AND id NOT IN (
+                   SELECT id FROM refresh_tokens WHERE user_id = ? AND revoked = 1 ORDER BY id DESC LIMIT ?)))""",
+            (user_id, datetime.now().timestamp(), user_id, AUTH_CONFIG['revoked_tokens_kept'])
+        )
+
+    def revoke_refresh_tokens(self, user_id, refresh_token=None):
+        """Отзыв одного токена или всех токенов пользователя"""
+        with self.db_lock:
+            if refresh_token:
+                self.cursor.execute(
+                    "DELETE FROM refresh_tokens WHERE user_id = ? AND token_hash = ?",
+                    (user_id, self.hash_refresh_token(refresh_token))
+                )
+            else:
+                self.cursor.execute("DELETE FROM refresh_tokens WHERE user_id = ?", (user_id,))
+            count = self.cursor.rowcount
+            self.conn.commit()
+        return count
+
     def get_user_id(self, username):
         """Получение ID пользователя"""
         try:
@@ -157,20 +317,7 @@ class SecureDialogServer:
 
     def get_online_users(self):
         """Получение списка онлайн-пользователей"""
-        online_users = []
-        for username, client_data in self.clients.items():
-            p2p_port = client_data.get('p2p_port', 0)
-            external_ip = client_data.get('external_ip', '')
-            
-            online_users.append({
-                'username': username,
-                'p2p_port': p2p_port,
-                'external_ip': external_ip,
-                'last_seen': client_data.get('last_seen', datetime.now().isoformat())
-            })
-        
-        logging.debug(f"Сейчас онлайн: {len(online_users)} пользователей: {[user['username'] for user in online_users]}")
-        return online_users
+        return [session.presence() for session in list(self.clients.values())]
 
     def encrypt_with_rsa(self, public_key, data):
         """Шифрование данных с помощью RSA публичного ключа"""
@@ -190,727 +337,989 @@ class SecureDialogServer:
 
     def send_message_to_client(self, username, message_data):
         """Отправка сообщения конкретному клиенту"""
+        client_data = None
         try:
-            if username not in self.clients:
+            client_data = self.clients.get(username)
+            if client_data is None:
                 logging.error(f"Пользователь {username} не в сети")
                 return False
             
-            client_data = self.clients[username]
-            cipher_suite = client_data['cipher']
-            client_socket = client_data['socket']
+            cipher_suite = client_data.cipher
             
             encrypted_message = cipher_suite.encrypt(json.dumps(message_data).encode())
             
             # Отправляем сообщение с маркером конца
             data_to_send = encrypted_message + b"<END>"
-            client_socket.send(data_to_send)
+            if not client_data.writer.write(data_to_send):
+                raise ConnectionError('соединение закрыто')
+            self.event_counters.relay_messages.inc()
+            self.event_counters.relay_bytes.inc(len(data_to_send))
             
             logging.info(f"Сообщение отправлено пользователю {username}: {message_data.get('type', 'unknown')}")
             return True
             
         except Exception as e:
             logging.error(f"Ошибка отправки сообщения пользователю {username}: {e}")
-            # Если отправка не удалась, удаляем клиента из списка
-            if username in self.clients:
-                try:
-                    self.clients[username]['socket'].close()
-                except:
-                    pass
-                del self.clients[username]
+            # Если отправка не удалась, отключаем именно это соединение: пользователь
+            # мог уже войти заново с другого
+            if client_data is not None:
+                # Сокет закроет поток клиента при обычном отключении
+                client_data.writer.close(shutdown=True)
+                self.unregister_online_client(username, client_data.socket)
                 logging.info(f"Пользователь {username} удален из списка онлайн-клиентов")
             return False
 
+    def register_handlers(self):
+        """Таблица обработчиков запросов клиента. Авторизация, ограничение частоты и сброс
+        при перегрузке, обязательные поля, ошибки и метрики - в промежуточных слоях диспетчера"""
+        self.dispatcher = Dispatcher([
+            TimingMiddleware(self.request_latency, self.request_counters),
+            ErrorMiddleware({HasherBusyError: 'Сервер перегружен, повторите попытку позже'}),
+            RateLimitMiddleware(self.request_counters, detector=self.overload),
+            AuthMiddleware(self.validate_session),
+            schema_middleware,
+        ])
+        register = self.dispatcher.register
+        credentials = {'username': str, 'password': str}
+
+        register('register', lambda ctx: self.handle_register(ctx.request, ctx.client_ip),
+                 auth=False, required=('username', 'password'), schema=credentials,
+                 error='Ошибка регистрации', response_type='auth_response')
+        register('login', self.dispatch_login,
+                 auth=False, required=('username', 'password'), schema=credentials,
+                 error='Ошибка входа', response_type='auth_response')
+        register('token_login', self.dispatch_token_login,
+                 auth=False, error='Ошибка входа', response_type='auth_response')
+        register('revoke_token', lambda ctx: self.handle_revoke_token(ctx.request, ctx.user_id),
+                 error='Ошибка отзыва токена')
+        register('get_user_list', lambda ctx: self.handle_get_user_list(ctx.request, ctx.username),
+                 error='Ошибка получения списка пользователей')
+        register('get_contacts', lambda ctx: self.handle_get_contacts(ctx.username),
+                 error='Ошибка получения контактов')
+        register('add_contact', lambda ctx: self.handle_add_contact(ctx.request, ctx.username),
+                 error='Ошибка добавления контакта')
+        register('remove_contact', lambda ctx: self.handle_remove_contact(ctx.request, ctx.username),
+                 error='Ошибка удаления контакта')
+        register('client_info',
+                 lambda ctx: self.handle_client_info(ctx.request, ctx.username, ctx.user_id, ctx.client_ip),
+                 error='Ошибка обработки информации')
+        register('heartbeat', lambda ctx: self.handle_heartbeat(ctx.username),
+                 error='Ошибка heartbeat')
+        register('p2p_message', lambda ctx: self.handle_p2p_message(ctx.request, ctx.username),
+                 auth='session', error='Ошибка обработки сообщения')
+        register('get_history',
+                 lambda ctx: self.handle_get_history(ctx.request, ctx.username, ctx.writer, ctx.cipher),
+                 error='Ошибка получения истории')
+        register('search_users', lambda ctx: self.handle_search_users(ctx.request, ctx.username),
+                 error='Ошибка поиска пользователей')
+        register('call_request', lambda ctx: self.handle_call_request(ctx.request, ctx.username),
+                 auth='session', error='Ошибка обработки запроса на звонок')
+        register('call_answer', lambda ctx: self.handle_call_answer(ctx.request, ctx.username),
+                 auth='session', error='Ошибка обработки ответа на звонок')
+        register('call_end', lambda ctx: self.handle_call_end(ctx.request, ctx.username),
+                 auth='session', error='Ошибка обработки завершения звонка')
+        register('ice_candidate', lambda ctx: self.handle_ice_candidate(ctx.request, ctx.username),
+                 auth='session', error='Ошибка обработки ICE-кандидата')
+        register('server_status', lambda ctx: self.handle_server_status(ctx.request),
+                 auth=False, error='Ошибка получения статуса')
+        register('admin_broadcast', lambda ctx: self.handle_admin_broadcast(ctx.request, ctx.username),
+                 error='Ошибка рассылки')
+        register('broadcast_status', lambda ctx: self.handle_broadcast_status(ctx.request, ctx.username),
+                 error='Ошибка получения хода рассылки')
+
+    def buffer_pressure(self):
+        """Заполнение буферов соединений относительно порога перегрузки"""
+        budget = self.memory_budget
+        return budget.used / (budget.limit * REQUEST_CONFIG['overload_buffer_share'])
+
+    def dispatch_login(self, ctx):
+        """Вход по паролю; при успехе соединение становится авторизованным"""
+        response = self.handle_login(ctx.request, ctx.client_ip, ctx.writer, ctx.cipher, ctx.address)
+        if response.get('status') == 'success':
+            ctx.username = sys.intern(ctx.request['username'])
+            ctx.user_id = self.get_user_id(ctx.username)
+            self.event_counters.logins_success.inc()
+        else:
+            self.event_counters.logins_failed.inc()
+        return response
+
+    def dispatch_token_login(self, ctx):
+        """Вход по токену повторного входа"""
+        response = self.handle_token_login(ctx.request, ctx.client_ip, ctx.writer, ctx.cipher, ctx.address)
+        if response.get('status') == 'success':
+            ctx.username = sys.intern(response['username'])
+            ctx.user_id = self.get_user_id(ctx.username)
+            self.event_counters.logins_success.inc()
+        else:
+            self.event_counters.logins_failed.inc()
+        return response
+
     def handle_register(self, request, client_ip):
         """Обработка регистрации"""
-        try:
-            username = request['username']
-            password = request['password']
-            email = request.get('email', '')
-            
-            logging.info(f"Попытка регистрации пользователя: {username}")
-            
-            # Проверяем, существует ли пользователь
-            self.cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-            if self.cursor.fetchone():
-                return {
-                    'type': 'auth_response',
-                    'status': 'error',
-                    'message': 'Пользователь уже существует'
-                }
-            
-            # Создаем нового пользователя
-            password_hash = self.hash_password(password)
-            self.cursor.execute(
-                "INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
-                (username, password_hash, email)
-            )
-            self.conn.commit()
-            
-            logging.info(f"[+] Зарегистрирован новый пользователь: {username}")
+        username = request['username']
+        password = request['password']
+        email = request.get('email', '')
+
+        logging.info(f"Попытка регистрации пользователя: {username}")
+
+        # Проверяем, существует ли пользователь
+        self.cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        if self.cursor.fetchone():
             return {
                 'type': 'auth_response',
-                'status': 'success',
-                'message': 'Регистрация успешна'
+                'status': 'error',
+                'message': 'Пользователь уже существует'
             }
-            
-        except Exception as e:
-            logging.error(f"Ошибка регистрации пользователя: {e}")
+
+        # Создаем нового пользователя
+        password_hash = self.hash_password(password, client_ip, username)
+        self.cursor.execute(
+            "INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
+            (username, password_hash, email)
+        )
+        self.conn.commit()
+
+        logging.info(f"[+] Зарегистрирован новый пользователь: {username}")
+        return {
+            'type': 'auth_response',
+            'status': 'success',
+            'message': 'Регистрация успешна'
+        }
+
+    def handle_login(self, request, client_ip, writer, cipher_suite, address):
+        """Обработка входа"""
+        username = request['username']
+        password = request['password']
+
+        logging.info(f"Попытка входа пользователя: {username}")
+
+        # Ищем пользователя
+        self.cursor.execute(
+            "SELECT id, password_hash FROM users WHERE username = ?",
+            (username,)
+        )
+        result = self.cursor.fetchone()
+
+        if not result:
             return {
                 'type': 'auth_response',
                 'status': 'error',
-                'message': f'Ошибка регистрации: {e}'
+                'message': 'Неверное имя пользователя или пароль'
             }
 
-    def handle_login(self, request, client_ip, client_socket, cipher_suite, address):
-        """Обработка входа"""
-        try:
-            username = request['username']
-            password = request['password']
-            
-            logging.info(f"Попытка входа пользователя: {username}")
-            
-            # Ищем пользователя
-            self.cursor.execute(
-                "SELECT id, password_hash FROM users WHERE username = ?",
-                (username,)
-            )
-            result = self.cursor.fetchone()
-            
-            if not result:
-                return {
-                    'type': 'auth_response',
-                    'status': 'error',
-                    'message': 'Неверное имя пользователя или пароль'
-                }
-            
-            user_id, password_hash = result
-            if self.verify_password(password, password_hash):
-                # Создаем сессию
-                session_token = self.create_session(user_id)
-                if not session_token:
-                    return {
-                        'type': 'auth_response',
-                        'status': 'error',
-                        'message': 'Ошибка создания сессии'
-                    }
-                
-                # Регистрируем клиента как онлайн
-                p2p_port = request.get('p2p_port', 0)
-                external_ip = request.get('external_ip', client_ip)
-                
-                self.clients[username] = {
-                    'socket': client_socket,
-                    'cipher': cipher_suite,
-                    'address': address,
-                    'last_seen': datetime.now().isoformat(),
-                    'user_id': user_id,
-                    'p2p_port': p2p_port,
-                    'external_ip': external_ip
-                }
-                
-                logging.info(f"[+] Пользователь {username} вошел в систему. Онлайн пользователей: {len(self.clients)}")
-                return {
-                    'type': 'auth_response',
-                    'status': 'success',
-                    'message': 'Вход выполнен',
-                    'session_token': session_token
-                }
-            else:
+        user_id, password_hash = result
+        if self.verify_password(password, password_hash, client_ip, username):
+            self.rehash_password_if_needed(user_id, password, password_hash, client_ip)
+
+            # Создаем сессию
+            session_token = self.create_session(user_id)
+            if not session_token:
                 return {
                     'type': 'auth_response',
                     'status': 'error',
-                    'message': 'Неверное имя пользователя или пароль'
+                    'message': 'Ошибка создания сессии'
                 }
-                
-        except Exception as e:
-            logging.error(f"Ошибка входа пользователя: {e}")
+
+            # Регистрируем клиента как онлайн
+            self.register_online_client(username, user_id, request, client_ip,
+                                        writer, cipher_suite, address)
+
+            response = {
+                'type': 'auth_response',
+                'status': 'success',
+                'message': 'Вход выполнен',
+                'session_token': session_token
+            }
+            if request.get('remember_me'):
+                response['refresh_token'] = self.issue_refresh_token(user_id)
+            return response
+        else:
             return {
                 'type': 'auth_response',
                 'status': 'error',
-                'message': f'Ошибка входа: {e}'
+                'message': 'Неверное имя пользователя или пароль'
             }
 
-    def handle_get_user_list(self, username):
-        """Обработка запроса списка пользователей"""
-        try:
-            if not username:
-                return {
-                    'type': 'error',
-                    'message': 'Не авторизован'
-                }
-            
-            # Получаем список онлайн-пользователей
-            online_users = self.get_online_users()
-            logging.info(f"Запрос списка пользователей от {username}. Найдено: {len(online_users)}")
-            
-            # Фильтруем текущего пользователя из списка
-            filtered_users = [user for user in online_users if user['username'] != username]
-            
+    def register_online_client(self, username, user_id, request, client_ip, writer, cipher_suite, address):
+        """Регистрация клиента в списке онлайн после успешного входа"""
+        p2p_port = request.get('p2p_port', 0)
+        external_ip = request.get('external_ip', client_ip)
+        
+        session = ClientSession(username, writer.socket, cipher_suite, address, user_id,
+                                time.monotonic(), p2p_port, external_ip, writer)
+        username = session.username
+        self.clients[username] = session
+        self.presence_snapshot.invalidate()
+        
+        self.liveness.touch(username, session.last_seen)
+        logging.info(f"[+] Пользователь {username} вошел в систему. Онлайн пользователей: {len(self.clients)}")
+        
+        self.load_contacts(username)
+        self.publish_presence(username, True)
+
+    def unregister_online_client(self, username, client_socket=None):
+        """Удаление клиента из онлайн и рассылка статуса офлайн его наблюдателям.
+        С client_socket - только если пользователь не вошел заново с другого соединения"""
+        client_data = self.clients.get(username)
+        if client_socket is not None and client_data is not None and client_data.socket is not client_socket:
+            return
+        self.clients.pop(username, None)
+        self.presence_snapshot.invalidate()
+        self.liveness.remove(username)
+        if self.unload_contacts(username):
+            self.publish_presence(username, False)
+
+    def load_contacts(self, username):
+        """Загрузка контактов пользователя в граф в памяти"""
+        contacts = {c['username']: c['alias'] for c in self.user_manager.get_contacts(username)}
+        with self.contacts_lock:
+            self.contacts[username] = contacts
+            for contact in contacts:
+                self.watchers.setdefault(contact, set()).add(username)
+
+    def unload_contacts(self, username):
+        """Удаление контактов отключившегося пользователя из графа; True, если они были загружены"""
+        with self.contacts_lock:
+            contacts = self.contacts.pop(username, None)
+            if contacts is None:
+                return False
+            for contact in contacts:
+                watchers = self.watchers.get(contact)
+                if watchers is not None:
+                    watchers.discard(username)
+                    if not watchers:
+                        del self.watchers[contact]
+        return True
+
+    def presence_of(self, username):
+        """Статус пользователя для списка контактов"""
+        client_data = self.clients.get(username)
+        if client_data is None:
+            return {'username': username, 'is_online': False}
+        presence = client_data.presence()
+        presence['is_online'] = True
+        return presence
+
+    def publish_presence(self, username, is_online):
+        """Рассылка изменения статуса только тем, у кого пользователь в контактах: O(степени), а не O(онлайн)"""
+        with self.contacts_lock:
+            watchers = list(self.watchers.get(username, ()))
+        if not watchers:
+            return
+        
+        presence = self.presence_of(username) if is_online else {'username': username, 'is_online': False}
+        update = dict(presence, type='presence_update')
+        for watcher in watchers:
+            if watcher in self.clients:
+                self.send_message_to_client(watcher, update)
+
+    def handle_token_login(self, request, client_ip, writer, cipher_suite, address):
+        """Обработка входа по токену (без проверки пароля bcrypt)"""
+        refresh_token = request.get('refresh_token')
+        if not refresh_token:
             return {
-                'type': 'user_list_update',
-                'users': filtered_users
+                'type': 'auth_response',
+                'status': 'error',
+                'message': 'Не указан токен'
             }
-            
-        except Exception as e:
-            logging.error(f"Ошибка получения списка пользователей: {e}")
+
+        result = self.rotate_refresh_token(refresh_token)
+        if not result:
             return {
-                'type': 'error',
-                'message': f'Ошибка получения списка пользователей: {e}'
+                'type': 'auth_response',
+                'status': 'error',
+                'message': 'Токен недействителен или отозван'
             }
 
-    def handle_client_info(self, request, username, user_id, client_ip):
-        """Обработка информации о клиенте"""
-        try:
-            if not username or not user_id:
-                return {
-                    'type': 'error',
-                    'message': 'Не авторизован'
-                }
-            
-            # Обновляем P2P информацию о клиенте
-            p2p_port = request.get('p2p_port', 0)
-            external_ip = request.get('external_ip', client_ip)
-            
-            if username in self.clients:
-                self.clients[username]['p2p_port'] = p2p_port
-                self.clients[username]['external_ip'] = external_ip
-                self.clients[username]['last_seen'] = datetime.now().isoformat()
-            
+        user_id, username, new_refresh_token = result
+        if request.get('username') and request['username'] != username:
+            self.revoke_refresh_tokens(user_id, new_refresh_token)
             return {
-                'type': 'client_info_ack',
-                'status': 'success'
+                'type': 'auth_response',
+                'status': 'error',
+                'message': 'Токен недействителен или отозван'
             }
-            
-        except Exception as e:
-            logging.error(f"Ошибка обработки client_info: {e}")
+
+        session_token = self.create_session(user_id)
+        self.register_online_client(username, user_id, request, client_ip,
+                                    writer, cipher_suite, address)
+
+        return {
+            'type': 'auth_response',
+            'status': 'success',
+            'message': 'Вход выполнен',
+            'username': username,
+            'session_token': session_token,
+            'refresh_token': new_refresh_token
+        }
+
+    def handle_revoke_token(self, request, user_id):
+        """Отзыв токена повторного входа (выход из системы)"""
+        revoked = self.revoke_refresh_tokens(
+            user_id,
+            None if request.get('all') else request.get('refresh_token')
+        )
+        return {
+            'type': 'revoke_token_response',
+            'status': 'success',
+            'revoked': revoked
+        }
+
+    def handle_get_user_list(self, request, username):
+        """Обработка запроса списка пользователей. Ответ собирается из готовых байтов снимка;
+        если у клиента уже актуальная версия (request['version']), список не передается"""
+        version, users, count = self.presence_snapshot.users_excluding(username)
+        logging.debug(f"Запрос списка пользователей от {username}. Найдено: {count}")
+
+        if request.get('version') == version:
             return {
-                'type': 'error',
-                'message': f'Ошибка обработки информации: {e}'
+                'type': 'user_list_update',
+                'version': version,
+                'unchanged': True
             }
 
-    def handle_heartbeat(self, username, user_id):
+        head = {'type': 'user_list_update', 'version': version}
+        if 'request_id' in request:
+            head['request_id'] = request['request_id']
+        # Массив users из снимка дописывается в конец объекта без повторной сериализации
+        return json.dumps(head).encode()[:-1] + b', "users": ' + users + b'}'
+
+    def handle_get_contacts(self, username):
+        """Список контактов пользователя со статусом онлайн"""
+        with self.contacts_lock:
+            contacts = dict(self.contacts.get(username, {}))
+
+        users = []
+        for contact, alias in contacts.items():
+            user = self.presence_of(contact)
+            user['alias'] = alias
+            users.append(user)
+
+        return {
+            'type': 'contacts_response',
+            'status': 'success',
+            'contacts': users
+        }
+
+    def handle_add_contact(self, request, username):
+        """Добавление контакта; в ответе - его текущий статус"""
+        contact = request.get('username')
+        alias = request.get('alias') or contact
+        if not contact or contact == username:
+            return {'type': 'contact_response', 'status': 'error', 'message': 'Некорректный контакт'}
+        if not self.user_manager.user_exists(contact):
+            return {'type': 'contact_response', 'status': 'error', 'message': 'Пользователь не найден'}
+
+        # False - контакт уже добавлен, это не ошибка
+        self.user_manager.add_contact(username, contact, alias)
+        with self.contacts_lock:
+            if username in self.contacts:
+                self.contacts[username][contact] = alias
+                self.watchers.setdefault(contact, set()).add(username)
+
+        user = self.presence_of(contact)
+        user['alias'] = alias
+        return {'type': 'contact_response', 'status': 'success', 'action': 'add', 'contact': user}
+
+    def handle_remove_contact(self, request, username):
+        """Удаление контакта"""
+        contact = request.get('username')
+        if not contact:
+            return {'type': 'contact_response', 'status': 'error', 'message': 'Не указан контакт'}
+
+        self.user_manager.remove_contact(username, contact)
+        with self.contacts_lock:
+            self.contacts.get(username, {}).pop(contact, None)
+            watchers = self.watchers.get(contact)
+            if watchers is not None:
+                watchers.discard(username)
+                if not watchers:
+                    del self.watchers[contact]
+
+        return {'type': 'contact_response', 'status': 'success', 'action': 'remove',
+                'contact': {'username': contact}}
+
+    def handle_client_info(self, request, username, user_id, client_ip):
+        """Обработка информации о клиенте"""
+        # Обновляем P2P информацию о клиенте
+        p2p_port = request.get('p2p_port', 0)
+        external_ip = request.get('external_ip', client_ip)
+
+        if username in self.clients:
+            self.clients[username].set_endpoint(p2p_port, external_ip)
+            self.presence_snapshot.invalidate()
+            self.touch_client(username)
+            # Наблюдателям нужен актуальный адрес для P2P
+            self.publish_presence(username, True)
+
+        return {
+            'type': 'client_info_ack',
+            'status': 'success'
+        }
+
+    def touch_client(self, username):
+        """Отметка активности клиента: переносит его дедлайн в колесе таймеров"""
+        now = time.monotonic()
+        client_data = self.clients.get(username)
+        if client_data is not None:
+            client_data.last_seen = now
+            self.liveness.touch(username, now)
+
+    def handle_heartbeat(self, username):
         """Обработка heartbeat"""
-        try:
-            if username and user_id and username in self.clients:
-                # Обновляем время последней активности
-                self.clients[username]['last_seen'] = datetime.now().isoformat()
-                return {'type': 'heartbeat_ack'}
-            else:
-                return {'type': 'error', 'message': 'Не авторизован'}
-                
-        except Exception as e:
-            logging.error(f"Ошибка обработки heartbeat: {e}")
-            return {'type': 'error', 'message': f'Ошибка heartbeat: {e}'}
+        if username not in self.clients:
+            return {'type': 'error', 'message': 'Не авторизован'}
+        # Обновляем время последней активности
+        self.touch_client(username)
+        # Heartbeat участника продлевает его принятые звонки
+        self.active_calls.touch_user(username)
+        return {'type': 'heartbeat_ack'}
 
     def handle_p2p_message(self, request, from_username):
         """Обработка P2P сообщения от одного клиента другому"""
-        try:
-            to_username = request.get('to')
-            message = request.get('message')
-            message_id = request.get('message_id')
-            timestamp = request.get('timestamp')
-            session_token = request.get('session_token')
-            
-            if not to_username or not message:
-                return {
-                    'type': 'error',
-                    'message': 'Не указан получатель или сообщение'
-                }
-            
-            # Проверяем сессию
-            if not session_token or not self.validate_session(session_token):
-                return {
-                    'type': 'error',
-                    'message': 'Невалидная сессия'
-                }
-            
-            logging.info(f"P2P сообщение от {from_username} к {to_username}: {message}")
-            
-            # Проверяем, онлайн ли получатель
-            if to_username not in self.clients:
-                # Отправляем отправителю статус, что пользователь не в сети
-                status_message = {
-                    'type': 'message_status',
-                    'status': 'user_offline',
-                    'message_id': message_id,
-                    'details': f'Пользователь {to_username} не в сети'
-                }
-                self.send_message_to_client(from_username, status_message)
-                return {
-                    'type': 'message_status',
-                    'status': 'failed',
-                    'message_id': message_id,
-                    'details': f'Пользователь {to_username} не в сети'
-                }
-            
-            # Формируем сообщение для получателя
-            p2p_message = {
-                'type': 'p2p_message',
-                'from': from_username,
-                'message': message,
-                'timestamp': timestamp,
+        to_username = request.get('to')
+        message = request.get('message')
+        message_id = request.get('message_id')
+        timestamp = request.get('timestamp')
+
+        if not to_username or not message:
+            return {
+                'type': 'error',
+                'message': 'Не указан получатель или сообщение'
+            }
+
+        logging.info(f"P2P сообщение от {from_username} к {to_username}: {message}")
+
+        # Сохраняем в историю переписки (get_history)
+        self.save_message(from_username, to_username, message)
+
+        # Проверяем, онлайн ли получатель
+        if to_username not in self.clients:
+            # Отправляем отправителю статус, что пользователь не в сети
+            status_message = {
+                'type': 'message_status',
+                'status': 'user_offline',
+                'message_id': message_id,
+                'details': f'Пользователь {to_username} не в сети'
+            }
+            self.send_message_to_client(from_username, status_message)
+            return {
+                'type': 'message_status',
+                'status': 'failed',
+                'message_id': message_id,
+                'details': f'Пользователь {to_username} не в сети'
+            }
+
+        # Формируем сообщение для получателя
+        p2p_message = {
+            'type': 'p2p_message',
+            'from': from_username,
+            'message': message,
+            'timestamp': timestamp,
+            'message_id': message_id
+        }
+
+        # Отправляем сообщение получателю
+        if self.send_message_to_client(to_username, p2p_message):
+            # Отправляем отправителю подтверждение доставки
+            status_message = {
+                'type': 'message_status',
+                'status': 'delivered',
                 'message_id': message_id
             }
-            
-            # Отправляем сообщение получателю
-            if self.send_message_to_client(to_username, p2p_message):
-                # Отправляем отправителю подтверждение доставки
-                status_message = {
-                    'type': 'message_status',
-                    'status': 'delivered',
-                    'message_id': message_id
-                }
-                self.send_message_to_client(from_username, status_message)
-                
-                logging.info(f"P2P сообщение от {from_username} к {to_username} доставлено")
-                return {
-                    'type': 'message_status',
-                    'status': 'success',
-                    'message_id': message_id
-                }
-            else:
-                # Ошибка отправки
-                status_message = {
-                    'type': 'message_status',
-                    'status': 'failed',
-                    'message_id': message_id,
-                    'details': 'Ошибка отправки сообщения получателю'
-                }
-                self.send_message_to_client(from_username, status_message)
-                return status_message
-                
-        except Exception as e:
-            logging.error(f"Ошибка обработки P2P сообщения: {e}")
+            self.send_message_to_client(from_username, status_message)
+
+            logging.info(f"P2P сообщение от {from_username} к {to_username} доставлено")
             return {
-                'type': 'error',
-                'message': f'Ошибка обработки сообщения: {e}'
+                'type': 'message_status',
+                'status': 'success',
+                'message_id': message_id
             }
+        else:
+            # Ошибка отправки
+            status_message = {
+                'type': 'message_status',
+                'status': 'failed',
+                'message_id': message_id,
+                'details': 'Ошибка отправки сообщения получателю'
+            }
+            self.send_message_to_client(from_username, status_message)
+            return status_message
+
+    @staticmethod
+    def conversation_stream(user1, user2):
+        """Имя потока переписки в хранилище сообщений, не зависящее от направления"""
+        return 'dm:' + '\n'.join(sorted((user1, user2)))
+
+    def save_message(self, from_username, to_username, message):
+        """Сохранение сообщения в историю выбранным движком хранения"""
+        if self.message_store is None:
+            return self.user_manager.save_message(from_username, to_username, message)
+        self.message_store.append(self.conversation_stream(from_username, to_username), {
+            'sender': from_username,
+            'receiver': to_username,
+            'content': message,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        return True
+
+    def get_history_page(self, username, with_user, cursor, limit):
+        """Страница истории (сообщения по порядку, курсор следующей страницы)"""
+        if self.message_store is None:
+            return self.user_manager.get_history_page(username, with_user, cursor, limit)
+        records = self.message_store.read_before(self.conversation_stream(username, with_user), cursor, limit)
+        messages = [{
+            'id': seq,
+            'sender': record['sender'],
+            'receiver': record['receiver'],
+            'content': record['content'],
+            'encrypted': False,
+            'type': 'text',
+            'timestamp': record['timestamp'],
+            'delivered': False,
+            'read': False
+        } for seq, _, record in records]
+        next_cursor = records[0][0] if len(records) == limit else None
+        return messages, next_cursor
+
+    def send_frame(self, writer, cipher_suite, data):
+        """Отправка одного зашифрованного кадра в очередь соединения клиента"""
+        if not writer.write(cipher_suite.encrypt(json.dumps(data).encode()) + b"<END>"):
+            raise ConnectionError('соединение закрыто')
+
+    def handle_get_history(self, request, username, writer, cipher_suite):
+        """История переписки страницами по курсору (id самого старого полученного сообщения).
+        Все страницы, кроме последней, отправляются потоком кадрами history_page с partial=True,
+        последняя возвращается в ответе history_response"""
+        with_user = request.get('with')
+        if not with_user:
+            return {'type': 'error', 'message': 'Не указан собеседник'}
+
+        cursor = request.get('cursor')
+        limit = max(1, min(int(request.get('limit', HISTORY_CONFIG['page_size'])), HISTORY_CONFIG['max_page_size']))
+        pages = max(1, min(int(request.get('pages', 1)), HISTORY_CONFIG['max_pages']))
+
+        sent_pages = 0
+        while True:
+            messages, next_cursor = self.get_history_page(username, with_user, cursor, limit)
+            sent_pages += 1
+            if sent_pages >= pages or next_cursor is None:
+                break
+            self.send_frame(writer, cipher_suite, {
+                'type': 'history_page',
+                'partial': True,
+                'request_id': request.get('request_id'),
+                'with': with_user,
+                'messages': messages,
+                'next_cursor': next_cursor
+            })
+            cursor = next_cursor
+
+        return {
+            'type': 'history_response',
+            'status': 'success',
+            'with': with_user,
+            'messages': messages,
+            'next_cursor': next_cursor,
+            'pages': sent_pages
+        }
+
+    def handle_search_users(self, request, username):
+        """Поиск пользователей по имени страницами; статус онлайн берется из подключенных клиентов"""
+        query = str(request.get('query', '')).strip()
+        limit = max(1, min(int(request.get('limit', SEARCH_CONFIG['page_size'])), SEARCH_CONFIG['max_page_size']))
+
+        users, next_cursor = self.user_manager.search_users_page(
+            query, request.get('cursor'), limit, exclude_user=username
+        )
+        for user in users:
+            user['is_online'] = user['username'] in self.clients
+
+        return {
+            'type': 'search_users_response',
+            'status': 'success',
+            'query': query,
+            'users': users,
+            'next_cursor': next_cursor
+        }
 
     def handle_call_request(self, request, from_username):
         """Обработка запроса на звонок"""
-        try:
-            to_username = request.get('to')
-            call_type = request.get('call_type', 'audio')
-            call_id = request.get('call_id', str(uuid.uuid4()))
-            session_token = request.get('session_token')
-            
-            logging.info(f"🔊 Обработка запроса звонка: от {from_username} к {to_username}, ID: {call_id}")
-            
-            if not to_username:
-                return {
-                    'type': 'error',
-                    'message': 'Не указан получатель звонка'
-                }
-            
-            # Проверяем сессию
-            if not session_token or not self.validate_session(session_token):
-                return {
-                    'type': 'error',
-                    'message': 'Невалидная сессия'
-                }
-            
-            # Проверяем, онлайн ли получатель
-            if to_username not in self.clients:
-                logging.warning(f"❌ Пользователь {to_username} не в сети")
-                return {
-                    'type': 'call_response',
-                    'status': 'user_offline',
-                    'call_id': call_id,
-                    'message': f'Пользователь {to_username} не в сети'
-                }
-            
-            # Проверяем, не занят ли получатель другим звонком
-            if to_username in self.active_calls:
-                logging.warning(f"❌ Пользователь {to_username} занят другим звонком")
-                return {
-                    'type': 'call_response',
-                    'status': 'user_busy',
-                    'call_id': call_id,
-                    'message': f'Пользователь {to_username} занят другим звонком'
-                }
-            
-            # Сохраняем информацию о звонке
-            self.active_calls[call_id] = {
-                'from': from_username,
-                'to': to_username,
-                'call_type': call_type,
-                'start_time': datetime.now(),
-                'status': 'ringing'
+        to_username = request.get('to')
+        call_type = request.get('call_type', 'audio')
+        call_id = request.get('call_id', str(uuid.uuid4()))
+
+        logging.info(f"🔊 Обработка запроса звонка: от {from_username} к {to_username}, ID: {call_id}")
+
+        if not to_username:
+            return {
+                'type': 'error',
+                'message': 'Не указан получатель звонка'
             }
-            
-            # Записываем в историю звонков
-            self.cursor.execute(
-                "INSERT INTO call_history (call_id, from_user, to_user, call_type, status) VALUES (?, ?, ?, ?, ?)",
-                (call_id, from_username, to_username, call_type, 'initiated')
-            )
-            self.conn.commit()
-            
-            # Отправляем запрос на звонок получателю
-            call_request = {
-                'type': 'call_request',
-                'from': from_username,
-                'call_type': call_type,
+
+        if not isinstance(call_id, str) or not call_id:
+            return {
+                'type': 'error',
+                'message': 'Некорректный идентификатор звонка'
+            }
+
+        if call_type not in CALL_CONFIG['call_types']:
+            return {
+                'type': 'error',
+                'message': 'Неизвестный тип звонка'
+            }
+
+        # Проверяем, онлайн ли получатель
+        if to_username not in self.clients:
+            logging.warning(f"❌ Пользователь {to_username} не в сети")
+            return {
+                'type': 'call_response',
+                'status': 'user_offline',
                 'call_id': call_id,
-                'timestamp': datetime.now().isoformat()
+                'message': f'Пользователь {to_username} не в сети'
             }
-            
-            if self.send_message_to_client(to_username, call_request):
-                logging.info(f"✅ Запрос на {call_type} звонок от {from_username} к {to_username} отправлен")
-                return {
-                    'type': 'call_response',
-                    'status': 'ringing',
-                    'call_id': call_id,
-                    'message': 'Звонок отправлен'
-                }
-            else:
-                # Удаляем информацию о звонке, если отправка не удалась
-                if call_id in self.active_calls:
-                    del self.active_calls[call_id]
-                logging.error(f"❌ Ошибка отправки запроса на звонок {call_id}")
-                return {
-                    'type': 'call_response',
-                    'status': 'failed',
-                    'call_id': call_id,
-                    'message': 'Ошибка отправки запроса на звонок'
-                }
-                
-        except Exception as e:
-            logging.error(f"❌ Ошибка обработки запроса на звонок: {e}")
+
+        # Регистрируем звонок, если получатель не занят другим звонком
+        try:
+            call = self.active_calls.add(call_id, from_username, to_username, call_type)
+        except ValueError as e:
             return {
                 'type': 'error',
-                'message': f'Ошибка обработки запроса на звонок: {e}'
+                'message': str(e)
+            }
+        if call is None:
+            logging.warning(f"❌ Пользователь {to_username} занят другим звонком")
+            return {
+                'type': 'call_response',
+                'status': 'user_busy',
+                'call_id': call_id,
+                'message': f'Пользователь {to_username} занят другим звонком'
+            }
+
+        # Записываем в историю звонков
+        self.call_journal.call_started(call_id, from_username, to_username, call_type)
+
+        # Отправляем запрос на звонок получателю
+        call_request = {
+            'type': 'call_request',
+            'from': from_username,
+            'call_type': call_type,
+            'call_id': call_id,
+            'timestamp': datetime.now().isoformat()
+        }
+
+        if self.send_message_to_client(to_username, call_request):
+            logging.info(f"✅ Запрос на {call_type} звонок от {from_username} к {to_username} отправлен")
+            return {
+                'type': 'call_response',
+                'status': 'ringing',
+                'call_id': call_id,
+                'message': 'Звонок отправлен'
+            }
+        else:
+            # Удаляем информацию о звонке, если отправка не удалась
+            self.active_calls.remove(call_id)
+            logging.error(f"❌ Ошибка отправки запроса на звонок {call_id}")
+            return {
+                'type': 'call_response',
+                'status': 'failed',
+                'call_id': call_id,
+                'message': 'Ошибка отправки запроса на звонок'
             }
 
     def handle_call_answer(self, request, from_username):
         """Обработка ответа на звонок"""
-        try:
-            call_id = request.get('call_id')
-            answer = request.get('answer')
-            session_token = request.get('session_token')
-            call_port = request.get('call_port')
+        call_id = request.get('call_id')
+        answer = request.get('answer')
+        call_port = request.get('call_port')
 
-            logging.info(f"🔊 Обработка ответа на звонок {call_id} от {from_username}: {answer}")
+        logging.info(f"🔊 Обработка ответа на звонок {call_id} от {from_username}: {answer}")
 
-            if not call_id or not answer:
-                return {
-                    'type': 'error',
-                    'message': 'Не указан ID звонка или ответ'
-                }
+        if not call_id or not answer:
+            return {
+                'type': 'error',
+                'message': 'Не указан ID звонка или ответ'
+            }
+
+        # Проверяем, существует ли звонок; звонок может завершиться в любой момент,
+        # поэтому данные берутся одним обращением
+        call_data = self.active_calls.get(call_id)
+        if call_data is None:
+            logging.info(f"Запрос ответа на несуществующий звонок {call_id} от {from_username}")
+            return {
+                'type': 'call_answer_response',
+                'status': 'call_not_found',
+                'call_id': call_id,
+                'message': 'Звонок не найден или уже завершен'
+            }
+
+        # Проверяем, что пользователь является получателем звонка
+        if call_data['to'] != from_username:
+            return {
+                'type': 'error',
+                'message': 'Вы не являетесь получателем этого звонка'
+            }
+
+        if answer == 'accept':
+            # Обновляем статус звонка
+            self.active_calls.activate(call_id)
+
+            # Отправляем подтверждение звонка инициатору
+            call_accepted = {
+                'type': 'call_accepted',
+                'call_id': call_id,
+                'from': from_username,
+            }
+
+            # ✅ ВСЕГДА ДОБАВЛЯЕМ call_port, ДАЖЕ ЕСЛИ ОН None
+            if call_port is not None:
+                call_accepted['call_port'] = call_port
+                logging.info(f"🔊 Передаем порт медиа-сервера: {call_port}")
+
+            # ✅ УПРОЩАЕМ: отправляем только базовую информацию
+            if self.send_message_to_client(call_data['from'], call_accepted):
+                logging.info(f"✅ Пользователь {from_username} принял звонок {call_id}, порт: {call_port}")
+
+                # Обновляем историю звонков
+                self.call_journal.call_updated(call_id, 'accepted')
 
-            # Проверяем сессию
-            if not session_token or not self.validate_session(session_token):
                 return {
-                    'type': 'error',
-                    'message': 'Невалидная сессия'
+                    'type': 'call_answer_response',
+                    'status': 'accepted',
+                    'call_id': call_id,
+                    'message': 'Звонок принят'
                 }
-            
-            # Проверяем, существует ли звонок
-            if call_id not in self.active_calls:
-                logging.info(f"Запрос ответа на несуществующий звонок {call_id} от {from_username}")
+            else:
                 return {
                     'type': 'call_answer_response',
-                    'status': 'call_not_found',
+                    'status': 'failed',
                     'call_id': call_id,
-                    'message': 'Звонок не найден или уже завершен'
+                    'message': 'Ошибка отправки подтверждения звонка'
                 }
-            
-            call_data = self.active_calls[call_id]
 
-            # Проверяем, что пользователь является получателем звонка
-            if call_data['to'] != from_username:
-                return {
-                    'type': 'error',
-                    'message': 'Вы не являетесь получателем этого звонка'
-                }
+        elif answer == 'reject':
+            # Отправляем отказ инициатору
+            call_rejected = {
+                'type': 'call_rejected',
+                'call_id': call_id,
+                'from': from_username
+            }
+            if self.send_message_to_client(call_data['from'], call_rejected):
+                logging.info(f"✅ Пользователь {from_username} отклонил звонок {call_id}")
 
-            if answer == 'accept':
-                # Обновляем статус звонка
-                call_data['status'] = 'active'
-                call_data['answer_time'] = datetime.now()
+                # Обновляем историю звонков
+                self.call_journal.call_updated(call_id, 'rejected', end_time=True)
 
-                # Отправляем подтверждение звонка инициатору
-                call_accepted = {
-                    'type': 'call_accepted',
-                    'call_id': call_id,
-                    'from': from_username,
-                }
-                
-                # ✅ ВСЕГДА ДОБАВЛЯЕМ call_port, ДАЖЕ ЕСЛИ ОН None
-                if call_port is not None:
-                    call_accepted['call_port'] = call_port
-                    logging.info(f"🔊 Передаем порт медиа-сервера: {call_port}")
-                
-                # ✅ УПРОЩАЕМ: отправляем только базовую информацию
-                if self.send_message_to_client(call_data['from'], call_accepted):
-                    logging.info(f"✅ Пользователь {from_username} принял звонок {call_id}, порт: {call_port}")
-                
-                    # Обновляем историю звонков
-                    self.cursor.execute(
-                        "UPDATE call_history SET status = ? WHERE call_id = ?",
-                        ('accepted', call_id)
-                    )
-                    self.conn.commit()
-                
-                    return {
-                        'type': 'call_answer_response',
-                        'status': 'accepted',
-                        'call_id': call_id,
-                        'message': 'Звонок принят'
-                    }
-                else:
-                    return {
-                        'type': 'call_answer_response',
-                        'status': 'failed',
-                        'call_id': call_id,
-                        'message': 'Ошибка отправки подтверждения звонка'
-                    }
+                # Удаляем из активных звонков
+                self.active_calls.remove(call_id)
 
-            elif answer == 'reject':
-                # Отправляем отказ инициатору
-                call_rejected = {
-                    'type': 'call_rejected',
+                return {
+                    'type': 'call_answer_response',
+                    'status': 'rejected',
                     'call_id': call_id,
-                    'from': from_username
+                    'message': 'Звонок отклонен'
                 }
-                if self.send_message_to_client(call_data['from'], call_rejected):
-                    logging.info(f"✅ Пользователь {from_username} отклонил звонок {call_id}")
-                
-                    # Обновляем историю звонков
-                    self.cursor.execute(
-                        "UPDATE call_history SET status = ?, end_time = CURRENT_TIMESTAMP WHERE call_id = ?",
-                        ('rejected', call_id)
-                    )
-                    self.conn.commit()
-                
-                    # Удаляем из активных звонков
-                    del self.active_calls[call_id]
-                
-                    return {
-                        'type': 'call_answer_response',
-                        'status': 'rejected',
-                        'call_id': call_id,
-                        'message': 'Звонок отклонен'
-                    }
-                else:
-                    return {
-                        'type': 'call_answer_response',
-                        'status': 'failed',
-                        'call_id': call_id,
-                        'message': 'Ошибка отправки отказа на звонок'
-                    }
             else:
                 return {
-                    'type': 'error',
-                    'message': 'Неверный тип ответа на звонок. Допустимые значения: accept, reject'
+                    'type': 'call_answer_response',
+                    'status': 'failed',
+                    'call_id': call_id,
+                    'message': 'Ошибка отправки отказа на звонок'
                 }
-                
-        except Exception as e:
-            logging.error(f"❌ Ошибка обработки ответа на звонок: {e}")
+        else:
             return {
                 'type': 'error',
-                'message': f'Ошибка обработки ответа на звонок: {e}'
+                'message': 'Неверный тип ответа на звонок. Допустимые значения: accept, reject'
             }
 
     def handle_call_end(self, request, from_username):
         """Обработка завершения звонка"""
-        try:
-            call_id = request.get('call_id')
-            session_token = request.get('session_token')
-            
-            logging.info(f"🔊 Обработка завершения звонка {call_id} от {from_username}")
-            
-            if not call_id:
-                return {
-                    'type': 'error',
-                    'message': 'Не указан ID звонка'
-                }
-            
-            # Проверяем сессию
-            if not session_token or not self.validate_session(session_token):
-                return {
-                    'type': 'error',
-                    'message': 'Невалидная сессия'
-                }
-            
-            # Проверяем, существует ли звонок
-            if call_id not in self.active_calls:
-                # Звонок уже завершен - это нормальная ситуация
-                logging.info(f"Запрос на завершение несуществующего звонка {call_id} от {from_username}")
-                return {
-                    'type': 'call_end_response',
-                    'status': 'already_ended',
-                    'call_id': call_id,
-                    'message': 'Звонок уже завершен'
-                }
-            
-            call_data = self.active_calls[call_id]
-            
-            # Проверяем, что пользователь является участником звонка
-            if from_username not in [call_data['from'], call_data['to']]:
-                return {
-                    'type': 'error',
-                    'message': 'Вы не являетесь участником этого звонка'
-                }
-            
-            # Определяем другого участника
-            other_party = call_data['to'] if from_username == call_data['from'] else call_data['from']
-            
-            # Отправляем уведомление о завершении звонка другому участнику
-            call_ended = {
-                'type': 'call_ended',
-                'call_id': call_id,
-                'from': from_username
+        call_id = request.get('call_id')
+
+        logging.info(f"🔊 Обработка завершения звонка {call_id} от {from_username}")
+
+        if not call_id:
+            return {
+                'type': 'error',
+                'message': 'Не указан ID звонка'
             }
-            
-            if other_party in self.clients:
-                self.send_message_to_client(other_party, call_ended)
-                logging.info(f"🔊 Уведомление о завершении звонка {call_id} отправлено пользователю {other_party}")
-            
-            # Рассчитываем длительность звонка
-            end_time = datetime.now()
-            start_time = call_data['start_time']
-            duration = int((end_time - start_time).total_seconds())
-            
-            # Обновляем историю звонков
-            self.cursor.execute(
-                "UPDATE call_history SET status = ?, end_time = ?, duration = ? WHERE call_id = ?",
-                ('ended', end_time, duration, call_id)
-            )
-            self.conn.commit()
-            
-            # Удаляем из активных звонков
-            del self.active_calls[call_id]
-            
-            logging.info(f"✅ Звонок {call_id} завершен пользователем {from_username}. Длительность: {duration} сек.")
-            
+
+        # Проверяем, существует ли звонок; звонок может завершиться в любой момент,
+        # поэтому данные берутся одним обращением
+        call_data = self.active_calls.get(call_id)
+        if call_data is None:
+            # Звонок уже завершен - это нормальная ситуация
+            logging.info(f"Запрос на завершение несуществующего звонка {call_id} от {from_username}")
             return {
                 'type': 'call_end_response',
-                'status': 'ended',
+                'status': 'already_ended',
                 'call_id': call_id,
-                'duration': duration,
-                'message': 'Звонок завершен'
+                'message': 'Звонок уже завершен'
             }
-                
-        except Exception as e:
-            logging.error(f"❌ Ошибка обработки завершения звонка: {e}")
+
+        # Проверяем, что пользователь является участником звонка
+        if from_username not in [call_data['from'], call_data['to']]:
             return {
                 'type': 'error',
-                'message': f'Ошибка обработки завершения звонка: {e}'
+                'message': 'Вы не являетесь участником этого звонка'
             }
 
+        # Определяем другого участника
+        other_party = call_data['to'] if from_username == call_data['from'] else call_data['from']
+
+        # Отправляем уведомление о завершении звонка другому участнику
+        call_ended = {
+            'type': 'call_ended',
+            'call_id': call_id,
+            'from': from_username
+        }
+
+        if other_party in self.clients:
+            self.send_message_to_client(other_party, call_ended)
+            logging.info(f"🔊 Уведомление о завершении звонка {call_id} отправлено пользователю {other_party}")
+
+        # Рассчитываем длительность звонка
+        end_time = datetime.now()
+        start_time = call_data['start_time']
+        duration = int((end_time - start_time).total_seconds())
+
+        # Обновляем историю звонков
+        self.call_journal.call_updated(call_id, 'ended', end_time, duration)
+
+        # Удаляем из активных звонков
+        self.active_calls.remove(call_id)
+
+        logging.info(f"✅ Звонок {call_id} завершен пользователем {from_username}. Длительность: {duration} сек.")
+
+        return {
+            'type': 'call_end_response',
+            'status': 'ended',
+            'call_id': call_id,
+            'duration': duration,
+            'message': 'Звонок завершен'
+        }
+
     def handle_ice_candidate(self, request, from_username):
         """Обработка ICE-кандидатов для WebRTC"""
-        try:
-            call_id = request.get('call_id')
-            candidate = request.get('candidate')
-            target_user = request.get('target_user')
-            session_token = request.get('session_token')
-            
-            if not call_id or not candidate or not target_user:
-                return {
-                    'type': 'error',
-                    'message': 'Не указан ID звонка, кандидат или целевой пользователь'
-                }
-            
-            # Проверяем сессию
-            if not session_token or not self.validate_session(session_token):
-                return {
-                    'type': 'error',
-                    'message': 'Невалидная сессия'
-                }
-            
-            # Проверяем, существует ли звонок
-            if call_id not in self.active_calls:
-                return {
-                    'type': 'error',
-                    'message': 'Звонок не найден'
-                }
-            
-            # Отправляем ICE-кандидат целевому пользователю
-            ice_message = {
-                'type': 'ice_candidate',
-                'call_id': call_id,
-                'candidate': candidate,
-                'from_user': from_username
+        call_id = request.get('call_id')
+        candidate = request.get('candidate')
+        target_user = request.get('target_user')
+
+        if not call_id or not candidate or not target_user:
+            return {
+                'type': 'error',
+                'message': 'Не указан ID звонка, кандидат или целевой пользователь'
             }
-            
-            if self.send_message_to_client(target_user, ice_message):
-                logging.debug(f"ICE-кандидат от {from_username} к {target_user} для звонка {call_id} отправлен")
-                return {
-                    'type': 'ice_candidate_response',
-                    'status': 'sent',
-                    'call_id': call_id
-                }
-            else:
-                return {
-                    'type': 'ice_candidate_response',
-                    'status': 'failed',
-                    'call_id': call_id,
-                    'message': 'Ошибка отправки ICE-кандидата'
-                }
-                
-        except Exception as e:
-            logging.error(f"Ошибка обработки ICE-кандидата: {e}")
+
+        # Проверяем, существует ли звонок
+        if call_id not in self.active_calls:
             return {
                 'type': 'error',
-                'message': f'Ошибка обработки ICE-кандидата: {e}'
+                'message': 'Звонок не найден'
             }
+        self.active_calls.touch(call_id)
 
-    def handle_server_status(self, request):
-        """Диагностика состояния сервера"""
-        try:
-            status_info = {
-                'type': 'server_status',
-                'online_users': len(self.clients),
-                'active_calls': len(self.active_calls),
-                'users': list(self.clients.keys()),
-                'calls': list(self.active_calls.keys())
+        # Отправляем ICE-кандидат целевому пользователю
+        ice_message = {
+            'type': 'ice_candidate',
+            'call_id': call_id,
+            'candidate': candidate,
+            'from_user': from_username
+        }
+
+        if self.send_message_to_client(target_user, ice_message):
+            logging.debug(f"ICE-кандидат от {from_username} к {target_user} для звонка {call_id} отправлен")
+            return {
+                'type': 'ice_candidate_response',
+                'status': 'sent',
+                'call_id': call_id
             }
-            return status_info
-        except Exception as e:
+        else:
             return {
-                'type': 'error',
-                'message': f'Ошибка получения статуса: {e}'
+                'type': 'ice_candidate_response',
+                'status': 'failed',
+                'call_id': call_id,
+                'message': 'Ошибка отправки ICE-кандидата'
             }
 
+    def handle_server_status(self, request):
+        """Диагностика состояния сервера"""
+        status_info = {
+            'type': 'server_status',
+            'online_users': len(self.clients),
+            'active_calls': len(self.active_calls),
+            'users': list(self.clients.keys()),
+            'calls': list(self.active_calls.keys()),
+            'request_stats': self.request_latency.summary(),
+            'memory_budget': self.memory_budget.stats(),
+            'overload': self.overload.stats(),
+            'connection_buffers': self.connections.stats(),
+            'request_counts': {f'{kind}:{request_type}': count
+                               for (kind, request_type), count in self.request_counters.snapshot().items()}
+        }
+        return status_info
+
+    def broadcast_system_message(self, text):
+        """Системное сообщение всем онлайн-клиентам; возвращает ход рассылки (Broadcast)"""
+        message = {
+            'type': 'system_message',
+            'message': text,
+            'timestamp': datetime.now().isoformat()
+        }
+        return self.broadcaster.broadcast(message, list(self.clients.values()))
+
+    def handle_admin_broadcast(self, request, username):
+        """Запуск рассылки системного сообщения; разрешено пользователям BROADCAST_CONFIG['admins']"""
+        if username not in BROADCAST_CONFIG['admins']:
+            logging.warning(f"Попытка рассылки без прав от {username}")
+            return {'type': 'error', 'message': 'Недостаточно прав для рассылки'}
+
+        text = request.get('message', '').strip()
+        if not text:
+            return {'type': 'error', 'message': 'Пустое сообщение рассылки'}
+
+        broadcast = self.broadcast_system_message(text)
+        logging.info(f"Рассылка {broadcast.id} от {username}: {broadcast.total} получателей")
+        response = {'type': 'admin_broadcast_response', 'status': 'accepted'}
+        response.update(broadcast.status())
+        return response
+
+    def handle_broadcast_status(self, request, username):
+        """Ход рассылки по broadcast_id"""
+        if username not in BROADCAST_CONFIG['admins']:
+            return {'type': 'error', 'message': 'Недостаточно прав'}
+
+        broadcast = self.broadcaster.get(request.get('broadcast_id'))
+        if broadcast is None:
+            return {'type': 'error', 'message': 'Рассылка не найдена'}
+
+        response = {'type': 'broadcast_status_response'}
+        response.update(broadcast.status())
+        return response
+
     def handle_client(self, client_socket, address):
         """Обработка подключения клиента"""
         username = None
-        user_id = None
         client_ip, client_port = address
         cipher_suite = None
+        writer = None
+        reader = None
+        connection = None
         
         try:
             logging.info(f"[+] Новое подключение от {address}")
             
-            # Получаем публичный ключ клиента
-            public_key_data = b""
-            start_time = time.time()
-            
-            while time.time() - start_time < 30:
-                try:
-                    client_socket.settimeout(5)
-                    chunk = client_socket.recv(4096)
-                    if chunk:
-                        public_key_data += chunk
-                        if public_key_data.endswith(b"<END>"):
-                            public_key_data = public_key_data[:-5]
-                            break
-                    elif not chunk:  # Клиент отключился
-                        logging.info("Клиент отключился при отправке публичного ключа")
-                        return
-                except socket.timeout:
-                    if time.time() - start_time >= 30:
-                        logging.error("Таймаут получения публичного ключа")
-                        return
-                    continue
-                except Exception as e:
-                    logging.error(f"Ошибка получения публичного ключа: {e}")
-                    return
+            # Получаем публичный ключ клиента: кадр ограничен по размеру и времени
+            reader = FrameReader(client_socket, self.memory_budget)
+            connection = self.connections.add(address, reader)
+            public_key_data = reader.read_frame(max_frame=CONNECTION_CONFIG['max_handshake_size'],
+                                                idle_timeout=CONNECTION_CONFIG['handshake_timeout'])
+            if public_key_data is None:
+                logging.info("Клиент отключился при отправке публичного ключа")
+                return
             
             if not public_key_data:
                 logging.error("Не получен публичный ключ от клиента")
-                client_socket.close()
                 return
             
             # Загружаем публичный ключ
@@ -944,40 +1353,18 @@ class SecureDialogServer:
                 client_socket.close()
                 return
             
+            # Дальше все кадры клиенту идут через его очередь записи
+            writer = ClientWriter(client_socket, self.writer_loop, budget=self.memory_budget)
+            connection.writer = writer
+            ctx = RequestContext(client_ip, address, writer, cipher_suite)
+            
             # Основной цикл обработки запросов клиента
             while True:
-                # Получаем запрос от клиента с большим таймаутом
-                encrypted_request = b""
-                start_time = time.time()
-                received_data = False
-                
-                while time.time() - start_time < 300:
-                    try:
-                        client_socket.settimeout(10)
-                        chunk = client_socket.recv(4096)
-                        if chunk:
-                            received_data = True
-                            encrypted_request += chunk
-                            if encrypted_request.endswith(b"<END>"):
-                                encrypted_request = encrypted_request[:-5]
-                                break
-                        elif not chunk:  # Клиент отключился
-                            logging.info("Клиент отключился")
-                            return
-                    except socket.timeout:
-                        if received_data:
-                            continue
-                        else:
-                            if time.time() - start_time >= 300:
-                                continue
-                            else:
-                                continue
-                    except Exception as e:
-                        logging.error(f"Ошибка получения запроса: {e}")
-                        break
-                
-                if not encrypted_request and not received_data:
-                    continue
+                # Получаем запрос: размер кадра, дедлайны и общий бюджет памяти - в FrameReader
+                encrypted_request = reader.read_frame()
+                if encrypted_request is None:
+                    logging.info("Клиент отключился")
+                    return
                 
                 if not encrypted_request:
                     logging.info("Пустой запрос, продолжаем ждать")
@@ -997,59 +1384,33 @@ class SecureDialogServer:
                     }
                     try:
                         encrypted_error = cipher_suite.encrypt(json.dumps(error_response).encode())
-                        client_socket.send(encrypted_error + b"<END>")
+                        writer.write(encrypted_error + b"<END>")
                     except:
                         pass
                     continue
                 
                 # Обрабатываем тип запроса
                 try:
-                    if request['type'] == 'register':
-                        response = self.handle_register(request, client_ip)
-                        
-                    elif request['type'] == 'login':
-                        response = self.handle_login(request, client_ip, client_socket, cipher_suite, address)
-                        if response.get('status') == 'success':
-                            username = request['username']
-                            user_id = self.get_user_id(username)
-                    
-                    elif request['type'] == 'get_user_list':
-                        response = self.handle_get_user_list(username)
-                    
-                    elif request['type'] == 'client_info':
-                        response = self.handle_client_info(request, username, user_id, client_ip)
-                    
-                    elif request['type'] == 'heartbeat':
-                        response = self.handle_heartbeat(username, user_id)
-                    
-                    elif request['type'] == 'p2p_message':
-                        response = self.handle_p2p_message(request, username)
-                    
-                    elif request['type'] == 'call_request':
-                        response = self.handle_call_request(request, username)
-                    
-                    elif request['type'] == 'call_answer':
-                        response = self.handle_call_answer(request, username)
-                    
-                    elif request['type'] == 'call_end':
-                        response = self.handle_call_end(request, username)
-                    
-                    elif request['type'] == 'ice_candidate':
-                        response = self.handle_ice_candidate(request, username)
-                    
-                    elif request['type'] == 'server_status':
-                        response = self.handle_server_status(request)
+                    ctx.request = request
+                    response = self.dispatcher.dispatch(ctx)
+                    # Вход на соединении выполняют обработчики login/token_login
+                    username = ctx.username
+                    connection.username = username
                     
+                    if isinstance(response, bytes):
+                        # Ответ уже сериализован обработчиком вместе с request_id
+                        payload = response
                     else:
-                        response = {
-                            'type': 'error',
-                            'message': f'Неизвестный тип запроса: {request["type"]}'
-                        }
+                        # Возвращаем идентификатор запроса, чтобы клиент сопоставил ответ
+                        if 'request_id' in request:
+                            response['request_id'] = request['request_id']
+                        payload = json.dumps(response).encode()
                     
                     # Отправляем ответ
                     try:
-                        encrypted_response = cipher_suite.encrypt(json.dumps(response).encode())
-                        client_socket.send(encrypted_response + b"<END>")
+                        encrypted_response = cipher_suite.encrypt(payload)
+                        if not writer.write(encrypted_response + b"<END>"):
+                            raise ConnectionError('соединение закрыто')
                         logging.info(f"Ответ на {request['type']} отправлен")
                     except Exception as e:
                         logging.error(f"Ошибка отправки ответа: {e}")
@@ -1061,12 +1422,16 @@ class SecureDialogServer:
                         'type': 'error',
                         'message': f'Внутренняя ошибка сервера: {e}'
                     }
+                    if 'request_id' in request:
+                        error_response['request_id'] = request['request_id']
                     try:
                         encrypted_error = cipher_suite.encrypt(json.dumps(error_response).encode())
-                        client_socket.send(encrypted_error + b"<END>")
+                        writer.write(encrypted_error + b"<END>")
                     except:
                         pass
                 
+        except FrameError as e:
+            logging.warning(f"Соединение {address} ({username or 'unknown'}) закрыто: {e}")
         except Exception as e:
             logging.error(f"Ошибка обработки клиента {username or 'unknown'}: {e}")
         finally:
@@ -1074,18 +1439,17 @@ class SecureDialogServer:
             if username:
                 logging.info(f"🔊 Обработка отключения пользователя {username}")
                 
-                # Находим все активные звонки пользователя
-                calls_to_end = []
-                for call_id, call_data in self.active_calls.items():
-                    if username in [call_data['from'], call_data['to']]:
-                        calls_to_end.append(call_id)
+                # Звонки пользователя - по индексу, без просмотра всех звонков
+                calls_to_end = self.active_calls.calls_of(username)
                 
                 logging.info(f"🔊 Найдено активных звонков для завершения: {len(calls_to_end)}")
                 
                 # Завершаем найденные звонки
                 for call_id in calls_to_end:
                     try:
-                        call_data = self.active_calls[call_id]
+                        call_data = self.active_calls.remove(call_id)
+                        if call_data is None:
+                            continue
                         other_party = call_data['to'] if username == call_data['from'] else call_data['from']
                         
                         # Отправляем уведомление о завершении звонка другому участнику
@@ -1104,22 +1468,20 @@ class SecureDialogServer:
                         start_time = call_data['start_time']
                         duration = int((end_time - start_time).total_seconds())
                         
-                        self.cursor.execute(
-                            "UPDATE call_history SET status = ?, end_time = ?, duration = ? WHERE call_id = ?",
-                            ('ended_abruptly', end_time, duration, call_id)
-                        )
-                        self.conn.commit()
-                        
-                        # Удаляем из активных звонков
-                        del self.active_calls[call_id]
+                        self.call_journal.call_updated(call_id, 'ended_abruptly', end_time, duration)
                         
                         logging.info(f"🔊 Звонок {call_id} завершен из-за отключения пользователя {username}")
                     except Exception as e:
                         logging.error(f"❌ Ошибка при завершении звонка {call_id}: {e}")
                 
                 if username in self.clients:
-                    del self.clients[username]
                     logging.info(f"[-] Пользователь {username} отключился")
+                self.unregister_online_client(username, client_socket)
+            if writer is not None:
+                writer.close()
+            if reader is not None:
+                reader.close()
+                self.connections.remove(connection)
             try:
                 client_socket.close()
             except:
@@ -1129,22 +1491,42 @@ class SecureDialogServer:
         """Запуск сервера"""
         logging.info("[+] Сервер ожидает подключений...")
         
+        # Снимки памяти по SIGUSR1, если включены в MEMORY_PROFILE_CONFIG
+        memory_profile.start()
+        
+        # Поднимаем процессы пула хеширования до первого входа
+        self.password_hasher.warm_up()
+        
+        # Локальный HTTP-слушатель метрик, если включен в METRICS_CONFIG
+        if METRICS_CONFIG['enabled']:
+            self.metrics_server = MetricsServer(self.collect_metrics)
+            self.metrics_server.start()
+        
         # Запускаем очистку неактивных клиентов в отдельном потоке
-        cleanup_thread = threading.Thread(target=self.cleanup_inactive_clients, daemon=True)
+        cleanup_thread = threading.Thread(target=self.cleanup_inactive_clients, name='liveness-cleanup', daemon=True)
         cleanup_thread.start()
         
         # Запускаем очистку зависших звонков в отдельном потоке
-        call_cleanup_thread = threading.Thread(target=self.cleanup_stalled_calls, daemon=True)
+        call_cleanup_thread = threading.Thread(target=self.cleanup_stalled_calls, name='call-cleanup', daemon=True)
         call_cleanup_thread.start()
         
         while True:
             try:
                 client_socket, address = self.server_socket.accept()
+                if self.memory_budget.overloaded():
+                    # Буферы соединений почти исчерпали бюджет - новых клиентов не берем
+                    logging.warning(f"Соединение от {address} отклонено: буферы соединений "
+                                    f"заняты на {self.memory_budget.used} байт")
+                    client_socket.close()
+                    self.event_counters.connections_rejected.inc()
+                    continue
+                self.event_counters.connections_accepted.inc()
                 logging.info(f"Принято новое соединение от {address}")
                 
                 thread = threading.Thread(
                     target=self.handle_client,
                     args=(client_socket, address),
+                    name='client-handler',
                     daemon=True
                 )
                 thread.start()
@@ -1152,65 +1534,104 @@ class SecureDialogServer:
             except Exception as e:
                 logging.error(f"Ошибка при принятии соединения: {e}")
 
+    def collect_metrics(self, writer):
+        """Заполнение ответа /metrics (server/openmetrics.py) из текущего состояния сервера"""
+        counters = self.event_counters
+        writer.gauge('connections', 'Открытые соединения клиентов', [((), len(self.connections))])
+        writer.gauge('online_users', 'Авторизованные онлайн-клиенты', [((), len(self.clients))])
+        writer.counter('connections_accepted', 'Принятые соединения', [((), counters.connections_accepted)])
+        writer.counter('connections_rejected', 'Соединения, отклоненные при перегрузке буферов',
+                       [((), counters.connections_rejected)])
+        writer.counter('logins', 'Входы по паролю и по токену',
+                       [((('result', 'success'),), counters.logins_success),
+                        ((('result', 'failure'),), counters.logins_failed)])
+
+        by_kind = {}
+        for (kind, request_type), value in self.request_counters.snapshot().items():
+            by_kind.setdefault(kind, []).append(((('type', request_type),), value))
+        for kind, help_text in (('requests', 'Обработанные запросы по типу'),
+                                ('errors', 'Запросы, завершившиеся ответом об ошибке'),
+                                ('throttled', 'Запросы, отклоненные корзиной токенов'),
+                                ('shed', 'Запросы, сброшенные при перегрузке')):
+            name = 'requests' if kind == 'requests' else f'requests_{kind}'
+            writer.counter(name, help_text, sorted(by_kind.get(kind, ())))
+        writer.histogram('request_duration', 'Время обработки запроса по типу',
+                         [((('type', name),), histogram) for name, histogram in self.request_latency.items()])
+
+        writer.counter('relay_messages', 'Кадры, пересланные клиентам', [((), counters.relay_messages)])
+        writer.counter('relay', 'Пересланные клиентам данные', [((), counters.relay_bytes)], unit='bytes')
+
+        buffers = self.connections.stats(top=0)
+        writer.gauge('connection_buffer', 'Байты в буферах соединений',
+                     [((('direction', 'incoming'),), buffers['incoming']),
+                      ((('direction', 'outgoing'),), buffers['outgoing'])], unit='bytes')
+        budget = self.memory_budget.stats()
+        writer.gauge('memory_budget', 'Бюджет буферов соединений',
+                     [((('kind', 'used'),), budget['used']), ((('kind', 'limit'),), budget['limit'])],
+                     unit='bytes')
+        writer.gauge('call_journal_pending', 'Изменения call_history в очереди записи',
+                     [((), len(self.call_journal.pending))])
+        overload = self.overload.stats()
+        writer.gauge('overload_level', 'Уровень перегрузки (0 - норма)', [((), overload['level'])])
+        writer.gauge('requests_in_flight', 'Обрабатываемые сейчас запросы', [((), overload['inflight'])])
+
+        writer.histogram('db_duration', 'Время запросов к базе',
+                         [((('source', 'server'),), self.db_latency),
+                          ((('source', 'user_manager'),), self.user_manager.operation_latency)])
+
+        hasher = self.password_hasher
+        writer.gauge('hasher_workers', 'Процессы пула bcrypt', [((), hasher.workers)])
+        writer.gauge('hasher_in_flight', 'Задачи bcrypt в работе и в очереди', [((), hasher.in_flight)])
+        writer.gauge('hasher_utilization', 'Занятость пула bcrypt',
+                     [((), min(hasher.in_flight, hasher.workers) / hasher.workers)], unit='ratio')
+        writer.counter('hasher_rejected', 'Отказы пула bcrypt при переполнении', [((), hasher.rejected)])
+
+        calls = self.active_calls.count_by_status()
+        writer.gauge('active_calls', 'Активные звонки по состоянию',
+                     [((('state', state),), calls.get(state, 0))
+                      for state in sorted(set(calls) | {'ringing', 'active'})])
+
+        threads = {}
+        for thread in threading.enumerate():
+            group = re.sub(r'[-_]?\d+( \(.*\))?$', '', thread.name)
+            threads[group] = threads.get(group, 0) + 1
+        writer.gauge('threads', 'Потоки процесса по назначению',
+                     [((('group', group),), count) for group, count in sorted(threads.items())])
+
     def cleanup_inactive_clients(self):
-        """Очистка неактивных клиентов"""
+        """Отключение клиентов без активности дольше LIVENESS_CONFIG['timeout'].
+        Каждый тик просматривается только слот колеса с наступившими дедлайнами"""
         while True:
-            time.sleep(30)
+            time.sleep(self.liveness.tick)
             try:
-                current_time = datetime.now()
-                inactive_users = []
-                
-                # Проверяем всех подключенных клиентов
-                for username, client_data in self.clients.items():
-                    last_seen_str = client_data.get('last_seen', '')
-                    if last_seen_str:
-                        try:
-                            last_seen = datetime.fromisoformat(last_seen_str)
-                            time_diff = (current_time - last_seen).total_seconds()
-                            
-                            # Если клиент не активен более 5 минут, помечаем для удаления
-                            if time_diff > 300:
-                                inactive_users.append(username)
-                        except ValueError:
-                            inactive_users.append(username)
-                
-                # Удаляем неактивных клиентов
-                for username in inactive_users:
-                    if username in self.clients:
-                        try:
-                            self.clients[username]['socket'].close()
-                        except:
-                            pass
-                        del self.clients[username]
-                        logging.info(f"[-] Удален неактивный пользователь {username}")
+                for username in self.liveness.expire():
+                    client_data = self.clients.get(username)
+                    if client_data is None:
+                        continue
+                    # Heartbeat мог прийти между истечением и этой проверкой
+                    if time.monotonic() - client_data.last_seen < self.liveness.timeout:
+                        self.liveness.touch(username, client_data.last_seen)
+                        continue
+                    # Разрыв соединения: поток клиента выйдет из recv и закроет сокет
+                    client_data.writer.close(shutdown=True)
+                    self.unregister_online_client(username, client_data.socket)
+                    logging.info(f"[-] Удален неактивный пользователь {username}")
                 
             except Exception as e:
                 logging.error(f"Ошибка при очистке неактивных клиентов: {e}")
 
     def cleanup_stalled_calls(self):
-        """Очистка зависших звонков"""
+        """Завершение звонков с наступившим дедлайном: без ответа дольше ring_timeout
+        или без активности участников дольше idle_timeout"""
         while True:
-            time.sleep(60)
+            next_deadline = self.active_calls.next_deadline()
+            delay = CALL_CONFIG['cleanup_max_sleep']
+            if next_deadline is not None:
+                delay = min(delay, max(0.0, next_deadline - time.monotonic()))
+            time.sleep(delay)
             try:
-                current_time = datetime.now()
-                stalled_calls = []
-                
-                # Проверяем все активные звонки
-                for call_id, call_data in self.active_calls.items():
-                    start_time = call_data['start_time']
-                    time_diff = (current_time - start_time).total_seconds()
-                    
-                    # ✅ УВЕЛИЧИВАЕМ ТАЙМАУТ ДО 5 МИНУТ для активных звонков
-                    if call_data['status'] == 'ringing' and time_diff > 120:  # 2 минуты для "звонящих"
-                        stalled_calls.append(call_id)
-                    elif call_data['status'] == 'active' and time_diff > 300:  # 5 минут для активных
-                        stalled_calls.append(call_id)
-                
-                # Завершаем зависшие звонки
-                for call_id in stalled_calls:
+                for call_id, call_data in self.active_calls.expire():
                     try:
-                        call_data = self.active_calls[call_id]
-                        
                         # Отправляем уведомления участникам
                         for username in [call_data['from'], call_data['to']]:
                             if username in self.clients:
@@ -1223,16 +1644,9 @@ class SecureDialogServer:
                                 self.send_message_to_client(username, call_ended)
                         
                         # Обновляем историю звонков
-                        self.cursor.execute(
-                            "UPDATE call_history SET status = ?, end_time = CURRENT_TIMESTAMP WHERE call_id = ?",
-                            ('timeout', call_id)
-                        )
-                        self.conn.commit()
-                        
-                        # Удаляем из активных звонков
-                        del self.active_calls[call_id]
+                        self.call_journal.call_updated(call_id, 'timeout', end_time=True)
                         
-                        logging.info(f"Зависший звонок {call_id} завершен системой")
+                        logging.info(f"Зависший звонок {call_id} ({call_data['status']}) завершен системой")
                     except Exception as e:
                         logging.error(f"Ошибка при завершении зависшего звонка {call_id}: {e}")
                 
@@ -2,20 +2,90 @@ import sqlite3
 import os
 import hashlib
 import secrets
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from config import SEARCH_CONFIG
+from metrics import Histogram
+from .connection_pool import ConnectionPool
+
 logger = logging.getLogger('dialog_user_manager')
 
+
+class LRUCache:
+    """Ограниченный потокобезопасный LRU-кэш"""
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+    
+    def invalidate(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
 class UserManager:
-    def __init__(self, db_path: str = "users.db"):
+    # conversation_key = меньший ID * BASE + больший ID
+    CONVERSATION_KEY_BASE = 2 ** 32
+    # Ограничение SQLite на число параметров запроса
+    IN_CHUNK_SIZE = 500
+    
+    def __init__(self, db_path: str = "users.db", cache_size: int = 10000):
         self.db_path = db_path
+        # Общий ограниченный пул: соединение берется на время операции, кэш подготовленных
+        # запросов сохраняется вместе с соединением
+        self.pool = ConnectionPool(self.open_connection)
+        self.local = threading.local()
+        self.user_ids = LRUCache(cache_size)
+        self.public_keys = LRUCache(cache_size)
+        # Время операций с базой: от получения соединения внешним вызовом до возврата
+        self.operation_latency = Histogram()
         self.init_database()
+    
+    def open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def connection(self) -> sqlite3.Connection:
+        """Соединение из пула на время операции; вложенные вызовы получают то же соединение"""
+        conn = self.pool.acquire()
+        if self.pool.depth() == 1:
+            self.local.started = time.perf_counter()
+        return conn
+    
+    def release(self, conn: sqlite3.Connection):
+        """Возврат соединения в пул: незавершенная транзакция внешнего вызова откатывается"""
+        if self.pool.release(conn):
+            self.operation_latency.observe(time.perf_counter() - self.local.started)
+    
+    def close(self):
+        """Закрытие всех соединений пула"""
+        self.pool.close()
         
     def init_database(self):
         """Инициализация базы данных пользователей"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         cursor = conn.cursor()
         
         # Таблица пользователей
@@ -71,15 +141,93 @@ class UserManager:
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             delivered BOOLEAN DEFAULT FALSE,
             read BOOLEAN DEFAULT FALSE,
+            conversation_key INTEGER,
             FOREIGN KEY (sender_id) REFERENCES users (id),
             FOREIGN KEY (receiver_id) REFERENCES users (id)
         )
         ''')
         
+        # База может быть создана сервером с другим набором колонок
+        self.ensure_columns(cursor, 'users', {
+            'email': 'TEXT',
+            'public_key': 'TEXT',
+            'last_login': 'TIMESTAMP',
+            'is_online': 'BOOLEAN DEFAULT FALSE'
+        })
+        if self.ensure_columns(cursor, 'messages', {'conversation_key': 'INTEGER'}):
+            logger.info("Заполнение conversation_key для существующих сообщений")
+            cursor.execute('''
+            UPDATE messages SET conversation_key =
+                MIN(sender_id, receiver_id) * ? + MAX(sender_id, receiver_id)
+            WHERE conversation_key IS NULL
+            ''', (self.CONVERSATION_KEY_BASE,))
+        
+        # История читается страницами по (conversation_key, id)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_key, id)"
+        )
+        
+        self.init_search_index(cursor)
+        
         conn.commit()
-        conn.close()
+        self.release(conn)
         
         logger.info(f"База данных инициализирована: {self.db_path}")
+        
+    def ensure_columns(self, cursor, table: str, columns: Dict[str, str]) -> bool:
+        """Добавление недостающих колонок; True, если что-то добавлено"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        added = False
+        for column, declaration in columns.items():
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+                added = True
+        return added
+    
+    def init_search_index(self, cursor):
+        """Индексы поиска пользователей: имя без учета регистра (точное совпадение и начало)
+        и триграммный FTS5 (подстрока). FTS синхронизируется триггерами при любой записи в users"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users (username COLLATE NOCASE)")
+        
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'")
+        exists = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts
+            USING fts5(username, content='users', content_rowid='id', tokenize='trigram')
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Триграммный FTS5 недоступен, поиск по подстроке без индекса: {e}")
+            self.substring_index = False
+            return
+        self.substring_index = True
+        
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts (rowid, username) VALUES (new.id, new.username);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username) VALUES ('delete', old.id, old.username);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username) VALUES ('delete', old.id, old.username);
+            INSERT INTO users_fts (rowid, username) VALUES (new.id, new.username);
+        END
+        ''')
+        if not exists:
+            logger.info("Построение индекса поиска пользователей")
+            cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+    
+    @classmethod
+    def conversation_key(cls, user1_id: int, user2_id: int) -> int:
+        """Ключ переписки, не зависящий от направления сообщения"""
+        low, high = sorted((user1_id, user2_id))
+        return low * cls.CONVERSATION_KEY_BASE + high
     
     def hash_password(self, password: str) -> str:
         """Хеширование пароля с солью"""
@@ -100,8 +248,8 @@ class UserManager:
     
     def register_user(self, username: str, password: str, public_key: str = None) -> bool:
         """Регистрация нового пользователя"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             # Проверяем, существует ли пользователь
@@ -120,6 +268,8 @@ class UserManager:
             ''', (username, password_hash, public_key, datetime.now()))
             
             conn.commit()
+            self.user_ids.invalidate(username)
+            self.public_keys.invalidate(username)
             logger.info(f"Пользователь {username} успешно зарегистрирован")
             return True
             
@@ -127,12 +277,12 @@ class UserManager:
             logger.error(f"Ошибка базы данных при регистрации пользователя {username}: {e}")
             return False
         finally:
-            conn.close()
+            self.release(conn)
     
     def authenticate_user(self, username: str, password: str) -> bool:
         """Аутентификация пользователя"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -158,12 +308,12 @@ class UserManager:
             logger.error(f"Ошибка базы данных при аутентификации пользователя {username}: {e}")
             return False
         finally:
-            conn.close()
+            self.release(conn)
     
     def update_user_online_status(self, username: str, is_online: bool) -> bool:
         """Обновление статуса онлайн/оффлайн"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -182,12 +332,12 @@ class UserManager:
             logger.error(f"Ошибка обновления статуса пользователя {username}: {e}")
             return False
         finally:
-            conn.close()
+            self.release(conn)
     
     def get_online_users(self, exclude_user: str = None) -> List[Dict]:
         """Получение списка онлайн пользователей"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             if exclude_user:
@@ -218,14 +368,14 @@ class UserManager:
             logger.error(f"Ошибка получения онлайн пользователей: {e}")
             return []
         finally:
-            conn.close()
+            self.release(conn)
 
     
     
     def get_all_users(self) -> List[Dict]:
         """Получение списка всех пользователей"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -247,12 +397,12 @@ class UserManager:
             logger.error(f"Ошибка получения списка пользователей: {e}")
             return []
         finally:
-            conn.close()
+            self.release(conn)
     
     def update_public_key(self, username: str, public_key: str) -> bool:
         """Обновление публичного ключа пользователя"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -260,6 +410,7 @@ class UserManager:
                 (public_key, username)
             )
             conn.commit()
+            self.public_keys.invalidate(username)
             
             success = cursor.rowcount > 0
             if success:
@@ -270,12 +421,16 @@ class UserManager:
             logger.error(f"Ошибка обновления публичного ключа пользователя {username}: {e}")
             return False
         finally:
-            conn.close()
+            self.release(conn)
     
     def get_public_key(self, username: str) -> Optional[str]:
         """Получение публичного ключа пользователя"""
+        public_key = self.public_keys.get(username)
+        if public_key is not None:
+            return public_key
+        
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -283,18 +438,25 @@ class UserManager:
                 (username,)
             )
             result = cursor.fetchone()
+            # Кэшируются только найденные ключи
+            if result and result[0] is not None:
+                self.public_keys.put(username, result[0])
             return result[0] if result else None
             
         except sqlite3.Error as e:
             logger.error(f"Ошибка получения публичного ключа пользователя {username}: {e}")
             return None
         finally:
-            conn.close()
+            self.release(conn)
     
     def get_user_id(self, username: str) -> Optional[int]:
         """Получение ID пользователя по имени"""
+        user_id = self.user_ids.get(username)
+        if user_id is not None:
+            return user_id
+        
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -302,16 +464,52 @@ class UserManager:
                 (username,)
             )
             result = cursor.fetchone()
+            if result:
+                self.user_ids.put(username, result[0])
             return result[0] if result else None
             
         except sqlite3.Error as e:
             logger.error(f"Ошибка получения ID пользователя {username}: {e}")
             return None
         finally:
-            conn.close()
+            self.release(conn)
+    
+    def get_user_ids(self, usernames) -> Dict[str, int]:
+        """ID нескольких пользователей за один запрос; ненайденные отсутствуют в результате"""
+        result = {}
+        missing = []
+        for username in set(usernames):
+            user_id = self.user_ids.get(username)
+            if user_id is not None:
+                result[username] = user_id
+            else:
+                missing.append(username)
+        if not missing:
+            return result
+        
+        conn = self.connection()
+        try:
+            cursor = conn.cursor()
+            for i in range(0, len(missing), self.IN_CHUNK_SIZE):
+                chunk = missing[i:i + self.IN_CHUNK_SIZE]
+                cursor.execute(
+                    f"SELECT username, id FROM users WHERE username IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                for username, user_id in cursor.fetchall():
+                    self.user_ids.put(username, user_id)
+                    result[username] = user_id
+            return result
+            
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка получения ID {len(missing)} пользователей: {e}")
+            return result
+        finally:
+            self.release(conn)
     
     def add_contact(self, username: str, contact_username: str, alias: str = None) -> bool:
         """Добавление контакта пользователю"""
+        conn = self.connection()
         try:
             user_id = self.get_user_id(username)
             contact_id = self.get_user_id(contact_username)
@@ -320,7 +518,6 @@ class UserManager:
                 logger.warning(f"Невалидные ID для добавления контакта: {username} -> {contact_username}")
                 return False
             
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -339,16 +536,42 @@ class UserManager:
             logger.error(f"Ошибка добавления контакта {contact_username} пользователю {username}: {e}")
             return False
         finally:
-            conn.close()
+            self.release(conn)
+    
+    def remove_contact(self, username: str, contact_username: str) -> bool:
+        """Удаление контакта пользователя"""
+        conn = self.connection()
+        try:
+            user_ids = self.get_user_ids([username, contact_username])
+            if username not in user_ids or contact_username not in user_ids:
+                return False
+            
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM contacts WHERE user_id = ? AND contact_id = ?",
+                (user_ids[username], user_ids[contact_username])
+            )
+            conn.commit()
+            
+            success = cursor.rowcount > 0
+            if success:
+                logger.info(f"Пользователь {contact_username} удален из контактов пользователя {username}")
+            return success
+            
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка удаления контакта {contact_username} у пользователя {username}: {e}")
+            return False
+        finally:
+            self.release(conn)
     
     def get_contacts(self, username: str) -> List[Dict]:
         """Получение списка контактов пользователя"""
+        conn = self.connection()
         try:
             user_id = self.get_user_id(username)
             if not user_id:
                 return []
             
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -373,107 +596,164 @@ class UserManager:
             logger.error(f"Ошибка получения контактов пользователя {username}: {e}")
             return []
         finally:
-            conn.close()
+            self.release(conn)
     
     def search_users(self, search_term: str, exclude_user: str = None) -> List[Dict]:
-        """Поиск пользователей по имени"""
+        """Поиск пользователей по имени (первая страница результатов)"""
+        users, _ = self.search_users_page(search_term, exclude_user=exclude_user,
+                                          limit=SEARCH_CONFIG['max_page_size'])
+        return users
+    
+    def search_users_page(self, search_term: str, cursor=None, limit: int = 20,
+                          exclude_user: str = None) -> Tuple[List[Dict], Optional[list]]:
+        """Страница результатов поиска, ранжированных по группам: точное совпадение,
+        начало имени (по алфавиту), подстрока (по порядку регистрации).
+        cursor - [группа, ключ последнего результата]; возвращает (пользователи, курсор)"""
+        term = search_term.strip()
+        if not term:
+            return [], None
+        
+        tier, last_key = cursor if cursor else (0, None)
+        # Верхняя граница диапазона имен, начинающихся с term
+        upper = term + '\U0010ffff'
+        
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if exclude_user:
-                cursor.execute('''
-                SELECT username, is_online, last_login FROM users 
-                WHERE username LIKE ? AND username != ?
-                ORDER BY username
-                ''', (f'%{search_term}%', exclude_user))
-            else:
-                cursor.execute('''
-                SELECT username, is_online, last_login FROM users 
-                WHERE username LIKE ? 
-                ORDER BY username
-                ''', (f'%{search_term}%',))
-            
-            users = []
-            for row in cursor.fetchall():
-                users.append({
-                    'username': row[0],
-                    'is_online': bool(row[1]),
-                    'last_login': row[2]
-                })
-            
-            logger.debug(f"Поиск '{search_term}': найдено {len(users)} пользователей")
-            return users
+            db = conn.cursor()
+            found = []
+            
+            while tier <= 2 and len(found) <= limit:
+                need = limit + 1 - len(found)
+                if tier == 0:
+                    rows = [] if last_key is not None else db.execute('''
+                    SELECT id, username, is_online, last_login FROM users
+                    WHERE username = ? COLLATE NOCASE
+                    ''', (term,)).fetchall()
+                elif tier == 1:
+                    rows = db.execute('''
+                    SELECT id, username, is_online, last_login FROM users
+                    WHERE username > ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+                    ORDER BY username COLLATE NOCASE
+                    LIMIT ?
+                    ''', (last_key if last_key is not None else term, upper, need)).fetchall()
+                elif len(term) >= SEARCH_CONFIG['min_substring'] and self.substring_index:
+                    rows = db.execute('''
+                    SELECT u.id, u.username, u.is_online, u.last_login
+                    FROM users_fts f JOIN users u ON u.id = f.rowid
+                    WHERE users_fts MATCH ? AND f.rowid > ?
+                      AND NOT (u.username >= ? COLLATE NOCASE AND u.username < ? COLLATE NOCASE)
+                    ORDER BY f.rowid
+                    LIMIT ?
+                    ''', ('"' + term.replace('"', '""') + '"', last_key or 0, term, upper, need)).fetchall()
+                else:
+                    rows = []
+                
+                for row in rows:
+                    if row[1] != exclude_user:
+                        found.append((tier, row))
+                # Группа исчерпана - переходим к следующей
+                if len(rows) < need:
+                    tier, last_key = tier + 1, None
+                else:
+                    last_key = rows[-1][1] if tier == 1 else rows[-1][0]
+            
+            next_cursor = None
+            if len(found) > limit:
+                found = found[:limit]
+                last_tier, last_row = found[-1]
+                next_cursor = [last_tier, last_row[1] if last_tier == 1 else last_row[0]]
+            
+            users = [{
+                'username': row[1],
+                'is_online': bool(row[2]),
+                'last_login': row[3]
+            } for _, row in found]
+            
+            logger.debug(f"Поиск '{term}': {len(users)} пользователей на странице")
+            return users, next_cursor
             
         except sqlite3.Error as e:
             logger.error(f"Ошибка поиска пользователей по запросу '{search_term}': {e}")
-            return []
+            return [], None
         finally:
-            conn.close()
+            self.release(conn)
     
     def save_message(self, sender: str, receiver: str, content: str, 
                     encrypted: bool = False, message_type: str = "text") -> bool:
         """Сохранение сообщения в историю"""
+        return self.save_messages([(sender, receiver, content, encrypted, message_type)]) == 1
+    
+    def save_messages(self, messages) -> int:
+        """Сохранение пачки сообщений одной транзакцией.
+        Элементы: (sender, receiver, content[, encrypted[, message_type]]); возвращает число сохраненных"""
+        messages = list(messages)
+        if not messages:
+            return 0
+        
+        conn = self.connection()
         try:
-            sender_id = self.get_user_id(sender)
-            receiver_id = self.get_user_id(receiver)
-            
-            if not sender_id or not receiver_id:
-                return False
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO messages (sender_id, receiver_id, content, encrypted, message_type)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (sender_id, receiver_id, content, encrypted, message_type))
+            user_ids = self.get_user_ids([m[0] for m in messages] + [m[1] for m in messages])
+            
+            rows = []
+            for message in messages:
+                sender_id = user_ids.get(message[0])
+                receiver_id = user_ids.get(message[1])
+                if not sender_id or not receiver_id:
+                    continue
+                encrypted = message[3] if len(message) > 3 else False
+                message_type = message[4] if len(message) > 4 else "text"
+                rows.append((sender_id, receiver_id, message[2], encrypted, message_type,
+                             self.conversation_key(sender_id, receiver_id)))
+            if not rows:
+                return 0
+            
+            conn.executemany('''
+            INSERT INTO messages (sender_id, receiver_id, content, encrypted, message_type, conversation_key)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
             
             conn.commit()
-            return True
+            return len(rows)
             
         except sqlite3.Error as e:
-            logger.error(f"Ошибка сохранения сообщения от {sender} к {receiver}: {e}")
-            return False
+            logger.error(f"Ошибка сохранения {len(messages)} сообщений: {e}")
+            return 0
         finally:
-            conn.close()
+            self.release(conn)
     
-    def get_message_history(self, user1: str, user2: str, limit: int = 100) -> List[Dict]:
-        """Получение истории сообщений между двумя пользователями"""
+    def get_history_page(self, user1: str, user2: str, before_id: int = None,
+                         limit: int = 100) -> Tuple[List[Dict], Optional[int]]:
+        """Страница истории переписки, более старая, чем before_id (курсор).
+        Возвращает сообщения в хронологическом порядке и курсор следующей страницы"""
+        conn = self.connection()
         try:
             user1_id = self.get_user_id(user1)
             user2_id = self.get_user_id(user2)
             
             if not user1_id or not user2_id:
-                return []
+                return [], None
             
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            # Диапазон по индексу (conversation_key, id): читаются только строки страницы
             cursor.execute('''
-            SELECT 
-                u1.username as sender,
-                u2.username as receiver,
-                m.content,
-                m.encrypted,
-                m.message_type,
-                m.timestamp,
-                m.delivered,
-                m.read
-            FROM messages m
-            JOIN users u1 ON m.sender_id = u1.id
-            JOIN users u2 ON m.receiver_id = u2.id
-            WHERE (m.sender_id = ? AND m.receiver_id = ?)
-               OR (m.sender_id = ? AND m.receiver_id = ?)
-            ORDER BY m.timestamp DESC
+            SELECT id, sender_id, content, encrypted, message_type, timestamp, delivered, read
+            FROM messages
+            WHERE conversation_key = ? AND id < ?
+            ORDER BY id DESC
             LIMIT ?
-            ''', (user1_id, user2_id, user2_id, user1_id, limit))
+            ''', (self.conversation_key(user1_id, user2_id),
+                  before_id if before_id is not None else 2 ** 63 - 1, limit))
+            rows = cursor.fetchall()
             
+            names = {user1_id: user1, user2_id: user2}
             messages = []
-            for row in cursor.fetchall():
+            for row in reversed(rows):
+                sender_id = row[1]
                 messages.append({
-                    'sender': row[0],
-                    'receiver': row[1],
+                    'id': row[0],
+                    'sender': names[sender_id],
+                    'receiver': user2 if sender_id == user1_id else user1,
                     'content': row[2],
                     'encrypted': bool(row[3]),
                     'type': row[4],
@@ -482,18 +762,24 @@ class UserManager:
                     'read': bool(row[7])
                 })
             
-            return messages[::-1]  # Возвращаем в хронологическом порядке
+            next_cursor = rows[-1][0] if len(rows) == limit else None
+            return messages, next_cursor
             
         except sqlite3.Error as e:
             logger.error(f"Ошибка получения истории сообщений между {user1} и {user2}: {e}")
-            return []
+            return [], None
         finally:
-            conn.close()
+            self.release(conn)
+    
+    def get_message_history(self, user1: str, user2: str, limit: int = 100) -> List[Dict]:
+        """Получение истории сообщений между двумя пользователями"""
+        messages, _ = self.get_history_page(user1, user2, limit=limit)
+        return messages
     
     def user_exists(self, username: str) -> bool:
         """Проверка существования пользователя"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -506,12 +792,12 @@ class UserManager:
             logger.error(f"Ошибка проверки существования пользователя {username}: {e}")
             return False
         finally:
-            conn.close()
+            self.release(conn)
     
     def cleanup_old_sessions(self, days: int = 30):
         """Очистка старых сессий"""
+        conn = self.connection()
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cutoff_date = datetime.now() - timedelta(days=days)
@@ -529,10 +815,7 @@ class UserManager:
             logger.error(f"Ошибка очистки старых сессий: {e}")
             return 0
         finally:
-            conn.close()
-
-# Создание синглтона для менеджера пользователей
-user_manager = UserManager()
+            self.release(conn)
 
 if __name__ == "__main__":
     # Тестирование функциональности